@@ -0,0 +1,184 @@
+import json
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from entity_index import EntityIndex
+from metrics_history import METRIC_FIELDS, MetricsFrame
+
+# 规则选择器的键 -> 服务器字段
+SELECTOR_FIELDS = {
+    "server_id": "serverId",
+    "region": "region",
+    "cluster_id": "clusterId",
+    "service_type": "serviceType",
+    "status": "status",
+    "tag": "tags",
+}
+
+OPERATORS = (">", ">=", "<", "<=")
+
+
+class AlertRule(BaseModel):
+    """阈值告警规则：metric op threshold 连续 for_samples 次触发；
+    触发后直到指标越过 clear_threshold（未指定时等于 threshold）才自动恢复"""
+    rule_id: str
+    metric: str = Field(..., description="服务器指标，见 METRIC_FIELDS")
+    op: str = Field(">", pattern="^(>|>=|<|<=)$")
+    threshold: float
+    clear_threshold: Optional[float] = Field(None, description="恢复阈值（滞回），为空时等于 threshold")
+    for_samples: int = Field(1, ge=1, le=10000, description="连续满足条件的次数")
+    severity: str = Field("medium", pattern="^(low|medium|high)$")
+    message: str = ""
+    selector: Dict[str, str] = Field(default_factory=dict, description="只作用于匹配的服务器，如 {\"service_type\": \"db\"}")
+
+
+DEFAULT_ALERT_RULES = [
+    AlertRule(rule_id="cpu-high", metric="cpu_usage", op=">", threshold=95, clear_threshold=85, for_samples=3,
+              severity="high", message="CPU usage abnormal"),
+    AlertRule(rule_id="db-cpu-high", metric="cpu_usage", op=">", threshold=90, clear_threshold=80, for_samples=3,
+              severity="high", message="Database CPU usage high", selector={"service_type": "db"}),
+    AlertRule(rule_id="memory-critical", metric="memory_usage", op=">", threshold=92, clear_threshold=85,
+              for_samples=3, severity="high", message="Memory usage critical"),
+    AlertRule(rule_id="load-high", metric="load_1m", op=">", threshold=4.8, clear_threshold=4, for_samples=3,
+              severity="medium", message="System overload detected"),
+    AlertRule(rule_id="network-low", metric="network_in_mbps", op="<", threshold=2, clear_threshold=5,
+              for_samples=2, severity="low", message="Network throughput low", selector={"status": "healthy"}),
+]
+
+
+def load_alert_rules(path: Optional[str]) -> List[AlertRule]:
+    """从 JSON 文件（规则列表）加载告警规则，未指定文件时使用内置规则"""
+    if not path:
+        return list(DEFAULT_ALERT_RULES)
+    with open(path, encoding="utf-8") as f:
+        return [AlertRule(**rule) for rule in json.load(f)]
+
+
+def _compare(op: str, values: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """values [服务器数] 与 thresholds [规则数] 比较，得到 [规则数, 服务器数]"""
+    values, thresholds = values[None, :], thresholds[:, None]
+    if op == ">":
+        return values > thresholds
+    if op == ">=":
+        return values >= thresholds
+    if op == "<":
+        return values < thresholds
+    return values <= thresholds
+
+
+class AlertRuleEngine:
+    """向量化的阈值告警规则引擎
+
+    规则按 (指标, 比较符) 排序，同组规则在排序后的数组中连续；每次评估对每组做一次
+    [规则数, 服务器数] 的广播比较，连续满足次数、触发状态都保存为 [规则数, 服务器数] 的矩阵，
+    整个评估中没有按服务器或按规则的 Python 循环。规则对服务器的适用范围（选择器）在服务器数据变化时重建。
+    """
+
+    def __init__(self, rules: Sequence[AlertRule]):
+        unknown = sorted({rule.metric for rule in rules} - set(METRIC_FIELDS))
+        if unknown:
+            raise ValueError(f"未知的告警规则指标: {', '.join(unknown)}")
+        ids = [rule.rule_id for rule in rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError("告警规则 rule_id 重复")
+
+        self.rules = sorted(rules, key=lambda rule: (METRIC_FIELDS.index(rule.metric), OPERATORS.index(rule.op)))
+        self.thresholds = np.array([rule.threshold for rule in self.rules], dtype=np.float64)
+        self.clear_thresholds = np.array(
+            [rule.threshold if rule.clear_threshold is None else rule.clear_threshold for rule in self.rules],
+            dtype=np.float64)
+        self.for_samples = np.array([rule.for_samples for rule in self.rules], dtype=np.int16)[:, None]
+        self._columns = np.array([METRIC_FIELDS.index(rule.metric) for rule in self.rules], dtype=np.int64)
+
+        # 连续的 (指标列, 比较符, 起始行, 结束行)
+        self._groups: List[Tuple[int, str, int, int]] = []
+        for row, rule in enumerate(self.rules):
+            column = METRIC_FIELDS.index(rule.metric)
+            if self._groups and self._groups[-1][:2] == (column, rule.op):
+                self._groups[-1] = (column, rule.op, self._groups[-1][2], row + 1)
+            else:
+                self._groups.append((column, rule.op, row, row + 1))
+
+        self.server_ids: Tuple[str, ...] = ()
+        self._applicable = np.zeros((len(self.rules), 0), dtype=bool)
+        self._streak = np.zeros((len(self.rules), 0), dtype=np.int16)
+        self._firing = np.zeros((len(self.rules), 0), dtype=bool)
+        self.last_duration = 0.0
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def bind(self, server_ids: Sequence[str], server_index: EntityIndex):
+        """按服务器列表（与指标帧的行顺序一致）重建规则适用矩阵；服务器列表不变时保留触发状态"""
+        server_ids = tuple(server_ids)
+        rows = {server_id: row for row, server_id in enumerate(server_ids)}
+        applicable = np.zeros((len(self.rules), len(server_ids)), dtype=bool)
+        for rule_row, rule in enumerate(self.rules):
+            if not rule.selector:
+                applicable[rule_row] = True
+                continue
+            selector = dict(rule.selector)
+            server_id = selector.pop("server_id", None)
+            filters = {SELECTOR_FIELDS[key]: value for key, value in selector.items() if key in SELECTOR_FIELDS}
+            matched = [server["serverId"] for server in server_index.find(**filters)]
+            if server_id is not None:
+                matched = [matched_id for matched_id in matched if matched_id == server_id]
+            applicable[rule_row, [rows[matched_id] for matched_id in matched if matched_id in rows]] = True
+
+        if server_ids != self.server_ids:
+            self._streak = np.zeros(applicable.shape, dtype=np.int16)
+            self._firing = np.zeros(applicable.shape, dtype=bool)
+        self.server_ids = server_ids
+        self._applicable = applicable
+
+    def carry_over(self, previous: "AlertRuleEngine") -> Dict[int, int]:
+        """规则变更后沿用旧引擎中未变化规则的连续满足次数和触发状态（两者须已绑定同一服务器列表），
+        返回 旧规则行 -> 新规则行"""
+        if previous.server_ids != self.server_ids:
+            return {}
+        new_rows = {rule.rule_id: row for row, rule in enumerate(self.rules)}
+        rows = {old_row: new_rows[rule.rule_id] for old_row, rule in enumerate(previous.rules)
+                if rule.rule_id in new_rows and rule == self.rules[new_rows[rule.rule_id]]}
+        if rows:
+            old_rows, kept_rows = list(rows), list(rows.values())
+            self._streak[kept_rows] = previous._streak[old_rows]
+            # 不再适用的服务器在下一次评估时恢复
+            self._firing[kept_rows] = previous._firing[old_rows]
+        return rows
+
+    def evaluate(self, frame: MetricsFrame) -> Tuple[List[Tuple[int, int, float]], List[Tuple[int, int]]]:
+        """评估一帧指标，返回 (新触发的 (规则行, 服务器行, 指标值), 恢复的 (规则行, 服务器行))"""
+        started = time.perf_counter()
+        breach = np.empty(self._applicable.shape, dtype=bool)
+        holding = np.empty(self._applicable.shape, dtype=bool)
+        for column, op, start, end in self._groups:
+            values = frame.values[:, column]
+            breach[start:end] = _compare(op, values, self.thresholds[start:end])
+            holding[start:end] = _compare(op, values, self.clear_thresholds[start:end])
+        breach &= self._applicable
+        holding &= self._applicable
+
+        # 连续满足次数：不满足时清零，最多计到 for_samples
+        self._streak += 1
+        self._streak *= breach
+        np.minimum(self._streak, self.for_samples, out=self._streak)
+
+        fired = (self._streak >= self.for_samples) & ~self._firing
+        # 滞回：已触发的告警只有越过恢复阈值（或规则不再适用）才恢复
+        resolved = self._firing & ~holding
+        self._firing &= ~resolved
+        self._firing |= fired
+
+        rule_rows, server_rows = np.nonzero(fired)
+        fired_values = frame.values[server_rows, self._columns[rule_rows]]
+        self.last_duration = time.perf_counter() - started
+        return (list(zip(rule_rows.tolist(), server_rows.tolist(), fired_values.tolist())),
+                list(zip(*(rows.tolist() for rows in np.nonzero(resolved)))))
+
+    def firing_counts(self) -> Dict[str, int]:
+        """每条规则当前处于触发状态的服务器数"""
+        counts = self._firing.sum(axis=1).tolist()
+        return {rule.rule_id: count for rule, count in zip(self.rules, counts)}
@@ -0,0 +1,293 @@
+"""
+后端性能基准测试
+
+在进程内通过内存传输驱动 ASGI app（不启动 uvicorn、不经过网络），并直接测量数据生成器的热点函数。
+每个规模在独立子进程中运行，通过 MONITOR_* 环境变量配置服务器数量。
+
+用法：
+    python benchmark.py                      # 运行并与基准对比，性能退化时返回非 0
+    python benchmark.py --sizes 6 1000 5000  # 指定服务器规模
+    python benchmark.py --update-baseline    # 将本次结果保存为基准（基准文件随仓库提交）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent
+BASELINE_FILE = BACKEND_DIR / "benchmark_baseline.json"
+RESULTS_FILE = BACKEND_DIR / "benchmark_results.json"
+
+DEFAULT_SIZES = [6, 1000, 5000]
+DEFAULT_ITERATIONS = 30
+# 单个用例的时间预算（秒），超出后停止迭代（至少运行 MIN_ITERATIONS 次）
+MAX_CASE_SECONDS = 5
+MIN_ITERATIONS = 3
+
+# 超过基准的容忍比例：延迟受机器负载影响较大，响应大小应基本稳定
+LATENCY_TOLERANCE = 0.5
+PAYLOAD_TOLERANCE = 0.1
+
+ENDPOINTS = [
+    "/api/dashboard/static",
+    "/api/dashboard/dynamic",
+    "/api/dashboard/dynamic?format=columnar",
+    "/api/dashboard/dynamic?sections=system_health",
+    "/api/dashboard/dynamic?sections=tasks&fields=tasks.taskId,tasks.status,tasks.progress",
+    "/api/servers",
+    "/api/metrics",
+    "/api/servers/srv-1-1/metrics/history?window=15m",
+    "/api/tasks",
+    "/api/alerts",
+    "/api/system-health",
+    "/api/load-balance",
+    "/api/stats",
+    "/api/search?q=srv-1",
+    "/api/timeseries?minutes=5",
+    "/api/timeseries?metric_type=cpu_usage&minutes=30&max_points=100",
+    "/api/timeseries?minutes=30&format=binary",
+    "/api/timeseries/stats?window=5m&metric_type=cpu_usage",
+    "/api/alert-rules",
+    "/api/stats/percentiles?group_by=cluster&window=15m",
+]
+
+
+def percentile(samples, pct):
+    """计算百分位数（线性插值）"""
+    ordered = sorted(samples)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(name, timings, alloc_bytes, payload_bytes=None):
+    """汇总单个用例的结果（毫秒）"""
+    return {
+        "case": name,
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p95_ms": round(percentile(timings, 95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(timings) * 1000, 3),
+        "alloc_kb": round(alloc_bytes / 1024, 1),
+        "payload_bytes": payload_bytes,
+    }
+
+
+def measure_alloc(func):
+    """单次调用期间的峰值内存分配"""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - baseline)
+
+
+class WorkerBenchmark:
+    """在当前进程中对给定规模运行所有用例"""
+
+    def __init__(self, iterations):
+        # 延迟导入：子进程中 MONITOR_* 环境变量已设置好
+        import main
+        self.main = main
+        self.generator = main.data_generator
+        self.iterations = iterations
+        self.results = []
+
+        # 预热：填充30分钟时间序列并执行一次更新
+        self.generator.warm_up()
+        self.generator.update_data()
+
+    def bench_function(self, name, func, setup=None):
+        """直接测量函数调用"""
+        timings = []
+        for _ in range(self.iterations):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+            if len(timings) >= MIN_ITERATIONS and sum(timings) > MAX_CASE_SECONDS:
+                break
+
+        if setup:
+            setup()
+        self.results.append(summarize(name, timings, measure_alloc(func)))
+
+    def _reset_cursors(self):
+        # 清空游标，使每次都生成完整一分钟的采样点
+        self.generator.series_cursors.clear()
+
+    def _reset_store(self):
+        # 换成空的时间序列存储，使每次都完整填充30分钟
+        from timeseries_store import TimeSeriesStore
+        self.generator.time_series_store = TimeSeriesStore(self.generator.TIME_SERIES_CAPACITY)
+        self.generator.series_cursors.clear()
+        self.generator._series_labels.clear()
+
+    def _next_version(self):
+        # 模拟新的 tick，使快照缓存失效
+        self.generator.version += 1
+        self.generator.publish_state(self.generator.state._replace(version=self.generator.version))
+
+    def run_functions(self):
+        generator = self.generator
+        warmed_store = generator.time_series_store
+        self.bench_function("warm_up", generator.warm_up, setup=self._reset_store)
+        generator.time_series_store = warmed_store
+        self.bench_function("update_data", generator.update_data)
+        self.bench_function("_generate_time_series_arrays(minutes=1)",
+                            lambda: generator._generate_time_series_arrays(minutes=1),
+                            setup=self._reset_cursors)
+        self.bench_function("get_grouped_server_data", generator.get_grouped_server_data)
+        self.bench_function("get_load_balance_status", generator.get_load_balance_status)
+
+    async def _bench_endpoint(self, client, name, path, setup=None):
+        timings = []
+        payload = 0
+        for _ in range(self.iterations):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            response = await client.get(path)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path} 返回 HTTP {response.status_code}: {response.text[:200]}")
+            payload = len(response.content)
+            if len(timings) >= MIN_ITERATIONS and sum(timings) > MAX_CASE_SECONDS:
+                break
+
+        if setup:
+            setup()
+        # 单独统计一次请求的峰值内存分配
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await client.get(path)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.results.append(summarize(name, timings, max(0, peak - baseline), payload))
+
+    async def run_endpoints(self):
+        import httpx
+
+        transport = httpx.ASGITransport(app=self.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for path in ENDPOINTS:
+                await self._bench_endpoint(client, f"GET {path}", path)
+            # 快照缓存未命中（每个请求都是新的 tick）
+            await self._bench_endpoint(client, "GET /api/dashboard/dynamic (new tick)",
+                                       "/api/dashboard/dynamic", setup=self._next_version)
+
+    def run(self):
+        self.run_functions()
+        asyncio.run(self.run_endpoints())
+        return self.results
+
+
+def fleet_env(servers):
+    """根据服务器数量计算集群配置的环境变量"""
+    clusters = max(1, round(servers / 20))
+    env = dict(os.environ)
+    env["MONITOR_CLUSTERS_COUNT"] = str(clusters)
+    env["MONITOR_SERVERS_PER_CLUSTER"] = str(max(1, servers // clusters))
+    return env
+
+
+def run_size(servers, iterations):
+    """在子进程中运行单个规模"""
+    process = subprocess.run(
+        [sys.executable, __file__, "--worker", "--iterations", str(iterations)],
+        cwd=BACKEND_DIR, env=fleet_env(servers), capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"规模 {servers} 运行失败:\n{process.stderr}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(results, baseline):
+    """与基准对比，返回退化项列表"""
+    regressions = []
+    for size, cases in results.items():
+        base_cases = {case["case"]: case for case in baseline.get(size, [])}
+        for case in cases:
+            base = base_cases.get(case["case"])
+            if not base:
+                continue
+            if case["p95_ms"] > base["p95_ms"] * (1 + LATENCY_TOLERANCE):
+                regressions.append(f"[{size}] {case['case']}: p95 {base['p95_ms']}ms -> {case['p95_ms']}ms")
+            if (case["payload_bytes"] and base.get("payload_bytes")
+                    and case["payload_bytes"] > base["payload_bytes"] * (1 + PAYLOAD_TOLERANCE)):
+                regressions.append(f"[{size}] {case['case']}: payload {base['payload_bytes']}B -> {case['payload_bytes']}B")
+    return regressions
+
+
+def print_results(servers, cases):
+    print(f"\n服务器数量: {servers}")
+    print(f"{'case':<66}{'p50':>9}{'p95':>9}{'p99':>9}{'alloc KB':>11}{'bytes':>11}")
+    for case in cases:
+        payload = case["payload_bytes"] if case["payload_bytes"] is not None else "-"
+        print(f"{case['case']:<66}{case['p50_ms']:>9}{case['p95_ms']:>9}{case['p99_ms']:>9}"
+              f"{case['alloc_kb']:>11}{payload:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端性能基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="服务器数量")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="每个用例的迭代次数")
+    parser.add_argument("--update-baseline", action="store_true", help="保存本次结果为基准")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(WorkerBenchmark(args.iterations).run()))
+        return 0
+
+    results = {}
+    for servers in args.sizes:
+        results[str(servers)] = run_size(servers, args.iterations)
+        print_results(servers, results[str(servers)])
+
+    with open(RESULTS_FILE, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"\n结果已保存到 {RESULTS_FILE.name}")
+
+    if args.update_baseline:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"基准已保存到 {BASELINE_FILE.name}")
+        return 0
+
+    if not BASELINE_FILE.exists():
+        print(f"未找到基准文件 {BASELINE_FILE.name}（使用 --update-baseline 生成）")
+        return 2
+
+    with open(BASELINE_FILE, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f))
+    if regressions:
+        print("\n性能退化：")
+        for item in regressions:
+            print(f"  {item}")
+        return 1
+
+    print("\n未发现性能退化")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
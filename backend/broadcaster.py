@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import json
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from timeseries_store import SeriesBatch, from_epoch_ms
+
+# 每个客户端最多缓存的消息数，超出后丢弃最旧的消息
+DEFAULT_CLIENT_QUEUE_SIZE = 4
+
+# 订阅主题：(metric_type, region, server_id)，None 表示不限
+TopicKey = Tuple[Optional[str], Optional[str], Optional[str]]
+
+
+def put_drop_oldest(queue: asyncio.Queue, message: str) -> bool:
+    """放入消息，队列已满时先丢弃最旧的一条，返回是否发生丢弃"""
+    dropped = False
+    if queue.full():
+        queue.get_nowait()
+        dropped = True
+    queue.put_nowait(message)
+    return dropped
+
+
+class DashboardBroadcaster:
+    """WebSocket 广播器：每个 tick 只编码一次，推送到所有客户端的有界队列"""
+
+    def __init__(self, queue_size: int = DEFAULT_CLIENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._clients: Set[asyncio.Queue] = set()
+        self.dropped_messages = 0
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    def subscribe(self) -> asyncio.Queue:
+        """注册一个客户端，返回其消息队列"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """注销客户端"""
+        self._clients.discard(queue)
+
+    def publish(self, message: str):
+        """把已编码的消息放入每个客户端队列，慢客户端丢弃最旧的消息"""
+        for queue in self._clients:
+            if put_drop_oldest(queue, message):
+                self.dropped_messages += 1
+
+
+class TimeSeriesPublisher:
+    """时间序列 SSE 推送：按订阅主题表路由新数据点，每个主题只编码一次"""
+
+    def __init__(self, queue_size: int = DEFAULT_CLIENT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._topics: Dict[TopicKey, Set[asyncio.Queue]] = {}
+        self.dropped_messages = 0
+        # 编码方使用：id(标签) -> (标签, 编码后的标签部分, 命中的主题)，主题集合变化时清空
+        self._series_routes: Dict[int, Tuple[Dict, str, List[TopicKey]]] = {}
+        self._routed_topics: FrozenSet[TopicKey] = frozenset()
+
+    @property
+    def client_count(self) -> int:
+        return sum(len(queues) for queues in self._topics.values())
+
+    def subscribe(self, metric_type: Optional[str] = None, region: Optional[str] = None,
+                  server_id: Optional[str] = None) -> Tuple[TopicKey, asyncio.Queue]:
+        """按筛选条件注册订阅"""
+        topic = (metric_type or None, region or None, server_id or None)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._topics.setdefault(topic, set()).add(queue)
+        return topic, queue
+
+    def unsubscribe(self, topic: TopicKey, queue: asyncio.Queue):
+        """注销订阅，主题无订阅者时移除"""
+        queues = self._topics.get(topic)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._topics[topic]
+
+    def encode(self, points: SeriesBatch) -> Dict[TopicKey, bytes]:
+        """按当前的订阅主题把本次 tick 新产生的数据点编码为 SSE 消息，每个主题只编码一次
+
+        直接读取 SeriesBatch 的列，不构建 TimeSeriesData，可以在工作线程中执行（同一时间只有一个编码方）；
+        编码期间新增的主题从下一批数据开始推送。
+        """
+        topics = frozenset(self._topics)
+        if not topics or not len(points.values):
+            return {}
+        if topics != self._routed_topics:
+            self._series_routes.clear()
+            self._routed_topics = topics
+
+        # 每个点的 JSON 由时间、数值和所属序列预先编码好的标签部分拼接，字段顺序与 TimeSeriesData 一致；
+        # 标签部分和命中的主题按序列缓存（标签字典与存储中登记的是同一个对象）
+        timestamps = points.timestamps.tolist()
+        values = points.values.tolist()
+        iso = {ts: from_epoch_ms(ts).isoformat() for ts in set(timestamps)}
+        routes = self._series_routes
+        batches: Dict[TopicKey, List[str]] = {}
+        for ts, value, labels in zip(timestamps, values, points.labels):
+            route = routes.get(id(labels))
+            if route is None or route[0] is not labels:
+                route = routes[id(labels)] = (labels, json.dumps(labels, ensure_ascii=False)[1:],
+                                              self._route(labels, topics))
+            if route[2]:
+                point = f'{{"timestamp": "{iso[ts]}", "value": {value!r}, {route[1]}'
+                for topic in route[2]:
+                    batches.setdefault(topic, []).append(point)
+
+        return {topic: f"event: timeseries\ndata: [{', '.join(batch)}]\n\n".encode("utf-8")
+                for topic, batch in batches.items()}
+
+    @staticmethod
+    def _route(labels: Dict[str, Optional[str]], topics: FrozenSet[TopicKey]) -> List[TopicKey]:
+        """查找数据点（按所属序列的标签）命中的主题：每个标签取值或通配，只需查表 8 次"""
+        candidates = itertools.product(
+            (labels["metric_type"], None), (labels["region"], None), (labels["server_id"], None)
+        )
+        return [topic for topic in candidates if topic in topics]
+
+    def deliver(self, messages: Dict[TopicKey, bytes]):
+        """把已编码的消息放入各主题订阅者的队列（在事件循环中执行）"""
+        for topic, message in messages.items():
+            for queue in self._topics.get(topic, ()):
+                if put_drop_oldest(queue, message):
+                    self.dropped_messages += 1
@@ -0,0 +1,64 @@
+import json
+import os
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from timeseries_store import DEFAULT_SERIES_CAPACITY
+from metrics_history import DEFAULT_HISTORY_CAPACITY
+
+# 配置文件路径的环境变量
+CONFIG_FILE_ENV = "MONITOR_CONFIG"
+
+# 环境变量前缀，例如 MONITOR_CLUSTERS_COUNT=100
+ENV_PREFIX = "MONITOR_"
+
+
+class GeneratorConfig(BaseModel):
+    """模拟数据生成器配置"""
+    clusters_count: int = Field(3, ge=1, description="集群数量")
+    servers_per_cluster: int = Field(2, ge=1, description="每个集群的服务器数量")
+    metric_types: List[str] = Field(
+        default_factory=lambda: ["cpu_usage", "memory_usage", "disk_io", "network_in", "network_out"],
+        description="时间序列指标类型"
+    )
+    sample_interval_seconds: int = Field(10, ge=1, description="时间序列采样间隔（秒）")
+    time_series_capacity: int = Field(DEFAULT_SERIES_CAPACITY, ge=1, description="每条序列保留的采样点数")
+    task_rate: float = Field(0.2, ge=0, le=1, description="每次更新生成新任务的概率")
+    alert_rate: float = Field(0.15, ge=0, le=1, description="每次更新生成新告警的概率")
+    server_status_rate: float = Field(0.1, ge=0, le=1, description="每次更新一台服务器状态变化的概率")
+    max_tasks: int = Field(20, ge=1, description="保留的任务数量")
+    max_alerts: int = Field(20, ge=1, description="保留的告警数量")
+    metrics_history_capacity: int = Field(DEFAULT_HISTORY_CAPACITY, ge=1, description="每台服务器保留的指标历史帧数（每次更新一帧）")
+    quantile_relative_accuracy: float = Field(0.01, gt=0, lt=1, description="分位数草图的相对误差")
+    quantile_bucket_seconds: int = Field(60, ge=1, description="分位数草图每个时间桶的时长（秒）")
+    quantile_buckets: int = Field(15, ge=1, description="分位数草图保留的时间桶数")
+    alert_rules_file: Optional[str] = Field(None, description="告警规则 JSON 文件（规则列表），为空时使用内置规则")
+    history_dir: Optional[str] = Field(None, description="时间序列历史数据目录，为空时只保存在内存中")
+    history_segment_minutes: int = Field(60, ge=1, description="历史数据每个段文件覆盖的时长（分钟）")
+    history_retention_hours: int = Field(168, ge=1, description="历史数据保留时长（小时）")
+
+
+def _read_env() -> dict:
+    """读取 MONITOR_<字段名> 环境变量，列表字段使用逗号分隔"""
+    values = {}
+    for name, field in GeneratorConfig.model_fields.items():
+        raw = os.environ.get(f"{ENV_PREFIX}{name.upper()}")
+        if raw is None:
+            continue
+        if field.annotation == List[str]:
+            values[name] = [item.strip() for item in raw.split(",") if item.strip()]
+        else:
+            values[name] = raw
+    return values
+
+
+def load_config() -> GeneratorConfig:
+    """加载配置：默认值 < MONITOR_CONFIG 指定的 JSON 文件 < 环境变量"""
+    values = {}
+    config_file = os.environ.get(CONFIG_FILE_ENV)
+    if config_file:
+        with open(config_file, encoding="utf-8") as f:
+            values.update(json.load(f))
+    values.update(_read_env())
+    return GeneratorConfig(**values)
@@ -1,18 +1,76 @@
+import itertools
 import random
+import threading
 import time
 from collections import deque
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
 from models import (
     ServerMetrics, LoadBalanceStatus,
-    SystemHealth, TimeSeriesData
+    SystemHealth
 )
+from timeseries_store import EMPTY_BATCH, SeriesBatch, TimeSeriesStore, from_epoch_ms, to_epoch_ms
+from history_store import HistoryStore
+from entity_index import EntityIndex
+from search_index import SearchIndex
+from config import GeneratorConfig, load_config
+from rolling_stats import RollingStats
+from alert_rules import AlertRule, AlertRuleEngine, load_alert_rules
+from quantile_sketch import GroupQuantileSketches
+from metrics_history import METRIC_FIELDS, MetricsFrame, ServerMetricsHistory
+
+# 任务、告警的索引字段
+TASK_INDEXED_FIELDS = ("status", "cluster")
+ALERT_INDEXED_FIELDS = ("severity", "serverId")
+
+# 各状态服务器的 CPU、内存基准取值范围
+STATUS_METRIC_RANGES = {
+    "healthy": ((20, 70), (30, 75)),
+    "warning": ((60, 85), (70, 88)),
+    "danger": ((85, 98), (85, 95)),
+    "offline": ((0, 10), (0, 20)),
+}
+
+# 全文检索字段及权重
+# 同时作为时间序列标签（region、service_type）的服务器字段
+SERVER_SERIES_LABELS = ("region", "serviceType")
+SERVER_SEARCH_FIELDS = {"serverName": 3, "serverId": 3, "region": 2, "tags": 1, "serviceType": 1, "clusterId": 1}
+TASK_SEARCH_FIELDS = {"taskName": 3, "taskId": 2, "cluster": 1, "targetCluster": 1, "description": 1}
+ALERT_SEARCH_FIELDS = {"message": 3, "serverId": 2, "alarmId": 2, "source": 1}
+
+
+class DataState(NamedTuple):
+    """某个版本对外发布的只读数据快照
+
+    由写入方构建，发布后不再修改；请求处理读取一次 data_generator.state 后只使用这一份快照，
+    不会看到更新过程中的中间状态。
+    """
+    version: int
+    tasks: Tuple[Dict, ...]
+    task_index: EntityIndex
+    alerts: Tuple[Dict, ...]
+    alert_index: EntityIndex
+    latest_time_series: SeriesBatch  # 本次更新新写入的时间序列数据点
+    metrics_frame: MetricsFrame  # 本次更新所有服务器的指标
+    firing_rules: Dict[str, int]  # 告警规则 ID -> 处于触发状态的服务器数
+
 
 class MockDataGenerator:
-    def __init__(self):
-        # 配置 - 基于新的数据结构
-        self.CLUSTERS_COUNT = 3
-        self.SERVERS_PER_CLUSTER = 2
+    def __init__(self, config: Optional[GeneratorConfig] = None):
+        # 配置 - 默认值可通过 MONITOR_* 环境变量或 MONITOR_CONFIG 配置文件覆盖
+        self.config = config or load_config()
+        self.CLUSTERS_COUNT = self.config.clusters_count
+        self.SERVERS_PER_CLUSTER = self.config.servers_per_cluster
+        self.TIME_SERIES_CAPACITY = self.config.time_series_capacity  # 每条序列保留的采样点数
+        self.SAMPLE_INTERVAL_SECONDS = self.config.sample_interval_seconds  # 时间序列采样间隔
+        self.TASK_RATE = self.config.task_rate  # 每次更新生成新任务的概率
+        self.ALERT_RATE = self.config.alert_rate  # 每次更新生成新告警的概率
+        self.SERVER_STATUS_RATE = self.config.server_status_rate  # 每次更新一台服务器状态变化的概率
+        self.MAX_TASKS = self.config.max_tasks  # 保留的任务数量
+        self.MAX_ALERTS = self.config.max_alerts  # 保留的告警数量
 
         # 模拟 faker 的数据生成
         self.regions = ["香港", "贵州", "新加坡", "广州", "北京", "上海", "深圳", "杭州"]
@@ -26,27 +84,81 @@ class MockDataGenerator:
             "Connection pool exhausted", "Cache miss rate high", "Database slow query",
             "Load balancer failure", "Authentication error", "Authorization failed"
         ]
+        self.metric_types = list(self.config.metric_types)
+        self.metric_base_values = {
+            "cpu_usage": 50,
+            "memory_usage": 60,
+            "disk_io": 25,
+            "network_in": 15,
+            "network_out": 12
+        }
 
-        # 内存存储
-        self.metrics_history = {}
+        # 内存存储（任务、告警为写入方私有的工作数据，对外通过 state 快照读取）
+        # 任务、告警字典发布后不再修改，变化时替换为新字典；索引随之增量维护，发布时复制一份
         self.tasks_data = []
-        self.alerts_data = deque(maxlen=100)
-        self.time_series_data = []
+        self.alerts_data = deque()  # 数量上限由 _add_alert 按 MAX_ALERTS 控制
+        self.task_index = EntityIndex("taskId", TASK_INDEXED_FIELDS, sort_fields=())
+        self.alert_index = EntityIndex("alarmId", ALERT_INDEXED_FIELDS, sort_fields=("timestamp",), descending=True)
+        self._alerts_changed = True
+        self.time_series_store = TimeSeriesStore(self.TIME_SERIES_CAPACITY, self.open_history())
+        self.series_cursors: Dict[Tuple[str, str], int] = {}  # (server_id, metric_type) -> 最后生成的采样时间（毫秒）
+        self._series_labels: Dict[Tuple[str, str], Dict] = {}  # (server_id, metric_type) -> 序列标签
+        # 每条序列的滑动窗口统计，随每次写入的新数据点增量更新
+        self.series_stats = RollingStats(self.SAMPLE_INTERVAL_SECONDS)
+        self.rng = np.random.default_rng()
+        self._id_sequence = itertools.count(1)  # 保证同一毫秒内生成的 ID 不重复
+
+        # 数据版本：动态数据每次 update_data 递增，静态数据（集群、服务器）变化时递增
+        self.version = 0
+        self.static_version = 0
+
+        # 实体索引：按 ID 以及常用筛选字段，随实体变化增量维护
+        # 服务器索引同时维护 (维度, 取值, 状态) 计数，分组统计和健康状态无需重新遍历
+        # 任务、告警索引随每个快照构建，见 DataState
+        # 游标分页的排序：服务器、任务按 ID，告警按 (时间戳, ID) 倒序
+        self.server_index = EntityIndex("serverId", ["region", "clusterId", "serviceType", "status", "tags"],
+                                        counted_field="status", sort_fields=())
+        # 服务器 ID -> 在 servers 中的位置，对应 _positioned_servers 这个列表
+        self._server_positions: Dict[str, int] = {}
+        self._positioned_servers: Optional[List[Dict]] = None
+        # 全文检索索引：服务器、任务、告警增删时增量维护，检索结果按 ID 从当前快照读取
+        self.server_search = SearchIndex("serverId", SERVER_SEARCH_FIELDS)
+        self.task_search = SearchIndex("taskId", TASK_SEARCH_FIELDS)
+        self.alert_search = SearchIndex("alarmId", ALERT_SEARCH_FIELDS)
 
         # 初始化数据
         self.clusters = self._generate_clusters()
         self.servers = self._generate_servers()
+        # 服务器检索索引的建立较慢，在 warm_up 中进行
+        for server in self.servers:
+            self.server_index.add(server)
 
         # 初始化任务和告警
         for _ in range(10):
-            self.tasks_data.append(self._generate_task())
+            self._add_task(self._generate_task())
 
         for _ in range(20):
-            self.alerts_data.append(self._generate_alert())
-
-        # 初始化指标历史
-        for server in self.servers:
-            self.metrics_history[server["serverId"]] = deque(maxlen=450)
+            self._add_alert(self._generate_alert())
+
+        # 服务器指标历史：每次更新记录一帧
+        self.metrics_history = ServerMetricsHistory([server["serverId"] for server in self.servers],
+                                                    self.config.metrics_history_capacity)
+        # 分组分位数草图：每帧指标按地域、集群、服务类型计入当前时间桶
+        self.quantile_sketches = self._new_quantile_sketches()
+        self._sketch_static_version = None  # 草图分组对应的静态数据版本
+        self._record_metrics()
+
+        # 告警规则引擎：每次更新对最新的指标帧评估所有规则
+        self.alert_rules: List[AlertRule] = load_alert_rules(self.config.alert_rules_file)  # 按添加顺序
+        self.alert_engine = AlertRuleEngine(self.alert_rules)
+        # 接口修改规则后新建的引擎，由写入方在下一次评估前切换
+        self._pending_alert_engine: Optional[AlertRuleEngine] = None
+        self._alert_rules_lock = threading.Lock()
+        self._rules_static_version = None  # 规则适用范围对应的静态数据版本
+        self._rule_alarms: Dict[Tuple[int, int], str] = {}  # (规则行, 服务器行) -> 未恢复的告警 ID
+        self._firing_rules = self.alert_engine.firing_counts()
+
+        self.state = self._build_state(EMPTY_BATCH)
 
     def _generate_clusters(self) -> List[Dict]:
         """生成集群数据"""
@@ -104,7 +216,7 @@ class MockDataGenerator:
     def _generate_task(self) -> Dict:
         """生成任务数据"""
         return {
-            "taskId": f"task-{int(time.time() * 1000)}",
+            "taskId": f"task-{int(time.time() * 1000)}-{next(self._id_sequence)}",
             "taskName": random.choice(self.phrases),
             "cluster": random.choice(self.clusters)["clusterId"],
             "targetCluster": random.choice(self.clusters)["clusterId"],
@@ -120,7 +232,7 @@ class MockDataGenerator:
         """生成告警数据"""
         server = random.choice(self.servers)
         return {
-            "alarmId": f"alarm-{int(time.time() * 1000)}",
+            "alarmId": f"alarm-{int(time.time() * 1000)}-{next(self._id_sequence)}",
             "serverId": server["serverId"],
             "timestamp": int(time.time() * 1000) - random.randint(0, 1800) * 1000,
             "source": random.choice(["nginx", "disk-monitor", "task-runner", "system", "network"]),
@@ -129,85 +241,196 @@ class MockDataGenerator:
             "resolved": random.random() < 0.3
         }
 
-    def _generate_time_series_data(self, minutes: int = 30) -> List[TimeSeriesData]:
-        """生成时间序列数据"""
-        data = []
-        end_time = datetime.now()
-        start_time = end_time - timedelta(minutes=minutes)
-
-        metric_types = ["cpu_usage", "memory_usage", "disk_io", "network_in", "network_out"]
-
-        for metric_type in metric_types:
-            current_time = start_time
-            while current_time <= end_time:
-                for server in self.servers:
-                    base_value = {
-                        "cpu_usage": 50,
-                        "memory_usage": 60,
-                        "disk_io": 25,
-                        "network_in": 15,
-                        "network_out": 12
-                    }.get(metric_type, 50)
-
-                    time_factor = random.uniform(-15, 15)
-                    value = max(0, base_value + time_factor)
-
-                    data.append(TimeSeriesData(
-                        timestamp=current_time,
-                        value=round(value, 2),
-                        metric_type=metric_type,
-                        server_id=server["serverId"],
-                        region=server["region"],
-                        service_type=server["serviceType"]
-                    ))
-
-                current_time += timedelta(seconds=10)
-
-        return data
+    def _add_task(self, task: Dict):
+        """加入任务，超出数量上限时淘汰最旧的任务"""
+        self.tasks_data.append(task)
+        self.task_index.add(task)
+        self.task_search.add(task)
+        for evicted in self.tasks_data[:-self.MAX_TASKS]:
+            self.task_index.remove(evicted["taskId"])
+            self.task_search.remove(evicted["taskId"])
+        del self.tasks_data[:-self.MAX_TASKS]
+
+    def _add_alert(self, alert: Dict):
+        """加入告警，超出数量上限时淘汰最旧的告警"""
+        self.alerts_data.append(alert)
+        self.alert_index.add(alert)
+        self.alert_search.add(alert)
+        while len(self.alerts_data) > self.MAX_ALERTS:
+            evicted = self.alerts_data.popleft()["alarmId"]
+            self.alert_index.remove(evicted)
+            self.alert_search.remove(evicted)
+        self._alerts_changed = True
+
+    def _build_state(self, latest_time_series) -> DataState:
+        """由工作数据构建只读快照：实体字典发布后不再修改，直接共享；增量维护的索引复制一份发布，
+        告警未变化时复用上一个快照"""
+        tasks = tuple(self.tasks_data)
+        task_index = self.task_index.copy()
+
+        previous = getattr(self, "state", None)
+        if previous is None or self._alerts_changed:
+            alerts = tuple(self.alerts_data)
+            alert_index = self.alert_index.copy()
+            self._alerts_changed = False
+        else:
+            alerts, alert_index = previous.alerts, previous.alert_index
 
-    def update_data(self):
-        """更新实时数据"""
-        # 更新任务进度
-        for task in self.tasks_data:
+        return DataState(self.version, tasks, task_index, alerts, alert_index, latest_time_series,
+                         self.metrics_frame, self._firing_rules)
+
+    def open_history(self, read_only: bool = False) -> Optional[HistoryStore]:
+        """按配置打开磁盘历史存储，未配置目录时返回 None"""
+        if not self.config.history_dir:
+            return None
+        return HistoryStore(
+            self.config.history_dir,
+            interval_ms=self.SAMPLE_INTERVAL_SECONDS * 1000,
+            segment_ms=self.config.history_segment_minutes * 60 * 1000,
+            retention_ms=self.config.history_retention_hours * 3600 * 1000,
+            read_only=read_only
+        )
+
+    def warm_up(self, minutes: int = 30):
+        """启动时建立服务器检索索引并填充时间序列：先从磁盘历史恢复，再生成最近 minutes 分钟内缺失的采样点
+
+        生成按数组批量进行，不构建 TimeSeriesData；写入期间读取方可以看到已填充的部分。
+        """
+        self.rebuild_server_search()
+        store = self.time_series_store
+        store.restore_from_history(to_epoch_ms(datetime.now()), self.SAMPLE_INTERVAL_SECONDS * 1000)
+        # 已恢复的序列从最后一个点之后继续生成
+        for key, last in store.last_timestamps().items():
+            self.series_cursors[key] = last
+        self._generate_time_series_arrays(minutes=minutes)
+        self.series_stats.seed(store.tails(self.series_stats.depth))
+
+    def _align_sample_time(self, value: datetime) -> datetime:
+        """将时间向下对齐到采样间隔"""
+        interval = self.SAMPLE_INTERVAL_SECONDS
+        aligned = int(value.timestamp()) // interval * interval
+        return datetime.fromtimestamp(aligned)
+
+    def _generate_time_series_arrays(self, minutes: int = 30) -> SeriesBatch:
+        """向量化生成时间序列并直接写入存储：每个指标类型一次生成 [服务器数, 采样点数] 的数值矩阵，
+        每条序列只写入游标之后到期的部分（最多回溯 minutes 分钟），返回写入的点
+
+        启动填充和每次更新都使用这一路径，不构建 TimeSeriesData。
+        """
+        interval_ms = self.SAMPLE_INTERVAL_SECONDS * 1000
+        end_ms = to_epoch_ms(self._align_sample_time(datetime.now()))
+        grid = np.arange(end_ms - minutes * 60 * 1000, end_ms + 1, interval_ms, dtype=np.int64)
+        written = []
+        # 先登记所有序列再写入，磁盘历史的每个时间段只建一个 part
+        series_labels = {metric_type: self._metric_series_labels(metric_type) for metric_type in self.metric_types}
+
+        for metric_type in self.metric_types:
+            keys = [(server["serverId"], metric_type) for server in self.servers]
+            cursors = np.array([self.series_cursors.get(key, -1) for key in keys], dtype=np.int64)
+            starts = np.searchsorted(grid, cursors, side="right")
+            first = int(starts.min(initial=len(grid)))
+            if first >= len(grid):
+                continue
+            # 只生成至少有一条序列到期的列
+            base_value = self.metric_base_values.get(metric_type, 50)
+            values = np.round(np.maximum(0, base_value + self.rng.uniform(-15, 15, (len(keys), len(grid) - first))), 2)
+
+            labels = series_labels[metric_type]
+            for start in np.unique(starts[starts < len(grid)]).tolist():
+                # 游标相同的序列共用同一组时间戳，一次写入（每次更新通常只有一组）
+                rows = np.nonzero(starts == start)[0].tolist()
+                for row in rows:
+                    self.series_cursors[keys[row]] = end_ms
+                # 按指标类型分批写入，读取方尽早看到已生成的序列
+                written.append(self.time_series_store.extend_aligned(
+                    [labels[row] for row in rows], grid[start:], values[rows, start - first:]))
+
+        written = [batch for batch in written if len(batch.timestamps)]
+        if not written:
+            return EMPTY_BATCH
+        if len(written) == 1:
+            return written[0]
+        return SeriesBatch(tuple(itertools.chain.from_iterable(batch.labels for batch in written)),
+                           np.concatenate([batch.timestamps for batch in written]),
+                           np.concatenate([batch.values for batch in written]))
+
+    def _metric_series_labels(self, metric_type: str) -> List[Dict[str, Optional[str]]]:
+        """某个指标类型各服务器序列的标签（与 servers 顺序一致），新出现的序列登记到存储"""
+        result, created = [], []
+        for server in self.servers:
+            key = (server["serverId"], metric_type)
+            labels = self._series_labels.get(key)
+            if labels is None:
+                labels = self._series_labels[key] = {
+                    "metric_type": metric_type,
+                    "server_id": server["serverId"],
+                    "region": server["region"],
+                    "service_type": server["serviceType"],
+                }
+                created.append(labels)
+            result.append(labels)
+        if created:
+            self.time_series_store.register(created)
+        return result
+
+    def prepare_update(self) -> DataState:
+        """更新工作数据并构建下一个快照（不发布）
+
+        只修改写入方私有的数据，可以在工作线程中执行；同一时间只能有一个写入方。
+        """
+        # 更新任务进度（已发布的任务不原地修改，替换为新的字典）
+        for position, task in enumerate(self.tasks_data):
             if task["status"] == "running":
-                task["progress"] = min(100, task["progress"] + random.randint(1, 5))
+                task = dict(task, progress=min(100, task["progress"] + random.randint(1, 5)))
                 if task["progress"] >= 100:
                     task["status"] = "completed"
             elif random.random() < 0.1:
-                task["status"] = random.choice(["running", "failed", "queued"])
+                task = dict(task, status=random.choice(["running", "failed", "queued"]))
+            else:
+                continue
+            self.tasks_data[position] = task
+            self.task_index.replace(task)
+
+        # 随机生成新的任务（超出上限时淘汰最旧的任务）
+        if random.random() < self.TASK_RATE:
+            self._add_task(self._generate_task())
 
-        # 随机生成新的任务
-        if random.random() < 0.2:
-            self.tasks_data.append(self._generate_task())
+        # 随机生成新的告警（超出上限时淘汰最旧的告警）
+        if random.random() < self.ALERT_RATE:
+            self._add_alert(self._generate_alert())
 
-        # 限制任务数量
-        if len(self.tasks_data) > 20:
-            self.tasks_data = self.tasks_data[-20:]
+        # 随机改变一台服务器的状态（同步服务器索引、分组计数和静态数据版本）
+        if self.servers and random.random() < self.SERVER_STATUS_RATE:
+            server = random.choice(self.servers)
+            status = random.choice([status for status in STATUS_METRIC_RANGES if status != server["status"]])
+            self.update_server(server, "status", status)
 
-        # 随机生成新的告警
-        if random.random() < 0.15:
-            new_alert = self._generate_alert()
-            self.alerts_data.append(new_alert)
+        # 更新时间序列数据：只生成新到期的采样点（环形缓冲区自动淘汰最旧的数据）
+        latest_time_series = self._generate_time_series_arrays(minutes=1)
+        self.series_stats.update(latest_time_series)
 
-        # 限制告警数量
-        if len(self.alerts_data) > 20:
-            self.alerts_data = deque(list(self.alerts_data)[-20:], maxlen=100)
+        # 生成并记录所有服务器本次的指标，按告警规则评估
+        self._record_metrics()
+        self._evaluate_alert_rules()
 
-        # 更新时间序列数据
-        new_data = self._generate_time_series_data(minutes=1)
-        self.time_series_data.extend(new_data)
+        self.version += 1
+        return self._build_state(latest_time_series)
 
-        # 限制时间序列数据数量
-        if len(self.time_series_data) > 5000:
-            self.time_series_data = self.time_series_data[-5000:]
+    def publish_state(self, state: DataState):
+        """发布快照：单次引用赋值，读取方要么看到旧快照，要么看到新快照"""
+        self.state = state
+
+    def update_data(self):
+        """更新实时数据并发布新快照"""
+        self.publish_state(self.prepare_update())
 
     def get_system_health(self) -> SystemHealth:
         """获取系统健康状态"""
-        total = len(self.servers)
-        healthy = sum(1 for s in self.servers if s["status"] == "healthy")
-        warning = sum(1 for s in self.servers if s["status"] == "warning")
-        danger = sum(1 for s in self.servers if s["status"] == "danger")
-        offline = sum(1 for s in self.servers if s["status"] == "offline")
+        total = len(self.server_index)
+        healthy = self.server_index.count("status", "healthy")
+        warning = self.server_index.count("status", "warning")
+        danger = self.server_index.count("status", "danger")
+        offline = self.server_index.count("status", "offline")
 
         # 确定整体状态
         if danger > 0 or (warning / total > 0.3):
@@ -227,20 +450,14 @@ class MockDataGenerator:
             timestamp=datetime.now()
         )
 
-    def get_load_balance_status(self) -> LoadBalanceStatus:
-        """获取负载均衡状态"""
-        network_data = []
-        server_ids = []
+    def get_load_balance_status(self, state: Optional[DataState] = None) -> LoadBalanceStatus:
+        """获取负载均衡状态（基于给定快照的指标，默认为当前快照）"""
+        frame = (state or self.state).metrics_frame
+        online = np.array([server["status"] != "offline" for server in self.servers], dtype=bool)
+        rows = np.array([self.metrics_history.row(server["serverId"]) for server in self.servers], dtype=np.int64)
+        rows = rows[online]
 
-        for server in self.servers:
-            if server["status"] != "offline":
-                # 生成当前指标
-                metrics = self._generate_single_server_metrics(server["serverId"])
-                total_traffic = metrics.network_in_mbps + metrics.network_out_mbps
-                network_data.append(total_traffic)
-                server_ids.append(server["serverId"])
-
-        if not network_data:
+        if not len(rows):
             return LoadBalanceStatus(
                 is_balanced=True,
                 ratio=1.0,
@@ -248,120 +465,309 @@ class MockDataGenerator:
                 traffic_distribution={}
             )
 
-        max_traffic = max(network_data)
-        min_traffic = min(network_data)
+        traffic = np.round(frame.values[rows, METRIC_FIELDS.index("network_in_mbps")]
+                           + frame.values[rows, METRIC_FIELDS.index("network_out_mbps")], 2)
+        max_traffic = float(traffic.max())
+        min_traffic = float(traffic.min())
         ratio = max_traffic / min_traffic if min_traffic > 0 else 1.0
 
-        traffic_distribution = {}
-        for i, server_id in enumerate(server_ids):
-            if i < len(network_data):
-                traffic_distribution[server_id] = network_data[i]
+        server_ids = [server["serverId"] for server in self.servers if server["status"] != "offline"]
+        traffic_distribution = dict(zip(server_ids, traffic.tolist()))
 
         return LoadBalanceStatus(
             is_balanced=ratio < 3.0,
             ratio=round(ratio, 2),
-            server_count=len(network_data),  # 修复：确保返回正确的服务器数量
+            server_count=len(traffic),
             traffic_distribution=traffic_distribution
         )
 
-    def _generate_single_server_metrics(self, server_id: str) -> ServerMetrics:
-        """为单个服务器生成指标"""
-        server = next((s for s in self.servers if s["serverId"] == server_id), None)
-        if not server:
+    def _generate_metrics_frame(self) -> MetricsFrame:
+        """按服务器状态向量化生成所有服务器的指标"""
+        size = len(self.metrics_history.server_ids)
+        ranges = np.array([STATUS_METRIC_RANGES.get(self.server_index.get(server_id)["status"],
+                                                    STATUS_METRIC_RANGES["offline"])
+                           for server_id in self.metrics_history.server_ids], dtype=np.float64).reshape(size, 2, 2)
+        uniform = self.rng.uniform
+
+        cpu_usage = np.clip(uniform(ranges[:, 0, 0], ranges[:, 0, 1]) + uniform(-10, 10, size), 0, 100)
+        memory_usage = np.clip(uniform(ranges[:, 1, 0], ranges[:, 1, 1]) + uniform(-8, 8, size), 0, 100)
+        disk_usage = uniform(20, 80, size)
+
+        network_in = np.maximum(0, uniform(5, 50, size) + uniform(-5, 15, size))
+        network_out = np.maximum(0, network_in * 0.7 + uniform(-3, 10, size))
+
+        load_1m = np.maximum(0, cpu_usage / 20 + uniform(-0.5, 0.5, size))
+        load_5m = load_1m * 0.85 + uniform(-0.3, 0.3, size)
+        load_15m = load_5m * 0.9 + uniform(-0.2, 0.2, size)
+
+        columns = {
+            "cpu_usage": cpu_usage, "memory_usage": memory_usage, "disk_usage": disk_usage,
+            "network_in_mbps": network_in, "network_out_mbps": network_out,
+            "load_1m": load_1m, "load_5m": load_5m, "load_15m": load_15m,
+        }
+        values = np.round(np.column_stack([columns[field] for field in METRIC_FIELDS]), 2)
+        return MetricsFrame(to_epoch_ms(datetime.now()), values)
+
+    def _record_metrics(self):
+        """生成本次的指标帧并写入历史"""
+        self.metrics_frame = self._generate_metrics_frame()
+        self.metrics_history.append(self.metrics_frame)
+        self.record_quantiles(self.metrics_frame)
+
+    def record_quantiles(self, frame: MetricsFrame):
+        """把一帧指标计入分组分位数草图，静态数据变化后先按新的服务器列表重建分组"""
+        if self._sketch_static_version != self.static_version:
+            self.quantile_sketches.bind(self.servers)
+            self._sketch_static_version = self.static_version
+        self.quantile_sketches.add(frame)
+
+    def set_alert_rules(self, rules: List[AlertRule]):
+        """替换告警规则（可在请求处理中调用）：校验通过后由写入方在下一次评估前切换，
+        未变化的规则保留触发状态，删除或修改的规则未恢复的告警标记为已解决；规则无效时抛出 ValueError"""
+        engine = AlertRuleEngine(rules)
+        with self._alert_rules_lock:
+            self.alert_rules = list(rules)
+            self._pending_alert_engine = engine
+
+    def _switch_alert_engine(self, engine: AlertRuleEngine) -> Set[str]:
+        """切换到新的规则引擎，返回删除或修改的规则未恢复的告警 ID"""
+        engine.bind(self.metrics_history.server_ids, self.server_index)
+        rows = engine.carry_over(self.alert_engine)
+        rule_alarms, dropped = {}, set()
+        for (rule_row, server_row), alarm_id in self._rule_alarms.items():
+            if rule_row in rows:
+                rule_alarms[(rows[rule_row], server_row)] = alarm_id
+            else:
+                dropped.add(alarm_id)
+        self._rule_alarms = rule_alarms
+        self.alert_engine = engine
+        self._rules_static_version = self.static_version
+        return dropped
+
+    def _evaluate_alert_rules(self):
+        """对本次的指标帧评估告警规则：新触发的生成告警，恢复的将对应告警标记为已解决"""
+        with self._alert_rules_lock:
+            pending, self._pending_alert_engine = self._pending_alert_engine, None
+        resolved_ids = self._switch_alert_engine(pending) if pending is not None else set()
+
+        engine = self.alert_engine
+        if self._rules_static_version != self.static_version:
+            if engine.server_ids != self.metrics_history.server_ids:
+                self._rule_alarms.clear()
+            engine.bind(self.metrics_history.server_ids, self.server_index)
+            self._rules_static_version = self.static_version
+
+        fired, resolved = engine.evaluate(self.metrics_frame)
+        timestamp = self.metrics_frame.timestamp
+        for rule_row, server_row, value in fired:
+            rule = engine.rules[rule_row]
+            alert = {
+                "alarmId": f"alarm-{timestamp}-{next(self._id_sequence)}",
+                "serverId": engine.server_ids[server_row],
+                "timestamp": timestamp,
+                "source": "rule-engine",
+                "severity": rule.severity,
+                "message": rule.message or f"{rule.metric} {rule.op} {rule.threshold:g}",
+                "resolved": False,
+                "ruleId": rule.rule_id,
+                "value": value,
+            }
+            self._add_alert(alert)
+            self._rule_alarms[(rule_row, server_row)] = alert["alarmId"]
+
+        resolved_ids.update(self._rule_alarms.pop(key) for key in resolved if key in self._rule_alarms)
+        if resolved_ids:
+            # 已发布的告警不原地修改，替换为新的字典
+            alerts = deque()
+            for alert in self.alerts_data:
+                if alert["alarmId"] in resolved_ids:
+                    alert = dict(alert, resolved=True, resolvedAt=timestamp)
+                    self.alert_index.replace(alert)
+                alerts.append(alert)
+            self.alerts_data = alerts
+            self._alerts_changed = True
+        self._firing_rules = engine.firing_counts()
+
+    def _new_quantile_sketches(self) -> GroupQuantileSketches:
+        return GroupQuantileSketches(self.config.quantile_relative_accuracy,
+                                     self.config.quantile_bucket_seconds,
+                                     self.config.quantile_buckets)
+
+    def reset_metrics_history(self, discard: bool = False):
+        """服务器列表变化时（共享模式下由生产进程提供）按新的服务器列表重建指标历史；
+        discard 时无论服务器列表是否变化都清空指标历史和分位数草图（共享模式首次同步时，
+        丢弃本进程初始化时自行生成的指标帧，之后只记录生产进程发布的帧）"""
+        server_ids = tuple(server["serverId"] for server in self.servers)
+        if discard or server_ids != self.metrics_history.server_ids:
+            self.metrics_history = ServerMetricsHistory(server_ids, self.config.metrics_history_capacity)
+        if discard:
+            self.quantile_sketches = self._new_quantile_sketches()
+            self._sketch_static_version = None
+
+    def get_server_metrics(self, server_id: str) -> Optional[ServerMetrics]:
+        """读取当前快照中单个服务器的指标"""
+        row = self.metrics_history.row(server_id)
+        if row is None:
             return None
-
-        if server["status"] == "healthy":
-            cpu_base = random.uniform(20, 70)
-            memory_base = random.uniform(30, 75)
-        elif server["status"] == "warning":
-            cpu_base = random.uniform(60, 85)
-            memory_base = random.uniform(70, 88)
-        elif server["status"] == "danger":
-            cpu_base = random.uniform(85, 98)
-            memory_base = random.uniform(85, 95)
-        else:  # offline
-            cpu_base = random.uniform(0, 10)
-            memory_base = random.uniform(0, 20)
-
-        cpu_usage = max(0, min(100, cpu_base + random.uniform(-10, 10)))
-        memory_usage = max(0, min(100, memory_base + random.uniform(-8, 8)))
-
-        network_in = max(0, random.uniform(5, 50) + random.uniform(-5, 15))
-        network_out = max(0, network_in * 0.7 + random.uniform(-3, 10))
-
-        load_1m = max(0, cpu_usage / 20 + random.uniform(-0.5, 0.5))
-        load_5m = load_1m * 0.85 + random.uniform(-0.3, 0.3)
-        load_15m = load_5m * 0.9 + random.uniform(-0.2, 0.2)
-
+        frame = self.state.metrics_frame
         return ServerMetrics(
             server_id=server_id,
-            timestamp=datetime.now(),
-            cpu_usage=round(cpu_usage, 2),
-            memory_usage=round(memory_usage, 2),
-            disk_usage=round(random.uniform(20, 80), 2),
-            network_in_mbps=round(network_in, 2),
-            network_out_mbps=round(network_out, 2),
-            load_1m=round(load_1m, 2),
-            load_5m=round(load_5m, 2),
-            load_15m=round(load_15m, 2)
+            timestamp=from_epoch_ms(frame.timestamp),
+            **dict(zip(METRIC_FIELDS, frame.values[row].tolist()))
         )
 
-    def get_grouped_server_data(self) -> Dict:
-        """获取分组服务器数据"""
-        grouped_data = {
-            "by_region": {},
-            "by_service_type": {},
-            "by_cluster": {},  # 新增按集群分组
-            "overall": {
-                "healthy": 0,
-                "warning": 0,
-                "danger": 0,
-                "offline": 0
+    def get_all_server_metrics(self, state: Optional[DataState] = None) -> List[Dict]:
+        """快照中所有服务器的指标，结构与 ServerMetrics.dict() 相同"""
+        frame = (state or self.state).metrics_frame
+        timestamp = from_epoch_ms(frame.timestamp)
+        return [
+            {"server_id": server_id, "timestamp": timestamp, **dict(zip(METRIC_FIELDS, row))}
+            for server_id, row in zip(self.metrics_history.server_ids, frame.values.tolist())
+        ]
+
+    def get_series_stats(self, window: str, metric_type: Optional[str] = None, region: Optional[str] = None,
+                         server_id: Optional[str] = None, service_type: Optional[str] = None) -> List[Dict]:
+        """读取已发布的滑动窗口统计：按标签筛选序列后直接取对应的行"""
+        snapshot = self.series_stats.snapshot
+        stats = snapshot.windows[window]
+        keys = self.time_series_store.series_keys(metric_type=metric_type, region=region,
+                                                  server_id=server_id, service_type=service_type)
+        rows = np.array(sorted(row for row in map(snapshot.rows.get, keys) if row is not None), dtype=np.int64)
+        columns = {field: np.round(values[rows], 4).tolist() for field, values in stats.items()}
+        return [
+            {**snapshot.labels[row], **{field: columns[field][i] for field in columns}}
+            for i, row in enumerate(rows.tolist())
+        ]
+
+    def get_server_metrics_history(self, server_id: str, window_ms: int) -> Optional[Dict]:
+        """单个服务器最近 window_ms 内的指标历史（按列输出），附带各指标的最小、最大、平均值"""
+        if server_id not in self.metrics_history:
+            return None
+        ts, values = self.metrics_history.window(server_id, to_epoch_ms(datetime.now()) - window_ms)
+        if len(ts):
+            summary = {
+                "min": dict(zip(METRIC_FIELDS, values.min(axis=0).tolist())),
+                "max": dict(zip(METRIC_FIELDS, values.max(axis=0).tolist())),
+                "avg": dict(zip(METRIC_FIELDS, np.round(values.mean(axis=0), 2).tolist())),
             }
+        else:
+            summary = {"min": None, "max": None, "avg": None}
+        return {
+            "server_id": server_id,
+            "t": ts.tolist(),
+            "columns": {field: values[:, i].tolist() for i, field in enumerate(METRIC_FIELDS)},
+            **summary,
         }
 
-        # 按区域分组
-        for region in self.regions:
-            region_servers = [s for s in self.servers if s["region"] == region]
-            grouped_data["by_region"][region] = {
-                "total": len(region_servers),
-                "healthy": len([s for s in region_servers if s["status"] == "healthy"]),
-                "warning": len([s for s in region_servers if s["status"] == "warning"]),
-                "danger": len([s for s in region_servers if s["status"] == "danger"]),
-                "offline": len([s for s in region_servers if s["status"] == "offline"]),
-                "servers": region_servers
-            }
+    def get_group_percentiles(self, group_by: Optional[str], window_seconds: int) -> Dict:
+        """窗口内各分组 CPU、内存、网络指标的 p50/p95/p99（合并分组草图得到），group_by 为空时返回整体结果"""
+        sketches = self.quantile_sketches
+        return {
+            "group_by": group_by,
+            "window_seconds": window_seconds,
+            "relative_accuracy": sketches.binning.relative_accuracy,
+            "bucket_seconds": sketches.bucket_seconds,
+            "retention_seconds": sketches.retention_seconds,
+            "groups": sketches.quantiles(group_by, window_seconds),
+        }
 
-        # 按服务类型分组
-        for service_type in self.service_types:
-            service_servers = [s for s in self.servers if s["serviceType"] == service_type]
-            grouped_data["by_service_type"][service_type] = {
-                "total": len(service_servers),
-                "healthy": len([s for s in service_servers if s["status"] == "healthy"]),
-                "warning": len([s for s in service_servers if s["status"] == "warning"]),
-                "danger": len([s for s in service_servers if s["status"] == "danger"]),
-                "offline": len([s for s in service_servers if s["status"] == "offline"]),
-                "servers": service_servers
-            }
+    def update_server(self, server: Dict, field: str, value):
+        """修改服务器字段（状态、区域、集群等），同步索引、分组计数和时间序列标签
+
+        已发布的服务器字典、列表和索引不原地修改（写时复制）：索引只复制变化字段涉及的 posting 和计数，
+        服务器列表浅拷贝一次后替换该位置，完成后整体替换引用，读取方看到的总是修改前或修改后的完整数据。
+        区域、服务类型变化时，该服务器各指标序列的标签和时间序列倒排索引同步修改。
+        """
+        updated = dict(server, **{field: value})
+        server_index = self.server_index.replaced(updated)
+        servers = list(self.servers)
+        servers[self._server_position(updated["serverId"])] = updated
+        self.servers = servers
+        self._positioned_servers = servers
+        self.server_index = server_index
+        if field in SERVER_SERIES_LABELS:
+            self._relabel_server_series(updated)
+        if field in SERVER_SEARCH_FIELDS:
+            self.server_search.add(updated)
+        self.static_version += 1
+
+    def _server_position(self, server_id: str) -> int:
+        """服务器在 servers 列表中的位置，servers 被整体替换（如共享模式同步）后重建"""
+        if self._positioned_servers is not self.servers:
+            self._server_positions = {server["serverId"]: i for i, server in enumerate(self.servers)}
+            self._positioned_servers = self.servers
+        return self._server_positions[server_id]
+
+    def _relabel_server_series(self, server: Dict):
+        """服务器的区域、服务类型变化后，修改其各指标序列的标签"""
+        for metric_type in self.metric_types:
+            key = (server["serverId"], metric_type)
+            if key not in self._series_labels:
+                continue
+            labels = dict(self._series_labels[key], region=server["region"], service_type=server["serviceType"])
+            self._series_labels[key] = labels
+            self.time_series_store.relabel(labels)
+
+    def rebuild_server_search(self):
+        """整体重建服务器检索索引（启动填充、共享模式下服务器列表被整体替换时使用），建好后整体替换"""
+        server_search = SearchIndex("serverId", SERVER_SEARCH_FIELDS)
+        for server in self.servers:
+            server_search.add(server)
+        self.server_search = server_search
+
+    def sync_search(self, state: DataState):
+        """按快照同步任务、告警检索索引（共享模式下数据由生产进程生成时使用）"""
+        self.task_search.sync(state.tasks)
+        self.alert_search.sync(state.alerts)
+
+    def search(self, query: str, types: Tuple[str, ...] = ("servers", "tasks", "alerts"),
+               limit: Optional[int] = None, offset: int = 0) -> Dict:
+        """全文检索：每种类型按得分分页，返回各类型当前页的实体及命中总数"""
+        state = self.state
+        sources = {
+            "servers": (self.server_search, self.server_index),
+            "tasks": (self.task_search, state.task_index),
+            "alerts": (self.alert_search, state.alert_index),
+        }
+        results = {"servers": [], "tasks": [], "alerts": [], "counts": {}}
+        for name in types:
+            search_index, entity_index = sources[name]
+            total, ids = search_index.search(query, limit, offset)
+            # 检索索引可能领先于已发布的快照，只返回快照中存在的实体
+            results[name] = [entity for entity in map(entity_index.get, ids) if entity is not None]
+            results["counts"][name] = total
+        return results
+
+    @staticmethod
+    def _get_group_summary(server_index: EntityIndex, field: str, value: str) -> Dict:
+        """读取单个分组的状态计数和服务器列表"""
+        counts = server_index.counts_by(field, value)
+        return {
+            "total": server_index.count(field, value),
+            "healthy": counts.get("healthy", 0),
+            "warning": counts.get("warning", 0),
+            "danger": counts.get("danger", 0),
+            "offline": counts.get("offline", 0),
+            "servers": server_index.find(**{field: value})
+        }
 
-        # 按集群分组
-        for cluster in self.clusters:
-            cluster_servers = [s for s in self.servers if s["clusterId"] == cluster["clusterId"]]
-            grouped_data["by_cluster"][cluster["clusterId"]] = {
-                "total": len(cluster_servers),
-                "healthy": len([s for s in cluster_servers if s["status"] == "healthy"]),
-                "warning": len([s for s in cluster_servers if s["status"] == "warning"]),
-                "danger": len([s for s in cluster_servers if s["status"] == "danger"]),
-                "offline": len([s for s in cluster_servers if s["status"] == "offline"]),
-                "servers": cluster_servers
+    def get_grouped_server_data(self) -> Dict:
+        """获取分组服务器数据（从增量维护的分组计数读取）"""
+        # 服务器状态变化时索引整体替换，只读取一次引用，各分组来自同一个索引
+        server_index = self.server_index
+        grouped_data = {
+            "by_region": {region: self._get_group_summary(server_index, "region", region)
+                          for region in self.regions},
+            "by_service_type": {service_type: self._get_group_summary(server_index, "serviceType", service_type)
+                                for service_type in self.service_types},
+            # 按集群分组
+            "by_cluster": {cluster["clusterId"]: self._get_group_summary(server_index, "clusterId", cluster["clusterId"])
+                           for cluster in self.clusters},
+            # 整体统计
+            "overall": {
+                status: server_index.count("status", status)
+                for status in ["healthy", "warning", "danger", "offline"]
             }
-
-        # 整体统计
-        grouped_data["overall"] = {
-            "healthy": len([s for s in self.servers if s["status"] == "healthy"]),
-            "warning": len([s for s in self.servers if s["status"] == "warning"]),
-            "danger": len([s for s in self.servers if s["status"] == "danger"]),
-            "offline": len([s for s in self.servers if s["status"] == "offline"])
         }
 
         return grouped_data
@@ -371,12 +777,11 @@ class MockDataGenerator:
         return {
             "clusters": self.clusters,
             "servers": self.servers,
-            "metrics": [self._generate_single_server_metrics(server["serverId"]).dict()
-                       for server in self.servers if self._generate_single_server_metrics(server["serverId"])],
-            "tasks": self.tasks_data,
-            "alerts": list(self.alerts_data)[-10:],
+            "metrics": self.get_all_server_metrics(),
+            "tasks": list(self.state.tasks),
+            "alerts": list(self.state.alerts)[-10:],
             "system_health": self.get_system_health().dict(),
             "load_balance": self.get_load_balance_status().dict(),
-            "time_series": [data.dict() for data in self.time_series_data[-500:]],
+            "time_series": self.time_series_store.latest(500),
             "grouped_data": self.get_grouped_server_data()
         }
\ No newline at end of file
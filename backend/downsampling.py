@@ -0,0 +1,83 @@
+from typing import Tuple
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax", "avg")
+
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def _bucket_starts(size: int, buckets: int) -> np.ndarray:
+    """把 size 个点均分为 buckets 个桶，返回每个桶的起始下标"""
+    return np.linspace(0, size, buckets + 1).astype(np.int64)[:-1]
+
+
+def average(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> Series:
+    """等宽分桶取平均值（时间戳取桶内平均）"""
+    starts = _bucket_starts(len(values), max_points)
+    counts = np.diff(np.append(starts, len(values)))
+    ts = np.add.reduceat(timestamps, starts) // counts
+    vals = np.add.reduceat(values, starts) / counts
+    return ts.astype(np.int64), vals
+
+
+def minmax(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> Series:
+    """每个桶保留最小值和最大值两个点，保留峰谷形状"""
+    buckets = max(1, max_points // 2)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(np.append(_bucket_starts(len(values), buckets), len(values))))
+
+    # 按 (桶, 值) 排序后，每个桶的首尾即为最小值和最大值
+    order = np.lexsort((values, bucket_ids))
+    boundaries = np.flatnonzero(np.diff(bucket_ids[order])) + 1
+    first = order[np.concatenate(([0], boundaries))]
+    last = order[np.concatenate((boundaries - 1, [len(order) - 1]))]
+
+    idx = np.unique(np.concatenate((first, last)))
+    return timestamps[idx], values[idx]
+
+
+def lttb(timestamps: np.ndarray, values: np.ndarray, max_points: int) -> Series:
+    """Largest-Triangle-Three-Buckets 降采样
+
+    选点依赖上一个桶已选中的点，因此只在输出桶上循环，桶内三角形面积向量化计算。
+    """
+    size = len(values)
+    x = timestamps.astype(np.float64)
+    buckets = max_points - 2
+    # 首尾点固定保留，中间点分桶
+    edges = np.linspace(1, size - 1, buckets + 1).astype(np.int64)
+
+    # 每个桶的平均点，作为下一个桶选点时的第三个顶点
+    mids = edges[:-1]
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[1:size - 1], mids - 1) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(values[1:size - 1], mids - 1) / counts, values[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = size - 1
+    anchor = 0
+    for i in range(buckets):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs(
+            (x[anchor] - avg_x[i + 1]) * (values[lo:hi] - values[anchor])
+            - (x[anchor] - x[lo:hi]) * (avg_y[i + 1] - values[anchor])
+        )
+        anchor = lo + int(np.argmax(area))
+        selected[i + 1] = anchor
+
+    return timestamps[selected], values[selected]
+
+
+def downsample(timestamps: np.ndarray, values: np.ndarray, max_points: int,
+               method: str = "lttb") -> Series:
+    """将单条序列降采样到最多 max_points 个点"""
+    if max_points <= 0 or len(values) <= max_points:
+        return timestamps, values
+    if method == "minmax":
+        return minmax(timestamps, values, max_points)
+    if method == "avg":
+        return average(timestamps, values, max_points)
+    if max_points < 3:
+        return average(timestamps, values, max_points)
+    return lttb(timestamps, values, max_points)
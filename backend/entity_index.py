@@ -0,0 +1,389 @@
+import base64
+import bisect
+import copy
+import itertools
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SortEntry = Tuple  # (排序字段取值..., 主键)
+
+# 游标分页时每次从排序列表中切出的条目数（按排序位置重新定位，不依赖下标）
+PAGE_SCAN_CHUNK = 256
+
+
+def _value_types(value: Any) -> Tuple[type, ...]:
+    """排序位置中某一项可接受的类型：数值之间可以比较，其他类型必须一致"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (int, float)
+    return (type(value),)
+
+
+def encode_cursor(entry: SortEntry) -> str:
+    """排序位置编码为不透明的游标字符串"""
+    return base64.urlsafe_b64encode(json.dumps(list(entry), ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, types: Sequence[Optional[Tuple[type, ...]]]) -> SortEntry:
+    """解析游标并按排序位置各项的类型校验（None 表示该项类型未知），格式或类型不正确时抛出 ValueError"""
+    try:
+        entry = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ValueError(f"无效的游标: {cursor}") from e
+    if (not isinstance(entry, list) or len(entry) != len(types)
+            or not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in entry)
+            or not all(expected is None or isinstance(value, expected) for value, expected in zip(entry, types))):
+        raise ValueError(f"无效的游标: {cursor}")
+    return tuple(entry)
+
+
+class EntityIndex:
+    """实体内存索引：主键字典 + 字段二级索引（倒排），随实体增删改增量维护
+
+    二级索引的 posting 使用 dict 作为有序集合，查询结果保持插入顺序。
+    字段值为列表时（如 tags）按每个元素分别建立索引。
+    指定 counted_field 时，额外维护每个 (字段, 取值) 分组内 counted_field 各取值的计数。
+    指定 sort_fields 时（可以为空，即只按主键），额外维护按 (排序字段..., 主键) 排序的列表，
+    每个 posting 也维护一份同样排序的列表，用于游标分页（descending 为倒序）。
+    """
+
+    def __init__(self, key_field: str, indexed_fields: Iterable[str], counted_field: Optional[str] = None,
+                 sort_fields: Optional[Iterable[str]] = None, descending: bool = False):
+        self.key_field = key_field
+        self.indexed_fields = tuple(indexed_fields)
+        self.counted_field = counted_field
+        self.sort_fields = None if sort_fields is None else tuple(sort_fields)
+        self.descending = descending
+        self._sorted: List[SortEntry] = []
+        self._entries: Dict[str, SortEntry] = {}
+        self._entry_types: Optional[Tuple[Tuple[type, ...], ...]] = None
+        self._sorted_postings: Dict[str, Dict[Any, List[SortEntry]]] = {field: {} for field in self.indexed_fields}
+        self._by_id: Dict[str, Dict] = {}
+        self._postings: Dict[str, Dict[Any, Dict[str, None]]] = {field: {} for field in self.indexed_fields}
+        self._group_counts: Dict[str, Dict[Any, Dict[Any, int]]] = {field: {} for field in self.indexed_fields}
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._by_id
+
+    @staticmethod
+    def _field_values(entity: Dict, field: str) -> List:
+        value = entity.get(field)
+        if value is None:
+            return []
+        if isinstance(value, (list, tuple, set)):
+            return list(value)
+        return [value]
+
+    def _link(self, entity: Dict, field: str):
+        entity_id = entity[self.key_field]
+        for value in self._field_values(entity, field):
+            self._postings[field].setdefault(value, {})[entity_id] = None
+
+    def _unlink(self, entity: Dict, field: str):
+        entity_id = entity[self.key_field]
+        postings = self._postings[field]
+        for value in self._field_values(entity, field):
+            ids = postings.get(value)
+            if ids is None:
+                continue
+            ids.pop(entity_id, None)
+            if not ids:
+                del postings[value]
+
+    def _adjust_counts(self, entity: Dict, field: str, delta: int):
+        """调整实体所在分组的计数"""
+        counted = entity.get(self.counted_field) if self.counted_field else None
+        if counted is None:
+            return
+        groups = self._group_counts[field]
+        for value in self._field_values(entity, field):
+            counts = groups.setdefault(value, {})
+            counts[counted] = counts.get(counted, 0) + delta
+            if not counts[counted]:
+                del counts[counted]
+            if not counts:
+                del groups[value]
+
+    def _sort_entry(self, entity: Dict) -> SortEntry:
+        return tuple(entity[field] for field in self.sort_fields) + (entity[self.key_field],)
+
+    def _link_sorted_field(self, entity: Dict, field: str, entry: SortEntry):
+        sorted_postings = self._sorted_postings[field]
+        for value in self._field_values(entity, field):
+            bisect.insort(sorted_postings.setdefault(value, []), entry)
+
+    def _unlink_sorted_field(self, entity: Dict, field: str, entry: SortEntry):
+        sorted_postings = self._sorted_postings[field]
+        for value in self._field_values(entity, field):
+            entries = sorted_postings.get(value)
+            if entries is None:
+                continue
+            position = bisect.bisect_left(entries, entry)
+            if position < len(entries) and entries[position] == entry:
+                del entries[position]
+            if not entries:
+                del sorted_postings[value]
+
+    def _link_sorted(self, entity: Dict):
+        """排序位置加入总的排序列表和实体所在的每个 posting 的排序列表"""
+        if self.sort_fields is None:
+            return
+        entry = self._sort_entry(entity)
+        if self._entry_types is None:
+            self._entry_types = tuple(_value_types(value) for value in entry)
+        bisect.insort(self._sorted, entry)
+        self._entries[entity[self.key_field]] = entry
+        for field in self.indexed_fields:
+            self._link_sorted_field(entity, field, entry)
+
+    def _unlink_sorted(self, entity: Dict):
+        entry = self._entries.pop(entity[self.key_field], None)
+        if entry is None:
+            return
+        del self._sorted[bisect.bisect_left(self._sorted, entry)]
+        for field in self.indexed_fields:
+            self._unlink_sorted_field(entity, field, entry)
+
+    def _affected(self, changed: Sequence[str]) -> Tuple[List[str], Sequence[str], bool]:
+        """字段变化涉及的索引：(需要移动 posting 的字段, 需要调整计数的字段, 是否需要重新排序)"""
+        linked = [field for field in changed if field in self._postings]
+        # 计数字段变化会影响所有分组的计数，其他字段只影响自身分组
+        recounted = self.indexed_fields if self.counted_field in changed else linked
+        # 排序字段变化时排序位置改变，需要重新插入所有排序列表；否则只移动变化字段的 posting 排序列表
+        resort = self.sort_fields is not None and any(field in self.sort_fields for field in changed)
+        return linked, recounted, resort
+
+    def _changed_fields(self, previous: Dict, entity: Dict) -> List[str]:
+        """索引、排序和计数用到的字段中取值发生变化的字段"""
+        fields = dict.fromkeys(self.indexed_fields + (self.sort_fields or ())
+                               + ((self.counted_field,) if self.counted_field else ()))
+        return [field for field in fields if previous.get(field) != entity.get(field)]
+
+    def _reindex(self, previous: Dict, entity: Dict, changed: Iterable[str]):
+        """同一主键的实体字段由 previous 的取值变为 entity 的取值后，只同步变化字段相关的索引"""
+        changed = tuple(changed)
+        linked, recounted, resort = self._affected(changed)
+        sorted_index = self.sort_fields is not None
+        entry = self._entries.get(entity[self.key_field])
+
+        for field in recounted:
+            self._adjust_counts(previous, field, -1)
+        for field in linked:
+            self._unlink(previous, field)
+        if resort:
+            self._unlink_sorted(previous)
+        elif sorted_index:
+            for field in linked:
+                self._unlink_sorted_field(previous, field, entry)
+
+        self._by_id[entity[self.key_field]] = entity
+
+        if resort:
+            self._link_sorted(entity)
+        elif sorted_index:
+            for field in linked:
+                self._link_sorted_field(entity, field, entry)
+        for field in linked:
+            self._link(entity, field)
+        for field in recounted:
+            self._adjust_counts(entity, field, 1)
+
+    def add(self, entity: Dict):
+        """加入实体，主键已存在时先移除旧实体"""
+        entity_id = entity[self.key_field]
+        if entity_id in self._by_id:
+            self.remove(entity_id)
+        self._by_id[entity_id] = entity
+        for field in self.indexed_fields:
+            self._link(entity, field)
+            self._adjust_counts(entity, field, 1)
+        self._link_sorted(entity)
+
+    def replace(self, entity: Dict):
+        """用新的字典替换同一主键的实体（已发布的实体不原地修改），只同步取值变化的字段相关的索引"""
+        previous = self._by_id.get(entity[self.key_field])
+        if previous is None:
+            self.add(entity)
+            return
+        changed = self._changed_fields(previous, entity)
+        if changed:
+            self._reindex(previous, entity, changed)
+        else:
+            self._by_id[entity[self.key_field]] = entity
+
+    def replaced(self, entity: Dict) -> "EntityIndex":
+        """返回用新的字典替换同一主键实体后的索引，原索引不变（写时复制），用于修改已发布的索引
+
+        只复制变化字段涉及的 posting、分组计数和排序列表，其余容器与原索引共享；
+        主键字典整体浅拷贝一次。主键不存在时退化为 copy 后加入。
+        """
+        previous = self._by_id.get(entity[self.key_field])
+        if previous is None:
+            clone = self.copy()
+            clone.add(entity)
+            return clone
+
+        clone = copy.copy(self)
+        clone._by_id = dict(self._by_id)
+        changed = self._changed_fields(previous, entity)
+        if changed:
+            clone._detach(previous, entity, changed)
+            clone._reindex(previous, entity, changed)
+        else:
+            clone._by_id[entity[self.key_field]] = entity
+        return clone
+
+    def _detach(self, previous: Dict, entity: Dict, changed: Sequence[str]):
+        """把 _reindex 将要修改的容器替换为副本：字段一级的字典，以及 previous、entity 所在分组的容器"""
+        linked, recounted, resort = self._affected(changed)
+        self._postings = dict(self._postings)
+        self._group_counts = dict(self._group_counts)
+        self._sorted_postings = dict(self._sorted_postings)
+
+        def detach(groups: Dict[str, Dict[Any, Any]], field: str):
+            field_groups = groups[field] = dict(groups[field])
+            for value in self._field_values(previous, field) + self._field_values(entity, field):
+                container = field_groups.get(value)
+                if container is not None:
+                    field_groups[value] = container.copy()
+
+        for field in linked:
+            detach(self._postings, field)
+        for field in recounted:
+            detach(self._group_counts, field)
+        if resort:
+            self._sorted = list(self._sorted)
+            self._entries = dict(self._entries)
+        if self.sort_fields is not None:
+            for field in (self.indexed_fields if resort else linked):
+                detach(self._sorted_postings, field)
+
+    def copy(self) -> "EntityIndex":
+        """复制索引结构（实体字典共享，不复制），用于发布只读快照，写入方继续增量维护原索引；
+        只做容器级别的浅拷贝，不重新计算 posting、计数和排序"""
+        clone = copy.copy(self)
+        clone._by_id = dict(self._by_id)
+        clone._entries = dict(self._entries)
+        clone._sorted = list(self._sorted)
+        clone._postings = {field: {value: dict(ids) for value, ids in groups.items()}
+                           for field, groups in self._postings.items()}
+        clone._group_counts = {field: {value: dict(counts) for value, counts in groups.items()}
+                               for field, groups in self._group_counts.items()}
+        clone._sorted_postings = {field: {value: list(entries) for value, entries in groups.items()}
+                                  for field, groups in self._sorted_postings.items()}
+        return clone
+
+    def remove(self, entity_id: str) -> Optional[Dict]:
+        """移除实体并清理二级索引"""
+        entity = self._by_id.pop(entity_id, None)
+        if entity is not None:
+            for field in self.indexed_fields:
+                self._unlink(entity, field)
+                self._adjust_counts(entity, field, -1)
+            self._unlink_sorted(entity)
+        return entity
+
+    def update(self, entity: Dict, field: str, value: Any):
+        """修改实体字段（原地修改）并同步二级索引、分组计数和排序列表"""
+        previous = dict(entity)
+        entity[field] = value
+        self._reindex(previous, entity, (field,))
+
+    def get(self, entity_id: str) -> Optional[Dict]:
+        return self._by_id.get(entity_id)
+
+    def values(self) -> List[Dict]:
+        return list(self._by_id.values())
+
+    def count(self, field: str, value: Any) -> int:
+        """某个字段取值下的实体数量"""
+        return len(self._postings[field].get(value, ()))
+
+    def group_counts(self, field: str) -> Dict[Any, int]:
+        """按字段分组计数"""
+        return {value: len(ids) for value, ids in self._postings[field].items()}
+
+    def counts_by(self, field: str, value: Any) -> Dict[Any, int]:
+        """某个分组内 counted_field 各取值的计数"""
+        return dict(self._group_counts[field].get(value, {}))
+
+    def _candidates(self, filters: Dict[str, Any]) -> Optional[List[str]]:
+        """按筛选条件求交集得到的实体 ID（保持插入顺序），没有有效条件时返回 None"""
+        postings = []
+        for field, value in filters.items():
+            if value is None:
+                continue
+            ids = self._postings[field].get(value)
+            if not ids:
+                return []
+            postings.append(ids)
+
+        if not postings:
+            return None
+
+        postings.sort(key=len)
+        smallest, rest = postings[0], postings[1:]
+        return [entity_id for entity_id in smallest if all(entity_id in ids for ids in rest)]
+
+    def find(self, **filters: Any) -> List[Dict]:
+        """按字段等值筛选，多个条件取交集，忽略值为 None 的条件"""
+        candidates = self._candidates(filters)
+        if candidates is None:
+            return self.values()
+        return [self._by_id[entity_id] for entity_id in candidates]
+
+    def _scan(self, entries: List[SortEntry], after: Optional[SortEntry], size: int) -> Iterator[SortEntry]:
+        """从 after 之后按分页顺序读取排序列表；每次切出 size 个，下一次从已读到的最后一个位置二分定位，
+        写入方同时增删条目时不会重复或跳过"""
+        position = after
+        while True:
+            if self.descending:
+                end = len(entries) if position is None else bisect.bisect_left(entries, position)
+                chunk = entries[max(0, end - size):end][::-1]
+            else:
+                start = 0 if position is None else bisect.bisect_right(entries, position)
+                chunk = entries[start:start + size]
+            if not chunk:
+                return
+            yield from chunk
+            position = chunk[-1]
+
+    def page(self, limit: int, after: Optional[SortEntry] = None,
+             **filters: Any) -> Tuple[List[Dict], Optional[SortEntry]]:
+        """按排序列表做游标分页，返回 (当前页, 下一页游标位置)，没有下一页时游标为 None
+
+        after 为上一页最后一个实体的排序位置。无筛选条件时在总的排序列表中二分定位后顺序读取；
+        有筛选条件时在最短的 posting 排序列表中定位，顺序读取并用其余条件的 posting 校验，
+        代价与页大小（及被其余条件过滤掉的条目数）有关，与页的深度无关。
+        """
+        if self.sort_fields is None:
+            raise ValueError("索引未指定排序字段")
+
+        entries, others = self._sorted, []
+        conditions = [(field, value) for field, value in filters.items() if value is not None]
+        if conditions:
+            postings = []
+            for field, value in conditions:
+                ids = self._postings[field].get(value)
+                if not ids:
+                    return [], None
+                postings.append((self._sorted_postings[field].get(value, []), ids))
+            postings.sort(key=lambda posting: len(posting[0]))
+            entries, others = postings[0][0], [ids for _, ids in postings[1:]]
+
+        scanned = self._scan(entries, after, max(limit + 1, PAGE_SCAN_CHUNK) if others else limit + 1)
+        matched = (entry for entry in scanned if all(entry[-1] in ids for ids in others))
+        # 多取一个用于判断是否还有下一页
+        selected = list(itertools.islice(matched, limit + 1))
+
+        page = [self._by_id[entry[-1]] for entry in selected[:limit]]
+        next_entry = selected[limit - 1] if len(selected) > limit else None
+        return page, next_entry
+
+    def entry_types(self) -> Tuple[Optional[Tuple[type, ...]], ...]:
+        """游标中排序位置各项可接受的类型，尚未加入实体时为 None（不校验）"""
+        if self._entry_types is None:
+            return (None,) * (len(self.sort_fields) + 1)
+        return self._entry_types
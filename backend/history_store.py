@@ -0,0 +1,230 @@
+"""
+时间序列历史数据的磁盘段存储
+
+按时间切分为段（默认每小时一段），每段两个文件：
+    <start>-<part>.json   段目录：时间范围、采样间隔、序列标签列表（行号即列表下标）
+    <start>-<part>.seg    int64 时间戳矩阵 [序列数, 每段点数] + float64 数值矩阵，可直接 mmap
+
+采样点按 (时间戳 - 段起点) // 采样间隔 定位到固定的列，时间戳为 0 表示该位置没有数据。
+段文件创建后按时间顺序填充，旧段不再写入；出现段目录中没有的序列时新建同一时间段的下一个 part。
+读取只映射与查询时间范围重叠的段，并且只拷贝命中的行和列。
+"""
+
+import json
+import mmap
+import os
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+SegmentKey = Tuple[int, int]  # (段起点毫秒时间戳, part)
+
+# 只读方检查目录变化的最小间隔（秒），避免每次读取都访问文件系统
+SCAN_INTERVAL_SECONDS = 1.0
+
+
+class Segment:
+    """单个段文件，每条序列占固定宽度的一行"""
+
+    def __init__(self, path: str, start: int, end: int, interval: int, labels: List[Dict], writable: bool):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.labels = labels
+        self.rows: Dict[Hashable, int] = {
+            (series["server_id"], series["metric_type"]): row for row, series in enumerate(labels)
+        }
+
+        width = (end - start) // interval
+        with open(path + ".seg", "r+b" if writable else "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+        cells = len(labels) * width
+        self.timestamps = np.frombuffer(self._mmap, dtype=np.int64, count=cells).reshape(len(labels), width)
+        self.values = np.frombuffer(self._mmap, dtype=np.float64, count=cells,
+                                    offset=cells * 8).reshape(len(labels), width)
+
+    @classmethod
+    def create(cls, path: str, start: int, end: int, interval: int, labels: List[Dict]) -> "Segment":
+        width = (end - start) // interval
+        with open(path + ".seg", "wb") as f:
+            # 稀疏文件，未写入的位置不占用磁盘
+            f.truncate(len(labels) * width * 16)
+        # 目录文件最后写入，读取方只会看到完整的段
+        tmp_path = f"{path}.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"start": start, "end": end, "interval": interval, "series": labels}, f, ensure_ascii=False)
+        os.replace(tmp_path, path + ".json")
+        return cls(path, start, end, interval, labels, writable=True)
+
+    @classmethod
+    def open(cls, path: str, writable: bool = False) -> "Segment":
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(path, meta["start"], meta["end"], meta["interval"], meta["series"], writable)
+
+    def read(self, row: int, start: Optional[int], end: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """读取一行中 [start, end] 范围内的数据副本"""
+        lo = 0 if start is None else max(0, -(-(start - self.start) // self.interval))
+        hi = self.timestamps.shape[1] if end is None else min(self.timestamps.shape[1],
+                                                              (end - self.start) // self.interval + 1)
+        if lo >= hi:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        ts = self.timestamps[row, lo:hi]
+        mask = ts != 0
+        if start is not None:
+            mask &= ts >= start
+        if end is not None:
+            mask &= ts <= end
+        return ts[mask], self.values[row, lo:hi][mask]
+
+
+class HistoryStore:
+    """按时间分段、带保留期限的磁盘时间序列存储
+
+    写入方（生成数据的进程）负责创建段和清理过期段；read_only 的读取方（如共享模式的工作进程）
+    在目录变化时重新扫描段列表。段列表只整体替换、不原地修改，读取时不受写入线程影响。
+    """
+
+    def __init__(self, directory: str, interval_ms: int, segment_ms: int, retention_ms: int,
+                 read_only: bool = False):
+        if segment_ms % interval_ms:
+            raise ValueError("段长度必须是采样间隔的整数倍")
+        self.directory = directory
+        self.interval_ms = interval_ms
+        self.segment_ms = segment_ms
+        self.retention_ms = retention_ms
+        self.read_only = read_only
+        if not read_only:
+            os.makedirs(directory, exist_ok=True)
+
+        self._segments: Dict[SegmentKey, Segment] = {}
+        self._writable: Dict[int, Segment] = {}  # 段起点 -> 当前写入的 part
+        self._scanned_mtime: Optional[int] = None
+        self._scanned_at = 0.0
+        self._scan()
+
+    def _path(self, key: SegmentKey) -> str:
+        return os.path.join(self.directory, f"{key[0]}-{key[1]}")
+
+    def _scan(self):
+        """目录变化时同步段列表（写入方自己维护段列表，只在启动时扫描）"""
+        now = time.monotonic()
+        if self._scanned_mtime is not None and now - self._scanned_at < SCAN_INTERVAL_SECONDS:
+            return
+        self._scanned_at = now
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._scanned_mtime:
+            return
+        self._scanned_mtime = mtime
+
+        segments = {}
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                key = tuple(int(value) for value in name[:-len(".json")].split("-"))
+            except ValueError:
+                continue
+            # 已删除的段文件在仍被引用时保持映射有效，不需要显式关闭
+            segment = self._segments.get(key)
+            if segment is None:
+                try:
+                    segment = Segment.open(self._path(key))
+                except FileNotFoundError:  # 扫描期间被清理
+                    continue
+            segments[key] = segment
+        self._segments = segments
+
+    def _create_segment(self, start: int, catalog: Dict[Hashable, Dict]) -> Segment:
+        part = max((p for s, p in self._segments if s == start), default=-1) + 1
+        key = (start, part)
+        segment = Segment.create(self._path(key), start, start + self.segment_ms, self.interval_ms,
+                                 list(catalog.values()))
+        self._segments = {**self._segments, key: segment}
+        self._writable[start] = segment
+        # 只保留最近两个时间段的写入句柄
+        for old in sorted(self._writable)[:-2]:
+            del self._writable[old]
+        return segment
+
+    def _enforce_retention(self, newest: int):
+        """删除结束时间早于保留期限的段"""
+        cutoff = newest - self.retention_ms
+        expired = [key for key, segment in self._segments.items() if segment.end <= cutoff]
+        if not expired:
+            return
+        self._segments = {key: segment for key, segment in self._segments.items() if segment.end > cutoff}
+        for key in expired:
+            self._writable.pop(key[0], None)
+            path = self._path(key)
+            os.remove(path + ".json")
+            os.remove(path + ".seg")
+
+    def write(self, keys: List[Hashable], timestamps: np.ndarray, values: np.ndarray,
+              catalog: Dict[Hashable, Dict]):
+        """批量写入采样点，catalog 为当前全部序列 key -> 标签，新建段时作为段目录"""
+        if self.read_only:
+            raise RuntimeError("只读的历史存储不能写入")
+        if not len(keys):
+            return
+
+        newest = int(timestamps.max())
+        cutoff = newest - self.retention_ms
+        buckets = timestamps // self.segment_ms * self.segment_ms
+        for bucket in np.unique(buckets).tolist():
+            if bucket + self.segment_ms <= cutoff:
+                continue
+            selected = np.flatnonzero(buckets == bucket)
+            bucket_keys = [keys[i] for i in selected.tolist()]
+
+            segment = self._writable.get(bucket)
+            if segment is None or any(key not in segment.rows for key in bucket_keys):
+                segment = self._create_segment(bucket, catalog)
+
+            rows = np.fromiter((segment.rows[key] for key in bucket_keys), dtype=np.int64, count=len(bucket_keys))
+            ts = timestamps[selected]
+            slots = (ts - bucket) // self.interval_ms
+            # 先写数值再写时间戳，时间戳非 0 即表示数据完整
+            segment.values[rows, slots] = values[selected]
+            segment.timestamps[rows, slots] = ts
+
+        self._enforce_retention(newest)
+
+    def read(self, key: Hashable, start: Optional[int] = None,
+             end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """读取单条序列在 [start, end] 范围内的数据，只访问时间范围重叠的段"""
+        if self.read_only:
+            self._scan()
+        segments = self._segments
+        ts_parts, value_parts = [], []
+        for segment_key in sorted(segments):
+            segment = segments[segment_key]
+            if (start is not None and segment.end <= start) or (end is not None and segment.start > end):
+                continue
+            row = segment.rows.get(key)
+            if row is None:
+                continue
+            ts, values = segment.read(row, start, end)
+            if len(ts):
+                ts_parts.append(ts)
+                value_parts.append(values)
+
+        if not ts_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+        return np.concatenate(ts_parts), np.concatenate(value_parts)
+
+    def series(self, since: Optional[int] = None) -> Dict[Hashable, Dict]:
+        """since 之后的段中出现过的序列 key -> 标签"""
+        if self.read_only:
+            self._scan()
+        result = {}
+        for segment in self._segments.values():
+            if since is None or segment.end > since:
+                for key, row in segment.rows.items():
+                    result.setdefault(key, segment.labels[row])
+        return result
@@ -1,35 +1,340 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional, AsyncIterator
+from typing import Optional, AsyncIterator, Dict, List, Tuple
+from collections import OrderedDict
 import asyncio
 from datetime import datetime, timedelta
 from models import *
-from data_generator_new import MockDataGenerator
+from data_generator_new import DataState, MockDataGenerator
+from timeseries_store import to_epoch_ms
+from broadcaster import DashboardBroadcaster, TimeSeriesPublisher
+from snapshot_cache import Snapshot, SnapshotCache, etag_matches
+from compression import CompressionMiddleware, MIN_COMPRESS_SIZE, choose_encoding
+from wire_format import BINARY_MEDIA_TYPE, columns_to_binary, columns_to_json
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS, MetricsMiddleware, MetricsRegistry
+from shared_state import SHARED_STATE_ENV, SharedStateReader
+from entity_index import EntityIndex, decode_cursor, encode_cursor
+from metrics_history import parse_duration
+from rolling_stats import STATS_WINDOWS
+from alert_rules import AlertRule
+import os
+import time
 from contextlib import asynccontextmanager
 
 # 初始化数据生成器
 data_generator = MockDataGenerator()
 
+# WebSocket 推送
+broadcaster = DashboardBroadcaster()
+# 时间序列 SSE 推送
+timeseries_publisher = TimeSeriesPublisher()
+
+# SSE 心跳间隔（秒）
+SSE_KEEPALIVE_SECONDS = 15
+
+# 后台更新间隔及出错后的重试间隔（秒）
+UPDATE_INTERVAL_SECONDS = 2
+UPDATE_RETRY_SECONDS = 5
+
+# 共享模式：设置 MONITOR_SHARED_STATE 后本进程不生成数据，只读取生产进程（producer.py）发布的数据，
+# 可用 uvicorn --workers N 启动多个工作进程
+SHARED_STATE_PATH = os.environ.get(SHARED_STATE_ENV)
+SHARED_POLL_SECONDS = 0.2
+
+# 列表接口游标分页：响应体仍为列表，下一页游标通过响应头返回；只传 cursor 时的默认页大小
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 10000
+
+def build_time_series_section(columnar: bool):
+    """动态数据中的时间序列部分：全库最新 100 个点"""
+    if columnar:
+        return columns_to_json(data_generator.time_series_store.latest(100, columnar=True))
+    return data_generator.time_series_store.latest(100)
+
+# 动态数据的各个部分，按需构建（顺序即响应中的顺序）
+DYNAMIC_SECTIONS = {
+    "metrics": lambda state, columnar: data_generator.get_all_server_metrics(state),
+    "alerts": lambda state, columnar: list(state.alerts[-10:]),
+    "system_health": lambda state, columnar: data_generator.get_system_health().dict(),
+    "load_balance": lambda state, columnar: data_generator.get_load_balance_status(state).dict(),
+    "time_series": lambda state, columnar: build_time_series_section(columnar),
+    "tasks": lambda state, columnar: list(state.tasks[-20:]),  # 最新20个任务
+}
+DYNAMIC_SECTION_NAMES = tuple(DYNAMIC_SECTIONS)
+
+# 按 sections / fields 选择的动态数据缓存，最多保留的组合数
+MAX_SELECTION_CACHES = 64
+
+DynamicFields = Tuple[Tuple[str, Tuple[str, ...]], ...]  # ((部分, (字段, ...)), ...)
+
+def select_fields(value, fields: Tuple[str, ...]):
+    """只保留指定字段：字典直接筛选，列表对每个元素筛选"""
+    if isinstance(value, dict):
+        return {field: value[field] for field in fields if field in value}
+    if isinstance(value, list):
+        return [select_fields(item, fields) for item in value]
+    return value
+
+def build_dynamic_data(state: DataState, columnar: bool = False,
+                       sections: Tuple[str, ...] = DYNAMIC_SECTION_NAMES, fields: DynamicFields = ()) -> Dict:
+    """由数据快照构建动态数据（指标、告警、系统健康等），columnar 时时间序列按序列列式输出
+
+    只构建 sections 中的部分；fields 中列出的部分只保留指定字段。
+    """
+    selected_fields = dict(fields)
+    data = {}
+    for name in sections:
+        value = DYNAMIC_SECTIONS[name](state, columnar)
+        if name in selected_fields:
+            value = select_fields(value, selected_fields[name])
+        data[name] = value
+    return data
+
+def parse_dynamic_selection(sections: Optional[str],
+                            fields: Optional[str]) -> Tuple[Tuple[str, ...], DynamicFields]:
+    """解析 sections、fields 参数并规范化（按固定顺序排列），格式不正确时返回 400"""
+    selected = set(DYNAMIC_SECTION_NAMES)
+    if sections is not None:
+        selected = {name.strip() for name in sections.split(",") if name.strip()}
+        if not selected:
+            raise HTTPException(status_code=400, detail="sections 至少需要指定一个数据部分")
+        unknown = selected - set(DYNAMIC_SECTION_NAMES)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知的数据部分: {', '.join(sorted(unknown))}")
+
+    selected_fields: Dict[str, set] = {}
+    for item in (fields or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        section, _, field = item.partition(".")
+        if section not in DYNAMIC_SECTIONS or not field:
+            raise HTTPException(status_code=400, detail=f"字段格式应为 部分.字段: {item}")
+        selected_fields.setdefault(section, set()).add(field)
+
+    ordered = tuple(name for name in DYNAMIC_SECTION_NAMES if name in selected)
+    return ordered, tuple((name, tuple(sorted(selected_fields[name])))
+                          for name in ordered if name in selected_fields)
+
+def build_static_data() -> Dict:
+    """构建静态数据（集群、服务器等不常变的数据）"""
+    return {
+        "clusters": data_generator.clusters,
+        "servers": data_generator.servers,
+        "grouped_data": data_generator.get_grouped_server_data()
+    }
+
+# 按数据版本缓存已编码的响应，每个版本只构建一次
+dynamic_cache = SnapshotCache(build_dynamic_data)
+dynamic_columnar_cache = SnapshotCache(lambda state: build_dynamic_data(state, columnar=True))
+static_cache = SnapshotCache(build_static_data)
+# 部分数据的缓存：(columnar, sections, fields) -> SnapshotCache，按最近使用淘汰
+selection_caches: "OrderedDict[Tuple, SnapshotCache]" = OrderedDict()
+
+def dynamic_snapshot_cache(columnar: bool, sections: Tuple[str, ...], fields: DynamicFields) -> SnapshotCache:
+    """返回对应数据选择的快照缓存，完整数据复用 WebSocket 推送使用的缓存"""
+    if sections == DYNAMIC_SECTION_NAMES and not fields:
+        return dynamic_columnar_cache if columnar else dynamic_cache
+
+    key = (columnar, sections, fields)
+    cache = selection_caches.get(key)
+    if cache is None:
+        cache = SnapshotCache(lambda state: build_dynamic_data(state, columnar, sections, fields))
+        selection_caches[key] = cache
+        while len(selection_caches) > MAX_SELECTION_CACHES:
+            selection_caches.popitem(last=False)
+    else:
+        selection_caches.move_to_end(key)
+    return cache
+
+# 后端自身的监控指标，通过 /metrics 以 Prometheus 文本格式暴露
+metrics_registry = MetricsRegistry()
+request_latency = metrics_registry.histogram(
+    "monitor_http_request_duration_seconds", "HTTP 请求处理耗时", ("method", "route"))
+response_size = metrics_registry.histogram(
+    "monitor_http_response_size_bytes", "HTTP 响应体大小（压缩后）", ("method", "route"), buckets=SIZE_BUCKETS)
+tick_duration = metrics_registry.histogram(
+    "monitor_updater_tick_duration_seconds", "后台数据更新单次耗时")
+tick_lag = metrics_registry.histogram(
+    "monitor_updater_tick_lag_seconds", "后台数据更新实际开始时间相对计划时间的延迟")
+tick_failures = metrics_registry.counter(
+    "monitor_updater_tick_failures_total", "后台数据更新失败次数")
+
+store_items = metrics_registry.gauge("monitor_store_items", "内存数据存储中的条目数", ("store",))
+store_items.labels("time_series").set_function(lambda: len(data_generator.time_series_store))
+store_items.labels("time_series_series").set_function(lambda: data_generator.time_series_store.series_count)
+store_items.labels("tasks").set_function(lambda: len(data_generator.state.tasks))
+store_items.labels("alerts").set_function(lambda: len(data_generator.state.alerts))
+store_items.labels("servers").set_function(lambda: len(data_generator.server_index))
+
+snapshot_requests = metrics_registry.counter(
+    "monitor_snapshot_cache_requests_total", "快照缓存请求次数", ("cache", "result"))
+snapshot_hit_ratio = metrics_registry.gauge("monitor_snapshot_cache_hit_ratio", "快照缓存命中率", ("cache",))
+for cache_name, cache in (("static", static_cache), ("dynamic", dynamic_cache), ("dynamic_columnar", dynamic_columnar_cache)):
+    snapshot_requests.labels(cache_name, "hit").set_function(lambda cache=cache: cache.hits)
+    snapshot_requests.labels(cache_name, "miss").set_function(lambda cache=cache: cache.misses)
+    snapshot_hit_ratio.labels(cache_name).set_function(
+        lambda cache=cache: cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else float("nan"))
+
+metrics_registry.gauge("monitor_alert_rule_evaluation_seconds", "最近一次告警规则评估耗时").set_function(
+    lambda: data_generator.alert_engine.last_duration)
+metrics_registry.gauge("monitor_alert_rules_firing", "处于触发状态的 (规则, 服务器) 数").set_function(
+    lambda: sum(data_generator.state.firing_rules.values()))
+
+metrics_registry.gauge("monitor_quantile_sketch_bytes", "分组分位数草图占用的内存").set_function(
+    lambda: data_generator.quantile_sketches.nbytes)
+
+metrics_registry.gauge("monitor_websocket_clients", "已连接的 WebSocket 客户端数").set_function(
+    lambda: broadcaster.client_count)
+metrics_registry.counter("monitor_websocket_dropped_messages_total", "因客户端过慢被丢弃的推送消息数").set_function(
+    lambda: broadcaster.dropped_messages)
+
+def encode_dynamic_message(state: DataState) -> str:
+    """将动态数据编码为 WebSocket 消息，复用该版本的快照"""
+    body = dynamic_cache.get(state.version, state).body.decode("utf-8")
+    return f'{{"type":"dynamic","data":{body}}}'
+
+def snapshot_response(request: Request, snapshot: Snapshot) -> Response:
+    """返回快照响应：按 Accept-Encoding 复用已压缩的响应体，客户端 ETag 未过期时返回 304"""
+    encoding = None
+    if len(snapshot.body) >= MIN_COMPRESS_SIZE:
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+
+    etag = snapshot.encoded_etag(encoding) if encoding else snapshot.etag
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(content=snapshot.encoded(encoding), media_type="application/json", headers=headers)
+    return Response(content=snapshot.body, media_type="application/json", headers=headers)
+
+async def cached_snapshot(cache: SnapshotCache, version: int, *args) -> Snapshot:
+    """取指定版本的快照：已构建好时直接返回，否则在工作线程中构建，不阻塞事件循环"""
+    return cache.current(version) or await asyncio.to_thread(cache.get, version, *args)
+
+def paginate(response: Response, index: EntityIndex, limit: Optional[int], cursor: Optional[str],
+             **filters) -> List[Dict]:
+    """按索引的排序做游标分页，有下一页时在响应头中返回 next_cursor"""
+    try:
+        after = decode_cursor(cursor, index.entry_types()) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    items, next_entry = index.page(limit or DEFAULT_PAGE_SIZE, after, **filters)
+    if next_entry is not None:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(next_entry)
+    return items
+
+def run_update_tick() -> Tuple[str, Dict]:
+    """在工作线程中执行：更新数据，预先构建新版本的动态快照后再发布，
+    返回 (WebSocket 消息, 各 SSE 主题已编码的消息)"""
+    state = data_generator.prepare_update()
+    # 先编码再发布，请求处理拿到新版本时快照已就绪
+    message = encode_dynamic_message(state)
+    data_generator.publish_state(state)
+    # 只推送本次新产生的时间序列数据点
+    return message, timeseries_publisher.encode(state.latest_time_series)
+
 # 后台数据更新任务
 async def background_data_updater():
+    # 启动时在工作线程中填充最近30分钟的时间序列，接口在此期间已可访问（返回已填充的部分）
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(data_generator.warm_up)
+        print(f"时间序列初始化完成，耗时 {time.perf_counter() - started:.2f} 秒")
+    except Exception as e:
+        print(f"时间序列初始化错误: {e}")
+
+    scheduled = time.perf_counter()
     while True:
+        started = time.perf_counter()
+        # 事件循环繁忙时 tick 会晚于计划时间开始
+        tick_lag.observe(max(0.0, started - scheduled))
         try:
-            data_generator.update_data()
-            await asyncio.sleep(2)  # 每2秒更新一次
+            # 更新和编码在工作线程中进行，不阻塞事件循环上的请求处理
+            message, timeseries_messages = await asyncio.to_thread(run_update_tick)
+            # 每个 tick 只编码一次，广播给所有已连接的客户端
+            if broadcaster.client_count:
+                broadcaster.publish(message)
+            timeseries_publisher.deliver(timeseries_messages)
+            tick_duration.observe(time.perf_counter() - started)
+            delay = UPDATE_INTERVAL_SECONDS  # 每2秒更新一次
         except Exception as e:
+            tick_failures.inc()
             print(f"数据更新错误: {e}")
-            await asyncio.sleep(5)
+            delay = UPDATE_RETRY_SECONDS
+        scheduled = time.perf_counter() + delay
+        await asyncio.sleep(delay)
+
+def apply_shared_static(version: int, payload: Dict, initial: bool = False):
+    """共享模式：使用生产进程发布的集群和服务器数据；initial 为启动时的首次同步，
+    此时清空本进程初始化时生成的指标历史和分位数草图"""
+    static_cache.put(Snapshot(version, payload["body"]))
+    data_generator.clusters = payload["clusters"]
+    data_generator.servers = payload["servers"]
+    data_generator.server_index = payload["server_index"]
+    data_generator.reset_metrics_history(discard=initial)
+    data_generator.rebuild_server_search()
+    data_generator.static_version = version
+
+def apply_shared_dynamic(version: int, payload: Dict) -> bool:
+    """共享模式：发布生产进程构建的快照，直接复用其已编码的动态数据"""
+    if version == data_generator.state.version:
+        return False
+    dynamic_cache.put(Snapshot(version, payload["body"]))
+    data_generator.version = version
+    data_generator.sync_search(payload["state"])
+    data_generator.metrics_history.append(payload["state"].metrics_frame)
+    data_generator.record_quantiles(payload["state"].metrics_frame)
+    data_generator.series_stats.update(payload["state"].latest_time_series)
+    data_generator.publish_state(payload["state"])
+    return True
+
+async def shared_state_follower(reader: SharedStateReader):
+    """共享模式：轮询生产进程发布的快照，并推送给本进程的 WebSocket / SSE 客户端"""
+    while True:
+        try:
+            # 反序列化在工作线程中进行
+            static, dynamic = await asyncio.to_thread(lambda: (reader.poll_static(), reader.poll_dynamic()))
+            if static:
+                apply_shared_static(*static)
+            if dynamic and apply_shared_dynamic(*dynamic):
+                state = data_generator.state
+                if broadcaster.client_count:
+                    broadcaster.publish(encode_dynamic_message(state))
+                # SSE 消息在工作线程中编码
+                timeseries_publisher.deliver(
+                    await asyncio.to_thread(timeseries_publisher.encode, state.latest_time_series))
+        except Exception as e:
+            tick_failures.inc()
+            print(f"读取共享数据错误: {e}")
+        await asyncio.sleep(SHARED_POLL_SECONDS)
 
 # 应用生命周期管理器
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     # 应用启动时执行
-    # 初始化时间序列数据
-    data_generator.time_series_data = data_generator._generate_time_series_data(minutes=30)
-
-    # 启动后台数据更新任务
-    asyncio.create_task(background_data_updater())
-    print("后端服务器已启动。数据更新任务已初始化。")
+    if SHARED_STATE_PATH:
+        reader = SharedStateReader(SHARED_STATE_PATH)
+        if not reader.ready():
+            print(f"等待生产进程发布数据: {SHARED_STATE_PATH}")
+        while not reader.ready():
+            await asyncio.sleep(1)
+
+        # 时间序列直接映射共享内存，其余数据按版本同步
+        data_generator.time_series_store = reader.attach(data_generator.open_history(read_only=True))
+        data_generator.series_stats.seed(data_generator.time_series_store.tails(data_generator.series_stats.depth))
+        apply_shared_static(*reader.poll_static(), initial=True)
+        apply_shared_dynamic(*reader.poll_dynamic())
+        asyncio.create_task(shared_state_follower(reader))
+        print(f"后端服务器已启动（共享模式，进程 {os.getpid()}）。")
+    else:
+        # 启动后台数据更新任务（先在后台初始化时间序列数据，不阻塞启动）
+        asyncio.create_task(background_data_updater())
+        print("后端服务器已启动。数据更新任务已初始化。")
     
     yield  # 应用运行期间
     
@@ -38,6 +343,12 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
 
 app = FastAPI(title="Monitor Dashboard API", version="1.0.0", lifespan=lifespan)
 
+# 响应压缩（gzip，安装 brotli 时优先使用 br）
+app.add_middleware(CompressionMiddleware)
+
+# 按路由统计请求延迟和响应大小（位于压缩中间件外层，记录压缩后的大小）
+app.add_middleware(MetricsMiddleware, latency=request_latency, size=response_size)
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -45,6 +356,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 '''app.add_middleware(
     CORSMiddleware,
@@ -59,54 +371,80 @@ app.add_middleware(
 async def root():
     return {"message": "Monitor Dashboard API is running", "timestamp": datetime.now()}
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 格式的后端自身监控指标"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/api/dashboard/static")
-async def get_static_data():
+async def get_static_data(request: Request):
     """获取静态数据（集群、服务器等不常变的数据）"""
     try:
-        static_data = {
-            "clusters": data_generator.clusters,
-            "servers": data_generator.servers,
-            "grouped_data": data_generator.get_grouped_server_data()
-        }
-        return static_data
+        # 状态变化都会提升 static_version，服务器较多时重建需要数秒
+        snapshot = await cached_snapshot(static_cache, data_generator.static_version)
+        return snapshot_response(request, snapshot)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取静态数据时出错: {str(e)}")
 
 @app.get("/api/dashboard/dynamic")
-async def get_dynamic_data():
-    """获取动态数据（指标、告警、系统健康等）"""
+async def get_dynamic_data(
+    request: Request,
+    format: str = Query("json", pattern="^(json|columnar)$", description="时间序列格式: json, columnar"),
+    sections: Optional[str] = Query(None, description="只返回指定部分，逗号分隔: metrics, alerts, system_health, load_balance, time_series, tasks"),
+    fields: Optional[str] = Query(None, description="只返回指定字段，逗号分隔的 部分.字段，如 metrics.server_id,metrics.cpu_usage")
+):
+    """获取动态数据（指标、告警、系统健康等），可按部分和字段裁剪，只构建请求的部分"""
     try:
-        dynamic_data = {
-            "metrics": [data_generator._generate_single_server_metrics(server["serverId"]).dict()
-                       for server in data_generator.servers if data_generator._generate_single_server_metrics(server["serverId"])],
-            "alerts": list(data_generator.alerts_data)[-10:],
-            "system_health": data_generator.get_system_health().dict(),
-            "load_balance": data_generator.get_load_balance_status().dict(),
-            "time_series": [data.dict() for data in data_generator.time_series_data[-100:]],
-            "tasks": data_generator.tasks_data[-20:]  # 最新20个任务
-        }
-        return dynamic_data
+        selected_sections, selected_fields = parse_dynamic_selection(sections, fields)
+        cache = dynamic_snapshot_cache(format == "columnar", selected_sections, selected_fields)
+        state = data_generator.state
+        # 默认格式已在更新 tick 中预先构建，列式格式和按部分、字段裁剪的变体首次请求时在工作线程中构建
+        return snapshot_response(request, await cached_snapshot(cache, state.version, state))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取动态数据时出错: {str(e)}")
 
+@app.websocket("/ws/dashboard")
+async def dashboard_websocket(websocket: WebSocket):
+    """推送动态数据，替代前端轮询 /api/dashboard/dynamic"""
+    await websocket.accept()
+    queue = broadcaster.subscribe()
+
+    async def send_messages():
+        # 连接建立后先推送一次当前数据
+        await websocket.send_text(encode_dynamic_message(data_generator.state))
+        while True:
+            await websocket.send_text(await queue.get())
+
+    sender = asyncio.create_task(send_messages())
+    try:
+        # 持续读取以便及时感知客户端断开，客户端发来的消息忽略
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        broadcaster.unsubscribe(queue)
+
 @app.get("/api/servers")
 async def get_servers(
+    response: Response,
     region: Optional[str] = Query(None, description="按区域筛选"),
     tag: Optional[str] = Query(None, description="按标签筛选"),
-    status: Optional[ServerStatus] = Query(None, description="按状态筛选")
+    status: Optional[ServerStatus] = Query(None, description="按状态筛选"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不传 limit 和 cursor 时返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值")
 ):
-    """获取所有服务器信息"""
+    """获取服务器信息，指定 limit 或 cursor 时按服务器ID分页"""
     try:
-        servers = data_generator.servers
-
-        if region:
-            servers = [s for s in servers if s.region == region]
-        if tag:
-            servers = [s for s in servers if tag in s.tags]
-        if status:
-            servers = [s for s in servers if s.status == status]
-
-        return [server.dict() for server in servers]
+        filters = {"region": region, "tags": tag, "status": status.value if status else None}
+        if limit is None and cursor is None:
+            return data_generator.server_index.find(**filters)
+        return paginate(response, data_generator.server_index, limit, cursor, **filters)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取服务器信息时出错: {str(e)}")
 
@@ -114,7 +452,7 @@ async def get_servers(
 async def get_server_metrics(server_id: str):
     """获取指定服务器的指标数据"""
     try:
-        metrics = data_generator.generate_metrics(server_id)
+        metrics = data_generator.get_server_metrics(server_id)
         if not metrics:
             raise HTTPException(status_code=404, detail=f"未找到服务器 {server_id}")
         return metrics.dict()
@@ -123,34 +461,50 @@ async def get_server_metrics(server_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取服务器指标时出错: {str(e)}")
 
+@app.get("/api/servers/{server_id}/metrics/history")
+async def get_server_metrics_history(
+    server_id: str,
+    window: str = Query("15m", description="时间范围，如 30s, 5m, 1h")
+):
+    """获取指定服务器的指标历史（列式），附带各指标的最小、最大、平均值"""
+    try:
+        try:
+            window_ms = parse_duration(window)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        history = data_generator.get_server_metrics_history(server_id, window_ms)
+        if history is None:
+            raise HTTPException(status_code=404, detail=f"未找到服务器 {server_id}")
+        return history
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取服务器指标历史时出错: {str(e)}")
+
 @app.get("/api/metrics")
 async def get_all_metrics():
     """获取所有服务器的指标数据"""
     try:
-        metrics = []
-        for server in data_generator.servers:
-            server_metrics = data_generator.generate_metrics(server.id)
-            if server_metrics:
-                metrics.append(server_metrics.dict())
-        return metrics
+        return data_generator.get_all_server_metrics()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取指标数据时出错: {str(e)}")
 
 @app.get("/api/tasks")
 async def get_tasks(
-    status: Optional[TaskStatus] = Query(None, description="按状态筛选"),
-    cluster: Optional[str] = Query(None, description="按集群筛选")
+    response: Response,
+    status: Optional[str] = Query(None, description="按状态筛选: queued, running, failed, completed"),
+    cluster: Optional[str] = Query(None, description="按集群筛选"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不传 limit 和 cursor 时返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值")
 ):
-    """获取所有任务信息"""
+    """获取任务信息，指定 limit 或 cursor 时按任务ID分页"""
     try:
-        tasks = data_generator.tasks
-
-        if status:
-            tasks = [t for t in tasks if t.status == status]
-        if cluster:
-            tasks = [t for t in tasks if t.cluster == cluster]
-
-        return [task.dict() for task in tasks]
+        task_index = data_generator.state.task_index
+        if limit is None and cursor is None:
+            return task_index.find(status=status, cluster=cluster)
+        return paginate(response, task_index, limit, cursor, status=status, cluster=cluster)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取任务信息时出错: {str(e)}")
 
@@ -158,10 +512,10 @@ async def get_tasks(
 async def get_task_detail(task_id: str):
     """获取指定任务的详细信息"""
     try:
-        task = next((t for t in data_generator.tasks if t.id == task_id), None)
+        task = data_generator.state.task_index.get(task_id)
         if not task:
             raise HTTPException(status_code=404, detail=f"未找到任务 {task_id}")
-        return task.dict()
+        return task
     except HTTPException:
         raise
     except Exception as e:
@@ -169,20 +523,74 @@ async def get_task_detail(task_id: str):
 
 @app.get("/api/alerts")
 async def get_alerts(
+    response: Response,
     severity: Optional[AlertSeverity] = Query(None, description="按严重程度筛选"),
-    limit: int = Query(20, description="限制结果数量")
+    server_id: Optional[str] = Query(None, description="按服务器ID筛选"),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE, description="限制结果数量"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值")
 ):
-    """获取最近的警报信息"""
+    """获取最近的警报信息，按 (时间, 告警ID) 从新到旧分页"""
     try:
-        alerts = data_generator.alerts
-
-        if severity:
-            alerts = [a for a in alerts if a.severity == severity]
-
-        return [alert.dict() for alert in alerts[:limit]]
+        return paginate(response, data_generator.state.alert_index, limit, cursor,
+                        severity=severity.value if severity else None, serverId=server_id)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取警报信息时出错: {str(e)}")
 
+@app.get("/api/alert-rules")
+async def get_alert_rules():
+    """获取告警规则及每条规则当前处于触发状态的服务器数"""
+    try:
+        firing = data_generator.state.firing_rules
+        return [{**rule.dict(), "firing": firing.get(rule.rule_id, 0)} for rule in data_generator.alert_rules]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取告警规则时出错: {str(e)}")
+
+def replace_alert_rules(rules: List[AlertRule]):
+    """替换告警规则，下一次更新时生效；共享模式下规则由生产进程评估，不能在工作进程中修改"""
+    if SHARED_STATE_PATH:
+        raise HTTPException(status_code=409, detail="共享模式下告警规则由生产进程管理")
+    try:
+        data_generator.set_alert_rules(rules)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def find_alert_rule(rule_id: str) -> int:
+    """规则在当前规则列表中的位置，不存在时返回 404"""
+    for position, rule in enumerate(data_generator.alert_rules):
+        if rule.rule_id == rule_id:
+            return position
+    raise HTTPException(status_code=404, detail=f"未找到告警规则 {rule_id}")
+
+@app.post("/api/alert-rules")
+async def create_alert_rule(rule: AlertRule):
+    """新增告警规则"""
+    if any(existing.rule_id == rule.rule_id for existing in data_generator.alert_rules):
+        raise HTTPException(status_code=409, detail=f"告警规则 {rule.rule_id} 已存在")
+    replace_alert_rules(data_generator.alert_rules + [rule])
+    return {**rule.dict(), "firing": 0}
+
+@app.put("/api/alert-rules/{rule_id}")
+async def update_alert_rule(rule_id: str, rule: AlertRule):
+    """修改告警规则（以路径中的 rule_id 为准），修改后该规则的触发状态重新计算"""
+    position = find_alert_rule(rule_id)
+    rule = rule.copy(update={"rule_id": rule_id})
+    rules = list(data_generator.alert_rules)
+    unchanged = rules[position] == rule
+    rules[position] = rule
+    replace_alert_rules(rules)
+    return {**rule.dict(), "firing": data_generator.state.firing_rules.get(rule_id, 0) if unchanged else 0}
+
+@app.delete("/api/alert-rules/{rule_id}")
+async def delete_alert_rule(rule_id: str):
+    """删除告警规则，该规则未恢复的告警标记为已解决"""
+    position = find_alert_rule(rule_id)
+    rules = list(data_generator.alert_rules)
+    removed = rules.pop(position)
+    replace_alert_rules(rules)
+    return removed.dict()
+
 @app.get("/api/system-health")
 async def get_system_health():
     """获取系统整体健康状态"""
@@ -204,144 +612,157 @@ async def get_time_series_data(
     metric_type: Optional[str] = Query(None, description="指标类型: cpu_usage, memory_usage, disk_usage, network_traffic"),
     region: Optional[str] = Query(None, description="按区域筛选"),
     server_id: Optional[str] = Query(None, description="按服务器ID筛选"),
+    service_type: Optional[str] = Query(None, description="按服务类型筛选"),
     minutes: int = Query(30, description="时间范围（分钟）"),
-    after: Optional[str] = Query(None, description="只返回此时间之后的数据，ISO格式")
+    after: Optional[str] = Query(None, description="只返回此时间之后的数据，ISO格式"),
+    max_points: Optional[int] = Query(None, ge=2, description="每条序列最多返回的点数，超出时降采样"),
+    method: str = Query("lttb", pattern="^(lttb|minmax|avg)$", description="降采样方法: lttb, minmax, avg"),
+    format: str = Query("json", pattern="^(json|columnar|binary)$", description="返回格式: json（逐点）, columnar（按序列列式）, binary（列式二进制）")
 ):
     """获取时间序列数据"""
     try:
-        data = data_generator.time_series_data
-
         # 按时间范围筛选
-        cutoff_time = datetime.now()
-        # 确保cutoff_time是naive datetime（无时区信息）
-        if cutoff_time.tzinfo is not None:
-            cutoff_time = cutoff_time.replace(tzinfo=None)
-        cutoff_time = cutoff_time - timedelta(minutes=minutes)
-        data = [d for d in data if d.timestamp >= cutoff_time]
+        start_ms = to_epoch_ms(datetime.now() - timedelta(minutes=minutes))
 
         # 按 after 参数筛选
         if after:
             try:
-                # 更健壮的时间解析逻辑
-                if 'T' in after and ('Z' in after or '+' in after or after.count('-') > 2):
-                    # ISO format with timezone
-                    if after.endswith('Z'):
-                        after_time = datetime.fromisoformat(after.replace('Z', '+00:00'))
-                    else:
-                        after_time = datetime.fromisoformat(after)
-                else:
-                    # Try to parse as a general date string
-                    after_time = datetime.fromisoformat(after)
-                
-                # 确保after_time是naive datetime（无时区信息）
-                if after_time.tzinfo is not None:
-                    # 如果有时区信息，转换为UTC然后移除时区信息
-                    after_time = after_time.utctimetuple()
-                    after_time = datetime(*after_time[:6])
-                
-                # Filter data after the specified time
-                data = [d for d in data if d.timestamp >= after_time]
+                # 兼容以 Z 结尾的 UTC 时间
+                if after.endswith('Z'):
+                    after = after[:-1] + '+00:00'
+                # 带时区的时间直接换算为时间戳，naive 时间按本地时间处理
+                start_ms = max(start_ms, to_epoch_ms(datetime.fromisoformat(after)))
             except (ValueError, TypeError) as e:
                 # 如果时间格式不正确，记录日志并忽略 after 参数
                 print(f"Warning: 时间解析错误，忽略after参数: {e}")
-                pass
 
-        # 按指标类型筛选
-        if metric_type:
-            data = [d for d in data if d.metric_type == metric_type]
-
-        # 按区域筛选
-        if region:
-            data = [d for d in data if d.region == region]
-            
-        # 按服务器ID筛选
-        if server_id:
-            data = [d for d in data if d.server_id == server_id]
-
-        return [item.dict() for item in data]
+        # 按指标类型、区域、服务器ID、服务类型通过倒排索引筛选，时间窗口在每条序列上二分查找
+        # 长时间窗口需要读取磁盘历史并降采样，放到工作线程中执行
+        result = await asyncio.to_thread(
+            data_generator.time_series_store.query,
+            metric_type=metric_type,
+            region=region,
+            server_id=server_id,
+            service_type=service_type,
+            start=start_ms,
+            max_points=max_points,
+            method=method,
+            columnar=format != "json"
+        )
+
+        if format == "binary":
+            return Response(content=columns_to_binary(result), media_type=BINARY_MEDIA_TYPE)
+        if format == "columnar":
+            return columns_to_json(result)
+        return result
     except Exception as e:
         print(f"获取时间序列数据时出错: {str(e)}")
         import traceback
         traceback.print_exc()  # 打印详细的错误堆栈
         raise HTTPException(status_code=500, detail=f"获取时间序列数据时出错: {str(e)}")
 
+@app.get("/api/timeseries/stats")
+async def get_time_series_stats(
+    window: str = Query("5m", pattern=f"^({'|'.join(STATS_WINDOWS)})$", description="统计窗口: 1m, 5m, 15m"),
+    metric_type: Optional[str] = Query(None, description="指标类型"),
+    region: Optional[str] = Query(None, description="按区域筛选"),
+    server_id: Optional[str] = Query(None, description="按服务器ID筛选"),
+    service_type: Optional[str] = Query(None, description="按服务类型筛选")
+):
+    """获取每条时间序列在滑动窗口内的统计（点数、均值、标准差、EWMA、每秒变化率、最新值）"""
+    try:
+        return data_generator.get_series_stats(window, metric_type=metric_type, region=region,
+                                               server_id=server_id, service_type=service_type)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取时间序列统计时出错: {str(e)}")
+
+@app.get("/api/timeseries/stream")
+async def stream_time_series_data(
+    request: Request,
+    metric_type: Optional[str] = Query(None, description="指标类型"),
+    region: Optional[str] = Query(None, description="按区域筛选"),
+    server_id: Optional[str] = Query(None, description="按服务器ID筛选")
+):
+    """以 SSE 推送每次更新新产生的时间序列数据"""
+    topic, queue = timeseries_publisher.subscribe(metric_type, region, server_id)
+
+    async def event_stream():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            timeseries_publisher.unsubscribe(topic, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/stats")
 async def get_statistics():
     """获取系统统计信息"""
     try:
-        servers = data_generator.servers
+        server_index = data_generator.server_index
+        state = data_generator.state
         system_health = data_generator.get_system_health()
+        recent_cutoff = int((datetime.now() - timedelta(hours=1)).timestamp() * 1000)
 
         stats = {
-            "total_servers": len(servers),
-            "servers_by_region": {},
+            "total_servers": len(server_index),
+            # 按区域、服务类型统计服务器，直接读取索引计数
+            "servers_by_region": server_index.group_counts("region"),
             "servers_by_status": {
                 "healthy": system_health.healthy_servers,
                 "warning": system_health.warning_servers,
                 "danger": system_health.danger_servers,
                 "offline": system_health.offline_servers
             },
-            "servers_by_service_type": {},
-            "active_tasks": len([t for t in data_generator.tasks if t.status == TaskStatus.RUNNING]),
-            "recent_alerts": len([a for a in data_generator.alerts if a.timestamp > datetime.now() - timedelta(hours=1)]),
-            "load_balance_ratio": data_generator.get_load_balance_status().ratio
+            "servers_by_service_type": server_index.group_counts("serviceType"),
+            "active_tasks": state.task_index.count("status", "running"),
+            "recent_alerts": sum(1 for a in state.alerts if a["timestamp"] > recent_cutoff),
+            "load_balance_ratio": data_generator.get_load_balance_status().ratio,
+            # 最近 5 分钟整体的 p50/p95/p99
+            "percentiles": data_generator.get_group_percentiles(None, 300)["groups"][0]
         }
 
-        # 按区域统计服务器
-        for server in servers:
-            region = server.region
-            if region not in stats["servers_by_region"]:
-                stats["servers_by_region"][region] = 0
-            stats["servers_by_region"][region] += 1
-
-        # 按服务类型统计服务器
-        for server in servers:
-            for tag in server.tags:
-                if tag in data_generator.service_types:
-                    if tag not in stats["servers_by_service_type"]:
-                        stats["servers_by_service_type"][tag] = 0
-                    stats["servers_by_service_type"][tag] += 1
-
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取统计信息时出错: {str(e)}")
 
+@app.get("/api/stats/percentiles")
+async def get_group_percentiles(
+    group_by: Optional[str] = Query(None, pattern="^(region|cluster|service_type)$",
+                                    description="分组维度: region, cluster, service_type，为空时返回整体"),
+    window: str = Query("5m", description="时间窗口，如 1m、5m、15m（按草图时间桶取整）")
+):
+    """各分组 CPU、内存、网络指标的 p50/p95/p99，由分组的分位数草图合并得到"""
+    try:
+        window_ms = parse_duration(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    retention = data_generator.quantile_sketches.retention_seconds
+    if window_ms // 1000 > retention:
+        raise HTTPException(status_code=400, detail=f"时间窗口超出分位数草图的保留时长 {retention} 秒")
+    try:
+        return data_generator.get_group_percentiles(group_by, window_ms // 1000)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取分位数统计时出错: {str(e)}")
+
 @app.get("/api/search")
 async def search_data(
     q: str = Query(..., description="搜索查询"),
-    type: str = Query("all", description="搜索类型: all, servers, tasks, alerts")
+    type: str = Query("all", pattern="^(all|servers|tasks|alerts)$", description="搜索类型: all, servers, tasks, alerts"),
+    limit: int = Query(20, ge=1, le=1000, description="每种类型返回的结果数量"),
+    offset: int = Query(0, ge=0, description="每种类型跳过的结果数量")
 ):
-    """跨所有数据类型搜索"""
+    """跨所有数据类型搜索：前缀匹配，按相关度排序，counts 为各类型的命中总数"""
     try:
-        query = q.lower()
-        results = {
-            "servers": [],
-            "tasks": [],
-            "alerts": []
-        }
-
-        if type in ["all", "servers"]:
-            for server in data_generator.servers:
-                if (query in server.name.lower() or
-                    query in server.region.lower() or
-                    any(query in tag.lower() for tag in server.tags)):
-                    results["servers"].append(server.dict())
-
-        if type in ["all", "tasks"]:
-            for task in data_generator.tasks:
-                if (query in task.name.lower() or
-                    query in task.cluster.lower() or
-                    (task.target_cluster and query in task.target_cluster.lower()) or
-                    query in task.description.lower()):
-                    results["tasks"].append(task.dict())
-
-        if type in ["all", "alerts"]:
-            for alert in data_generator.alerts:
-                if (query in alert.message.lower() or
-                    query in alert.server_id.lower()):
-                    results["alerts"].append(alert.dict())
-
-        return results
+        types = ("servers", "tasks", "alerts") if type == "all" else (type,)
+        return data_generator.search(q, types, limit=limit, offset=offset)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索数据时出错: {str(e)}")
 
@@ -349,7 +770,6 @@ async def search_data(
 # 例如在命令行运行: uvicorn main:app --reload --host 0.0.0.0 --port 8000
 if __name__ == "__main__":
     import uvicorn
-    import os
     # 改变当前工作目录到 backend 目录，确保能正确导入模块
     os.chdir(os.path.dirname(os.path.abspath(__file__)))
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=False)
@@ -0,0 +1,80 @@
+import re
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# 服务器指标字段，与 ServerMetrics 一致（顺序即矩阵的列顺序）
+METRIC_FIELDS = ("cpu_usage", "memory_usage", "disk_usage", "network_in_mbps", "network_out_mbps",
+                 "load_1m", "load_5m", "load_15m")
+
+# 默认保留的帧数：每 2 秒一帧，保留 15 分钟
+DEFAULT_HISTORY_CAPACITY = 450
+
+# 环形缓冲区在逻辑容量之外多分配的帧数，读取方在写入方再写入 FRAME_SLACK 帧之前完成拷贝即可
+FRAME_SLACK = 4
+
+_DURATION = re.compile(r"^(\d+)([smh])$")
+_DURATION_UNITS_MS = {"s": 1000, "m": 60 * 1000, "h": 3600 * 1000}
+
+
+def parse_duration(value: str) -> int:
+    """解析 30s / 5m / 1h 形式的时长，返回毫秒；格式不正确时抛出 ValueError"""
+    match = _DURATION.match(value.strip())
+    if not match or not int(match.group(1)):
+        raise ValueError(f"无效的时长: {value}")
+    return int(match.group(1)) * _DURATION_UNITS_MS[match.group(2)]
+
+
+class MetricsFrame(NamedTuple):
+    """某次更新时所有服务器的指标：values 为 [服务器数, 指标数]，行顺序与 ServerMetricsHistory.server_ids 一致"""
+    timestamp: int  # 毫秒时间戳
+    values: np.ndarray
+
+
+class ServerMetricsHistory:
+    """所有服务器指标历史的定长环形缓冲区
+
+    每次更新写入一帧 [服务器数, 指标数] 的 float32 矩阵，单台服务器的历史即各帧中的同一行，
+    写入一次完成、不需要为每台服务器单独维护缓冲区。单写多读：写入方先写数据再递增累计帧数，
+    读取方拷贝后确认期间写入的帧数小于 FRAME_SLACK，否则重试。
+    """
+
+    def __init__(self, server_ids: Iterable[str], capacity: int = DEFAULT_HISTORY_CAPACITY):
+        self.server_ids = tuple(server_ids)
+        self.capacity = capacity
+        self._rows: Dict[str, int] = {server_id: row for row, server_id in enumerate(self.server_ids)}
+        slots = capacity + FRAME_SLACK
+        self.timestamps = np.zeros(slots, dtype=np.int64)
+        self.values = np.zeros((slots, len(self.server_ids), len(METRIC_FIELDS)), dtype=np.float32)
+        self._written = 0
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    def __contains__(self, server_id: str) -> bool:
+        return server_id in self._rows
+
+    def row(self, server_id: str) -> Optional[int]:
+        return self._rows.get(server_id)
+
+    def append(self, frame: MetricsFrame):
+        """写入一帧"""
+        written = self._written
+        position = written % len(self.timestamps)
+        self.values[position] = frame.values
+        self.timestamps[position] = frame.timestamp
+        self._written = written + 1
+
+    def window(self, server_id: str, start: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """返回单台服务器 start 之后的 (毫秒时间戳, [帧数, 指标数] 数值) 副本"""
+        row = self._rows[server_id]
+        while True:
+            written = self._written
+            size = min(written, self.capacity)
+            idx = np.arange(written - size, written) % len(self.timestamps)
+            ts = self.timestamps[idx]
+            if start is not None:
+                idx, ts = idx[ts >= start], ts[ts >= start]
+            values = self.values[idx, row].astype(np.float64)
+            if self._written - written < FRAME_SLACK:
+                return ts, np.round(values, 2)
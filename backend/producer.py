@@ -0,0 +1,79 @@
+"""
+共享模式的数据生产进程
+
+独占数据生成，将时间序列写入共享内存，并在每次更新后发布数据快照，
+多个 uvicorn 工作进程读取同一份数据。
+
+用法：
+    python producer.py                                                  # 默认 /dev/shm/monitor-dashboard
+    MONITOR_SHARED_STATE=/dev/shm/monitor-dashboard uvicorn main:app --workers 8 --port 8000
+"""
+
+import argparse
+import os
+import time
+from typing import Dict, List
+
+# 只使用 main 中的数据生成器和快照缓存，不启动其生命周期（共享模式的设置只在生命周期中生效）
+import main
+from shared_state import SHARED_STATE_ENV, DEFAULT_SHARED_STATE_PATH, SharedStatePublisher
+
+
+def fleet_series_labels(generator) -> List[Dict]:
+    """所有服务器 × 指标类型的序列标签，共享文件按此顺序预先分配"""
+    return [
+        {
+            "metric_type": metric_type,
+            "server_id": server["serverId"],
+            "region": server["region"],
+            "service_type": server["serviceType"],
+        }
+        for metric_type in generator.metric_types
+        for server in generator.servers
+    ]
+
+
+def static_payload(generator) -> Dict:
+    return {
+        "clusters": generator.clusters,
+        "servers": generator.servers,
+        "server_index": generator.server_index,
+        "body": main.static_cache.get(generator.static_version).body,
+    }
+
+
+def run(path: str):
+    generator = main.data_generator
+    publisher = SharedStatePublisher(path, fleet_series_labels(generator), generator.TIME_SERIES_CAPACITY,
+                                     history=generator.time_series_store.history)
+    generator.time_series_store = publisher.store
+
+    # 初始化时间序列数据
+    generator.warm_up()
+    published_static = generator.static_version
+    publisher.publish_static(published_static, static_payload(generator))
+    print(f"生产进程已启动，共享数据: {path}（{generator.time_series_store.series_count} 条序列）")
+
+    while True:
+        try:
+            state = generator.prepare_update()
+            # 动态数据在这里编码一次，工作进程直接复用
+            body = main.dynamic_cache.get(state.version, state).body
+            generator.publish_state(state)
+
+            if generator.static_version != published_static:
+                published_static = generator.static_version
+                publisher.publish_static(published_static, static_payload(generator))
+            publisher.publish_dynamic(state.version, {"state": state, "body": body})
+            time.sleep(main.UPDATE_INTERVAL_SECONDS)
+        except Exception as e:
+            print(f"数据更新错误: {e}")
+            time.sleep(main.UPDATE_RETRY_SECONDS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="共享模式的数据生产进程")
+    parser.add_argument("--path", default=os.environ.get(SHARED_STATE_ENV, DEFAULT_SHARED_STATE_PATH),
+                        help="共享数据文件路径")
+    args = parser.parse_args()
+    run(args.path)
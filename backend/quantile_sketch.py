@@ -0,0 +1,189 @@
+import math
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from metrics_history import METRIC_FIELDS, MetricsFrame
+
+# 计算分位数的服务器指标
+SKETCH_METRICS = ("cpu_usage", "memory_usage", "network_in_mbps", "network_out_mbps")
+
+# 分组维度 -> 服务器字段
+SKETCH_DIMENSIONS = {"region": "region", "cluster": "clusterId", "service_type": "serviceType"}
+
+# 默认输出的分位数
+DEFAULT_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+# 低于 MIN_VALUE 的值计入零桶（按 0 输出，绝对误差小于 MIN_VALUE），高于 MAX_VALUE 的值计入最后一个桶
+MIN_VALUE = 0.1
+MAX_VALUE = 1e4
+
+
+class LogBinning:
+    """DDSketch 的对数分桶：值 v 落入 ceil(log_gamma(v)) 号桶，gamma = (1 + α) / (1 - α)，
+    用桶的代表值 2 * gamma^k / (gamma + 1) 估计时相对误差不超过 α。0 号桶为零桶。"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 min_value: float = MIN_VALUE, max_value: float = MAX_VALUE):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy 应在 (0, 1) 之间")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.min_value = min_value
+        self._min_key = math.ceil(math.log(min_value) / self._log_gamma)
+        max_key = math.ceil(math.log(max_value) / self._log_gamma)
+        self.bins = max_key - self._min_key + 2
+
+    def index(self, values: np.ndarray) -> np.ndarray:
+        """值 -> 桶号"""
+        values = np.asarray(values, dtype=np.float64)
+        keys = np.ceil(np.log(np.maximum(values, self.min_value)) / self._log_gamma) - self._min_key + 1
+        return np.where(values < self.min_value, 0, np.clip(keys, 1, self.bins - 1)).astype(np.int64)
+
+    def value(self, bins: np.ndarray) -> np.ndarray:
+        """桶号 -> 代表值"""
+        keys = np.asarray(bins) + self._min_key - 1
+        return np.where(bins == 0, 0.0, 2 * self.gamma ** keys / (self.gamma + 1))
+
+
+def quantiles_from_counts(counts: np.ndarray, binning: LogBinning, quantiles: Sequence[float]) -> np.ndarray:
+    """由 [..., 桶数] 的计数得到 [..., 分位数个数] 的分位数估计，没有数据的位置为 nan"""
+    cumulative = np.cumsum(counts, axis=-1, dtype=np.int64)
+    totals = cumulative[..., -1:]
+    result = np.full(counts.shape[:-1] + (len(quantiles),), np.nan)
+    for i, quantile in enumerate(quantiles):
+        rank = np.floor(quantile * (totals - 1))
+        bins = np.argmax(cumulative > rank, axis=-1)
+        result[..., i] = np.where(totals[..., 0] > 0, binning.value(bins), np.nan)
+    return result
+
+
+class SketchLayout(NamedTuple):
+    """分组布局与草图计数，分组变化时整体替换"""
+    groups: Dict[str, Tuple[str, ...]]  # 维度 -> 分组值
+    offsets: Dict[str, int]  # 维度 -> 第一个分组所在的行
+    counts: np.ndarray  # [时间桶, 分组行, 指标, 桶]
+
+
+class GroupQuantileSketches:
+    """按分组、按时间桶维护的可合并分位数草图（DDSketch）
+
+    每个 (时间桶, 分组, 指标) 是一个对数分桶的计数数组，每帧指标对所有维度的分组做一次 bincount 累加；
+    查询窗口内的分位数时把窗口内各时间桶的计数相加（草图合并），整体的分位数由各地域的草图相加得到，
+    不需要保留或排序原始数据。内存固定为 时间桶数 × 分组数 × 指标数 × 桶数 个计数，与数据量无关。
+
+    单写多读：写入方进入新的时间桶时先清零再写入桶号；读取方求和后确认所用时间桶的桶号未变，否则重试。
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, bucket_seconds: int = 60,
+                 buckets: int = 15, metrics: Sequence[str] = SKETCH_METRICS,
+                 dimensions: Dict[str, str] = SKETCH_DIMENSIONS):
+        self.binning = LogBinning(relative_accuracy)
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.metrics = tuple(metrics)
+        self.dimensions = dict(dimensions)
+        self._columns = np.array([METRIC_FIELDS.index(metric) for metric in self.metrics], dtype=np.int64)
+
+        self.server_ids: Tuple[str, ...] = ()
+        self._server_rows = np.zeros((0, len(self.dimensions)), dtype=np.int64)  # [服务器数, 维度数] -> 分组行
+        # 比保留的时间桶多一个，当前桶之前的 buckets 个桶在读取期间不会被清零
+        self._bucket_ids = np.full(buckets + 1, -1, dtype=np.int64)
+        self._layout = SketchLayout(
+            {dimension: () for dimension in self.dimensions}, {dimension: 0 for dimension in self.dimensions},
+            np.zeros((buckets + 1, 0, len(self.metrics), self.binning.bins), dtype=np.uint32))
+
+    @property
+    def groups(self) -> Dict[str, Tuple[str, ...]]:
+        return self._layout.groups
+
+    @property
+    def nbytes(self) -> int:
+        return self._layout.counts.nbytes
+
+    @property
+    def retention_seconds(self) -> int:
+        """可查询的最长窗口"""
+        return self.buckets * self.bucket_seconds
+
+    def bind(self, servers: Sequence[Dict]):
+        """按服务器列表（与指标帧的行顺序一致）建立分组；已有分组的草图保留，新分组从空草图开始"""
+        groups = {dimension: tuple(sorted({str(server[field]) for server in servers}))
+                  for dimension, field in self.dimensions.items()}
+        offsets, total = {}, 0
+        for dimension in self.dimensions:
+            offsets[dimension] = total
+            total += len(groups[dimension])
+
+        layout = self._layout
+        if groups != layout.groups:
+            counts = np.zeros((self.buckets + 1, total, len(self.metrics), self.binning.bins), dtype=np.uint32)
+            for dimension, values in layout.groups.items():
+                previous = {value: layout.offsets[dimension] + i for i, value in enumerate(values)}
+                kept = [(offsets[dimension] + i, previous[value])
+                        for i, value in enumerate(groups[dimension]) if value in previous]
+                if kept:
+                    new_rows, old_rows = zip(*kept)
+                    counts[:, list(new_rows)] = layout.counts[:, list(old_rows)]
+            self._layout = SketchLayout(groups, offsets, counts)
+
+        rows = {dimension: {value: offsets[dimension] + i for i, value in enumerate(values)}
+                for dimension, values in groups.items()}
+        self._server_rows = np.array(
+            [[rows[dimension][str(server[field])] for dimension, field in self.dimensions.items()]
+             for server in servers], dtype=np.int64).reshape(len(servers), len(self.dimensions))
+        self.server_ids = tuple(server["serverId"] for server in servers)
+
+    def add(self, frame: MetricsFrame):
+        """把一帧指标计入对应时间桶的各分组草图"""
+        if not len(self._server_rows):
+            return
+        counts = self._layout.counts
+        bucket = frame.timestamp // (self.bucket_seconds * 1000)
+        slot = bucket % len(self._bucket_ids)
+        if self._bucket_ids[slot] != bucket:
+            self._bucket_ids[slot] = -1
+            counts[slot] = 0
+            self._bucket_ids[slot] = bucket
+
+        metrics, bins = len(self.metrics), self.binning.bins
+        indices = self.binning.index(frame.values[:, self._columns])  # [服务器数, 指标数]
+        # 每个 (服务器, 维度, 指标) 对应 (分组行, 指标, 桶) 的展平下标
+        flat = ((self._server_rows[:, :, None] * metrics + np.arange(metrics)) * bins + indices[:, None, :])
+        added = np.bincount(flat.ravel(), minlength=counts[slot].size)
+        counts[slot] += added.reshape(counts[slot].shape).astype(np.uint32)
+
+    def _window_counts(self, counts: np.ndarray, window_seconds: int, rows: slice) -> np.ndarray:
+        """窗口内（按时间桶取整，包含当前未结束的桶）各分组草图合并后的计数 [分组数, 指标数, 桶数]"""
+        count = max(1, min(self.buckets, math.ceil(window_seconds / self.bucket_seconds)))
+        while True:
+            ids = self._bucket_ids.copy()
+            latest = int(ids.max())
+            slots = np.nonzero((ids > latest - count) & (ids >= 0))[0]
+            merged = counts[slots, rows].sum(axis=0, dtype=np.int64)
+            if np.array_equal(self._bucket_ids[slots], ids[slots]):
+                return merged
+
+    def quantiles(self, dimension: Optional[str], window_seconds: int,
+                  quantiles: Dict[str, float] = DEFAULT_QUANTILES) -> List[Dict]:
+        """窗口内某个维度各分组的分位数；dimension 为 None 时返回由地域草图合并的整体结果"""
+        layout = self._layout
+        name = dimension or next(iter(self.dimensions))
+        groups = layout.groups[name]
+        start = layout.offsets[name]
+        merged = self._window_counts(layout.counts, window_seconds, slice(start, start + len(groups)))
+        if dimension is None:
+            groups, merged = ("all",), merged.sum(axis=0, keepdims=True)
+
+        totals = merged[:, 0].sum(axis=-1)
+        estimates = np.round(quantiles_from_counts(merged, self.binning, list(quantiles.values())), 2)
+        results = []
+        for group, total, values in zip(groups, totals.tolist(), estimates):
+            result = {"group": group, "count": total}
+            for metric, row in zip(self.metrics, values.tolist()):
+                result[metric] = {label: None if math.isnan(value) else value
+                                  for label, value in zip(quantiles, row)}
+            results.append(result)
+        return results
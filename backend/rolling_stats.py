@@ -0,0 +1,163 @@
+import math
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from timeseries_store import SeriesBatch
+
+SeriesKey = Tuple[Optional[str], str]
+
+# 滑动窗口名称 -> 时长（秒）
+STATS_WINDOWS = {"1m": 60, "5m": 300, "15m": 900}
+
+# 每次统计值发布时输出的字段
+STATS_FIELDS = ("count", "mean", "std", "ewma", "rate", "last")
+
+
+class StatsSnapshot(NamedTuple):
+    """某次更新后发布的只读统计结果：windows 为 窗口 -> 字段 -> [序列数] 数组，行顺序与 keys 一致"""
+    keys: Tuple[SeriesKey, ...]
+    labels: Tuple[Dict[str, Optional[str]], ...]
+    rows: Dict[SeriesKey, int]
+    windows: Dict[str, Dict[str, np.ndarray]]
+
+
+class RollingStats:
+    """每条时间序列的滑动窗口统计（均值、标准差、EWMA、变化率），每个采样点 O(1) 增量更新
+
+    采样间隔固定，窗口按采样点数计算（如 10 秒间隔时 5m 为最近 30 个点）。每条序列保留最近
+    最大窗口个点的小环形缓冲区，新点加入时对每个窗口加上新值、减去移出窗口的值，维护累计和与平方和；
+    EWMA 的时间常数等于窗口时长。所有序列存放在同一组数组中，同一批数据按数组整体更新。
+
+    只有写入方调用 update / seed；每次更新后构建新的 StatsSnapshot 并整体替换，读取方只读取 snapshot。
+    """
+
+    def __init__(self, interval_seconds: int, windows: Dict[str, int] = STATS_WINDOWS):
+        self.interval_seconds = interval_seconds
+        self.window_samples = {name: max(1, seconds // interval_seconds) for name, seconds in windows.items()}
+        self.alphas = {name: 1 - math.exp(-interval_seconds / seconds) for name, seconds in windows.items()}
+        self.depth = max(self.window_samples.values())
+
+        self._rows: Dict[SeriesKey, int] = {}
+        self._keys: List[SeriesKey] = []
+        self._labels: List[Dict[str, Optional[str]]] = []
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._ring = np.zeros((0, self.depth), dtype=np.float64)
+        self._sums = {name: np.zeros(0) for name in self.window_samples}
+        self._squares = {name: np.zeros(0) for name in self.window_samples}
+        self._ewma = {name: np.zeros(0) for name in self.window_samples}
+
+        self.snapshot = StatsSnapshot((), (), {}, {name: {} for name in self.window_samples})
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _row(self, key: SeriesKey, labels: Dict[str, Optional[str]]) -> int:
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            self._rows[key] = row
+            self._keys.append(key)
+            self._labels.append(labels)
+        elif self._labels[row] is not labels:
+            # 序列标签修改后（服务器更换区域、服务类型）使用新的标签
+            self._labels[row] = labels
+        return row
+
+    def _grow(self):
+        """新序列加入后扩展数组（按倍数预留，避免每次都复制）"""
+        size = len(self._keys)
+        capacity = len(self._counts)
+        if size <= capacity:
+            return
+        capacity = max(size, capacity * 2)
+
+        def grown(array: np.ndarray) -> np.ndarray:
+            result = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            result[:len(array)] = array
+            return result
+
+        self._counts = grown(self._counts)
+        self._ring = grown(self._ring)
+        for arrays in (self._sums, self._squares, self._ewma):
+            for name in arrays:
+                arrays[name] = grown(arrays[name])
+
+    def _add(self, rows: np.ndarray, values: np.ndarray):
+        """每条序列加入一个新点（rows 不重复）"""
+        counts = self._counts[rows]
+        for name, samples in self.window_samples.items():
+            # 窗口已满时减去移出窗口的值（先读取，随后可能被新值覆盖）
+            leaving = np.where(counts >= samples, self._ring[rows, (counts - samples) % self.depth], 0.0)
+            self._sums[name][rows] += values - leaving
+            self._squares[name][rows] += values * values - leaving * leaving
+            ewma = self._ewma[name][rows]
+            self._ewma[name][rows] = np.where(counts == 0, values, ewma + self.alphas[name] * (values - ewma))
+        self._ring[rows, counts % self.depth] = values
+        self._counts[rows] = counts + 1
+
+    def update(self, batch: SeriesBatch):
+        """加入一批新数据点并发布新的统计结果；同一序列在一批中有多个点时按顺序分轮更新"""
+        if not len(batch.values):
+            return
+        rows, rounds = [], []
+        seen: Dict[int, int] = {}
+        for labels in batch.labels:
+            row = self._row((labels["server_id"], labels["metric_type"]), labels)
+            rows.append(row)
+            rounds.append(seen.get(row, 0))
+            seen[row] = rounds[-1] + 1
+
+        self._grow()
+        rows, values, rounds = np.array(rows), np.asarray(batch.values, dtype=np.float64), np.array(rounds)
+        for index in range(int(rounds.max()) + 1):
+            selected = rounds == index
+            self._add(rows[selected], values[selected])
+        self.publish()
+
+    def seed(self, series: Iterable[Tuple[Dict[str, Optional[str]], np.ndarray]]):
+        """用已有数据（每条序列按时间排序的数值）初始化统计，只使用最近最大窗口个点"""
+        rows, tails = [], []
+        for labels, values in series:
+            if len(values):
+                rows.append(self._row((labels["server_id"], labels["metric_type"]), labels))
+                tails.append(values[-self.depth:])
+        if rows:
+            self._grow()
+            # 右对齐成 [序列数, depth] 矩阵，按列（时间顺序）分轮加入
+            rows = np.array(rows)
+            lengths = np.array([len(tail) for tail in tails])
+            matrix = np.zeros((len(tails), self.depth))
+            for i, tail in enumerate(tails):
+                matrix[i, self.depth - len(tail):] = tail
+            for column in range(self.depth):
+                selected = lengths >= self.depth - column
+                self._add(rows[selected], matrix[selected, column])
+        self.publish()
+
+    def publish(self):
+        """由当前累计值计算各窗口的统计结果并整体替换 snapshot"""
+        size = len(self._keys)
+        counts = self._counts[:size]
+        filled = np.maximum(counts, 1)
+        rows = np.arange(size)
+        last = self._ring[rows, (filled - 1) % self.depth]
+
+        windows = {}
+        for name, samples in self.window_samples.items():
+            count = np.minimum(counts, samples)
+            divisor = np.maximum(count, 1)
+            mean = self._sums[name][:size] / divisor
+            variance = np.maximum(self._squares[name][:size] / divisor - mean * mean, 0.0)
+            # 变化率：窗口内最新值与最旧值之差除以时间跨度（每秒）
+            oldest = self._ring[rows, (filled - np.maximum(count, 1)) % self.depth]
+            span = np.maximum(count - 1, 1) * self.interval_seconds
+            windows[name] = {
+                "count": count,
+                "mean": mean,
+                "std": np.sqrt(variance),
+                "ewma": self._ewma[name][:size].copy(),
+                "rate": np.where(count > 1, (last - oldest) / span, 0.0),
+                "last": last,
+            }
+        self.snapshot = StatsSnapshot(tuple(self._keys), tuple(self._labels), dict(self._rows), windows)
@@ -0,0 +1,138 @@
+import heapq
+import itertools
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 前缀倒排索引收录的最大前缀长度，更长的查询词先按此长度取候选再逐个校验
+MAX_PREFIX_LENGTH = 16
+
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(value) -> List[str]:
+    """字段值切分为检索词：按空白切分后转小写；含分隔符的词（如 srv-1-2）同时保留整体和其中的单词"""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [token for item in value for token in tokenize(item)]
+
+    tokens = []
+    for part in str(value).lower().split():
+        tokens.append(part)
+        words = _WORD.findall(part)
+        if words != [part]:
+            tokens.extend(words)
+    return tokens
+
+
+class SearchIndex:
+    """实体全文检索索引：检索词 + 前缀倒排，随实体增删增量维护
+
+    fields 为 字段 -> 权重。每个查询词按前缀匹配，完全匹配额外加一次权重；
+    多个查询词取交集，得分为各词得分之和，同分按加入顺序排列。
+    单写多读：读取方遍历 posting 前先用 list() 做快照，写入线程无需加锁。
+    """
+
+    def __init__(self, key_field: str, fields: Dict[str, float]):
+        self.key_field = key_field
+        self.fields = dict(fields)
+        self._prefixes: Dict[str, Dict[str, float]] = {}  # 前缀 -> 实体 ID -> 权重
+        self._terms: Dict[str, Dict[str, float]] = {}  # 完整检索词 -> 实体 ID -> 权重
+        self._doc_terms: Dict[str, Dict[str, float]] = {}  # 实体 ID -> 检索词 -> 权重，删除时使用
+        self._order: Dict[str, int] = {}
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._doc_terms
+
+    def add(self, entity: Dict):
+        """加入实体，主键已存在时重新建立索引"""
+        entity_id = entity[self.key_field]
+        if entity_id in self._doc_terms:
+            self.remove(entity_id)
+
+        terms: Dict[str, float] = {}
+        for field, weight in self.fields.items():
+            for token in tokenize(entity.get(field)):
+                terms[token] = max(terms.get(token, 0), weight)
+
+        prefixes: Dict[str, float] = {}
+        for token, weight in terms.items():
+            self._terms.setdefault(token, {})[entity_id] = weight
+            for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+                prefix = token[:length]
+                prefixes[prefix] = max(prefixes.get(prefix, 0), weight)
+        for prefix, weight in prefixes.items():
+            self._prefixes.setdefault(prefix, {})[entity_id] = weight
+
+        self._doc_terms[entity_id] = terms
+        self._order[entity_id] = next(self._sequence)
+
+    def remove(self, entity_id: str):
+        """移除实体并清理倒排"""
+        terms = self._doc_terms.pop(entity_id, None)
+        if terms is None:
+            return
+        self._order.pop(entity_id, None)
+        prefixes = {token[:length] for token in terms
+                    for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1)}
+        for postings, keys in ((self._terms, terms), (self._prefixes, prefixes)):
+            for key in keys:
+                ids = postings.get(key)
+                if ids is None:
+                    continue
+                ids.pop(entity_id, None)
+                if not ids:
+                    del postings[key]
+
+    def sync(self, entities: Iterable[Dict]):
+        """与给定的实体集合同步：加入新实体，移除已不存在的实体（已有实体不重建索引）"""
+        current: Set[str] = set()
+        for entity in entities:
+            entity_id = entity[self.key_field]
+            current.add(entity_id)
+            if entity_id not in self._doc_terms:
+                self.add(entity)
+        for entity_id in [entity_id for entity_id in list(self._doc_terms) if entity_id not in current]:
+            self.remove(entity_id)
+
+    def _match(self, term: str) -> Dict[str, float]:
+        """单个查询词的匹配结果：实体 ID -> 得分"""
+        scores = dict(list(self._prefixes.get(term[:MAX_PREFIX_LENGTH], {}).items()))
+        if len(term) > MAX_PREFIX_LENGTH:
+            # 超出前缀长度的部分逐个校验
+            scores = {entity_id: score for entity_id, score in scores.items()
+                      if any(token.startswith(term) for token in self._doc_terms.get(entity_id, ()))}
+        for entity_id, weight in list(self._terms.get(term, {}).items()):
+            if entity_id in scores:
+                scores[entity_id] += weight
+        return scores
+
+    def search(self, query: str, limit: Optional[int] = None, offset: int = 0) -> Tuple[int, List[str]]:
+        """检索并排序，返回 (命中总数, 当前页的实体 ID 列表)"""
+        terms = query.lower().split()
+        if not terms:
+            return 0, []
+
+        scores: Optional[Dict[str, float]] = None
+        # 先处理命中最少的词，交集尽快缩小
+        for term in sorted(terms, key=lambda term: len(self._prefixes.get(term[:MAX_PREFIX_LENGTH], ()))):
+            matches = self._match(term)
+            if scores is not None:
+                matches = {entity_id: scores[entity_id] + score
+                           for entity_id, score in matches.items() if entity_id in scores}
+            scores = matches
+            if not scores:
+                return 0, []
+
+        order = self._order
+        rank = lambda entity_id: (-scores[entity_id], order.get(entity_id, 0))
+        if limit is None:
+            ranked = sorted(scores, key=rank)[offset:]
+        else:
+            # 只需要前 offset + limit 个，部分排序
+            ranked = heapq.nsmallest(offset + limit, scores, key=rank)[offset:]
+        return len(scores), ranked
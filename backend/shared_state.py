@@ -0,0 +1,164 @@
+"""
+多进程共享数据
+
+生产进程（producer.py）独占数据生成，时间序列直接写在 mmap 文件中的数组里，
+其余数据（集群/服务器、任务/告警快照及已编码的响应体）每个版本序列化后原子替换。
+uvicorn 的多个工作进程以只读方式映射同一个文件，无需拷贝即可读取时间序列。
+
+文件布局（均位于 path 所在目录，建议使用 /dev/shm）：
+    path            头部 + 每条序列的累计写入数 + 时间戳数组 + 数值数组
+    path.series     序列标签列表（创建时写入一次）
+    path.static     静态数据快照（static_version 变化时替换）
+    path.dynamic    动态数据快照（每次更新替换）
+"""
+
+import mmap
+import os
+import pickle
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from history_store import HistoryStore
+from timeseries_store import WRITE_SLACK, SeriesRingBuffer, TimeSeriesStore
+
+# 启用共享模式的环境变量，值为共享文件路径
+SHARED_STATE_ENV = "MONITOR_SHARED_STATE"
+DEFAULT_SHARED_STATE_PATH = os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+                                         "monitor-dashboard")
+
+MAGIC = int.from_bytes(b"MONDASH1", "little")
+# 头部字段（int64）：静态/动态快照的发布序号，每发布一次加一
+HEADER_SIZE = 8 * 8
+H_MAGIC, H_SERIES_COUNT, H_CAPACITY, H_STATIC_SEQ, H_DYNAMIC_SEQ = range(5)
+
+SERIES_SUFFIX = ".series"
+STATIC_SUFFIX = ".static"
+DYNAMIC_SUFFIX = ".dynamic"
+
+
+def _file_size(series_count: int, capacity: int) -> int:
+    slots = capacity + WRITE_SLACK
+    return HEADER_SIZE + 8 * series_count + 2 * 8 * series_count * slots
+
+
+def _map_arrays(buffer, series_count: int, capacity: int) -> Tuple[np.ndarray, ...]:
+    """在映射的内存上构造 (头部, 累计写入数, 时间戳, 数值) 数组视图"""
+    slots = capacity + WRITE_SLACK
+    header = np.frombuffer(buffer, dtype=np.int64, count=8, offset=0)
+    written = np.frombuffer(buffer, dtype=np.int64, count=series_count, offset=HEADER_SIZE)
+    offset = HEADER_SIZE + 8 * series_count
+    timestamps = np.frombuffer(buffer, dtype=np.int64, count=series_count * slots, offset=offset)
+    offset += 8 * series_count * slots
+    values = np.frombuffer(buffer, dtype=np.float64, count=series_count * slots, offset=offset)
+    return header, written, timestamps.reshape(series_count, slots), values.reshape(series_count, slots)
+
+
+def _build_store(capacity: int, labels: List[Dict], written: np.ndarray, timestamps: np.ndarray,
+                 values: np.ndarray, history: Optional[HistoryStore]) -> TimeSeriesStore:
+    store = TimeSeriesStore(capacity, history)
+    for i, series_labels in enumerate(labels):
+        buffer = SeriesRingBuffer(capacity, timestamps[i], values[i], written[i:i + 1])
+        store.add_series(buffer, **series_labels)
+    return store
+
+
+def _write_atomic(path: str, data: bytes):
+    """写入临时文件后重命名，读取方总是读到完整的文件"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_pickle(path: str) -> Any:
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class SharedStatePublisher:
+    """生产进程一侧：创建共享文件，提供基于共享内存的时间序列库并发布快照"""
+
+    def __init__(self, path: str, series_labels: List[Dict], capacity: int,
+                 history: Optional[HistoryStore] = None):
+        self.path = path
+        series_count = len(series_labels)
+        size = _file_size(series_count, capacity)
+
+        # 先在临时文件中初始化再重命名，工作进程不会映射到未初始化的文件
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w+b") as f:
+            f.truncate(size)
+            self._mmap = mmap.mmap(f.fileno(), size)
+        self._header, written, timestamps, values = _map_arrays(self._mmap, series_count, capacity)
+        self._header[H_SERIES_COUNT] = series_count
+        self._header[H_CAPACITY] = capacity
+        self._header[H_MAGIC] = MAGIC
+
+        _write_atomic(path + SERIES_SUFFIX, pickle.dumps(series_labels, pickle.HIGHEST_PROTOCOL))
+        os.replace(tmp_path, path)
+
+        self.store = _build_store(capacity, series_labels, written, timestamps, values, history)
+
+    def _publish(self, suffix: str, field: int, version: int, payload: Dict):
+        _write_atomic(self.path + suffix, pickle.dumps((version, payload), pickle.HIGHEST_PROTOCOL))
+        self._header[field] += 1
+
+    def publish_static(self, version: int, payload: Dict):
+        self._publish(STATIC_SUFFIX, H_STATIC_SEQ, version, payload)
+
+    def publish_dynamic(self, version: int, payload: Dict):
+        self._publish(DYNAMIC_SUFFIX, H_DYNAMIC_SEQ, version, payload)
+
+
+class SharedStateReader:
+    """工作进程一侧：只读映射共享文件，按发布序号轮询快照
+
+    生产进程重启会重新创建文件，工作进程需要随之重启。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._seen = {H_STATIC_SEQ: 0, H_DYNAMIC_SEQ: 0}
+        self._mmap: Optional[mmap.mmap] = None
+        self._header: Optional[np.ndarray] = None
+
+    def ready(self) -> bool:
+        """生产进程是否已发布首个静态和动态快照"""
+        try:
+            with open(self.path, "rb") as f:
+                header = np.frombuffer(f.read(HEADER_SIZE), dtype=np.int64)
+        except FileNotFoundError:
+            return False
+        return (len(header) == 8 and header[H_MAGIC] == MAGIC
+                and header[H_STATIC_SEQ] > 0 and header[H_DYNAMIC_SEQ] > 0)
+
+    def attach(self, history: Optional[HistoryStore] = None) -> TimeSeriesStore:
+        """映射共享文件，返回直接读取共享数组的时间序列库（history 为只读的磁盘历史）"""
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = np.frombuffer(self._mmap, dtype=np.int64, count=8)
+        if header[H_MAGIC] != MAGIC:
+            raise RuntimeError(f"{self.path} 不是有效的共享数据文件")
+
+        series_count, capacity = int(header[H_SERIES_COUNT]), int(header[H_CAPACITY])
+        self._header, written, timestamps, values = _map_arrays(self._mmap, series_count, capacity)
+        labels = _read_pickle(self.path + SERIES_SUFFIX)
+        return _build_store(capacity, labels, written, timestamps, values, history)
+
+    def _poll(self, suffix: str, field: int) -> Optional[Tuple[int, Dict]]:
+        seq = int(self._header[field])
+        if seq == self._seen[field]:
+            return None
+        # 文件先于序号更新，读到的可能比 seq 更新，下次轮询会再读到同一版本，由调用方按版本号忽略
+        self._seen[field] = seq
+        return _read_pickle(self.path + suffix)
+
+    def poll_static(self) -> Optional[Tuple[int, Dict]]:
+        """静态快照有新发布时返回 (版本, 数据)"""
+        return self._poll(STATIC_SUFFIX, H_STATIC_SEQ)
+
+    def poll_dynamic(self) -> Optional[Tuple[int, Dict]]:
+        """动态快照有新发布时返回 (版本, 数据)"""
+        return self._poll(DYNAMIC_SUFFIX, H_DYNAMIC_SEQ)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from compression import compress
+
+
+def encode_json(data: Any) -> bytes:
+    """按 FastAPI JSONResponse 的格式编码 JSON"""
+    return json.dumps(
+        jsonable_encoder(data),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中 ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class Snapshot:
+    """某个版本已编码的响应体"""
+
+    __slots__ = ("version", "body", "etag", "_digest", "_encoded")
+
+    def __init__(self, version: int, body: bytes):
+        self.version = version
+        self.body = body
+        self._digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.etag = f'"{self._digest}"'
+        self._encoded: Dict[str, bytes] = {}
+
+    def encoded(self, encoding: str) -> bytes:
+        """返回压缩后的响应体，每种压缩算法每个版本只压缩一次"""
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = compress(self.body, encoding)
+            self._encoded[encoding] = body
+        return body
+
+    def encoded_etag(self, encoding: str) -> str:
+        """不同压缩编码的表示使用不同的强 ETag"""
+        return f'"{self._digest}-{encoding}"'
+
+
+class SnapshotCache:
+    """按版本号缓存响应：每个版本最多构建、编码、计算哈希一次
+
+    构建可能很慢，应在工作线程中调用 get；事件循环上先用 current 取已构建好的快照。
+    """
+
+    def __init__(self, builder: Callable[..., Any]):
+        self._builder = builder
+        self._snapshot: Optional[Snapshot] = None
+        # 多个线程同时未命中时只构建一次，其余等待后直接复用
+        self._build_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def current(self, version: int) -> Optional[Snapshot]:
+        """返回指定版本已构建好的快照，不触发构建；未构建时返回 None"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            self.hits += 1
+            return snapshot
+        return None
+
+    def get(self, version: int, *args: Any) -> Snapshot:
+        """返回指定版本的快照，未命中时以 args 调用 builder 构建"""
+        snapshot = self.current(version)
+        if snapshot is not None:
+            return snapshot
+
+        with self._build_lock:
+            snapshot = self.current(version)
+            if snapshot is not None:
+                return snapshot
+            self.misses += 1
+            snapshot = Snapshot(version, encode_json(self._builder(*args)))
+            self._snapshot = snapshot
+            return snapshot
+
+    def put(self, snapshot: Snapshot):
+        """放入已编码好的快照（如由其他进程构建）"""
+        self._snapshot = snapshot
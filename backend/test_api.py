@@ -1,7 +1,15 @@
+import gzip
 import requests
 import json
+import struct
 import time
 from datetime import datetime, timedelta
+from websockets.sync.client import connect as websocket_connect
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时跳过 br 响应的解压校验
+    brotli = None
 
 class APITester:
     def __init__(self, base_url="http://localhost:8000"):
@@ -30,6 +38,10 @@ class APITester:
                 response = requests.get(url, params=params, timeout=10)
             elif method.upper() == "POST":
                 response = requests.post(url, json=json_data, timeout=10)
+            elif method.upper() == "PUT":
+                response = requests.put(url, json=json_data, timeout=10)
+            elif method.upper() == "DELETE":
+                response = requests.delete(url, timeout=10)
             else:
                 return None, "Unsupported method"
 
@@ -40,6 +52,29 @@ class APITester:
         except requests.exceptions.RequestException as e:
             return None, f"Request failed: {str(e)}"
 
+    def get_page(self, endpoint, params):
+        """按游标分页请求一页，返回 (数据, 下一页游标, 错误)"""
+        try:
+            response = requests.get(f"{self.base_url}{endpoint}", params=params, timeout=10)
+        except requests.exceptions.RequestException as e:
+            return None, None, f"Request failed: {str(e)}"
+        if response.status_code != 200:
+            return None, None, f"HTTP {response.status_code}: {response.text}"
+        return response.json(), response.headers.get("X-Next-Cursor"), None
+
+    def walk_pages(self, endpoint, params, max_pages=1000):
+        """从第一页开始沿 X-Next-Cursor 翻到最后一页，返回 (全部数据, 页数, 错误)"""
+        items, pages, cursor = [], 0, None
+        while pages < max_pages:
+            data, cursor, error = self.get_page(endpoint, dict(params, cursor=cursor) if cursor else params)
+            if error:
+                return None, pages, error
+            items.extend(data)
+            pages += 1
+            if cursor is None:
+                return items, pages, None
+        return None, pages, f"More than {max_pages} pages"
+
     def test_server_status(self):
         """测试服务器状态"""
         data, error = self.make_request("GET", "/")
@@ -88,6 +123,47 @@ class APITester:
 
         return True
 
+    def test_server_pagination(self):
+        """测试服务器游标分页：X-Next-Cursor 响应头、翻到最后一页、无效游标"""
+        servers, error = self.make_request("GET", "/api/servers")
+        if error:
+            return self.log_test("Server Pagination", False, error)
+        expected = sorted(server["serverId"] for server in servers)
+
+        first, cursor, error = self.get_page("/api/servers", {"limit": 1})
+        if error:
+            return self.log_test("Server Pagination", False, error)
+        if len(first) != 1 or (len(expected) > 1 and cursor is None):
+            return self.log_test("Server Pagination", False, "First page should have 1 item and X-Next-Cursor")
+
+        items, pages, error = self.walk_pages("/api/servers", {"limit": 2})
+        if error:
+            return self.log_test("Server Pagination", False, error)
+        ids = [server["serverId"] for server in items]
+        if ids != expected:
+            return self.log_test("Server Pagination", False, f"Pages returned {len(ids)} servers, expected {len(expected)}")
+
+        # 筛选条件下分页的结果与不分页的筛选结果一致
+        for status in ["healthy", "warning", "danger", "offline"]:
+            filtered, error = self.make_request("GET", "/api/servers", {"status": status})
+            if error:
+                return self.log_test("Server Pagination", False, error)
+            paged, _, error = self.walk_pages("/api/servers", {"status": status, "limit": 1})
+            if error:
+                return self.log_test("Server Pagination", False, error)
+            # 两次请求之间服务器状态可能变化，只检查分页结果都满足筛选条件且没有重复
+            paged_ids = [server["serverId"] for server in paged]
+            if any(server["status"] != status for server in paged) or len(paged_ids) != len(set(paged_ids)):
+                return self.log_test("Server Pagination", False, f"Bad filtered pages for status={status}")
+
+        # 依次为：无法解析、长度不匹配（["srv-1-1", 1]）、类型不匹配（[1]）
+        for cursor in ["not-a-cursor", "WyJzcnYtMS0xIiwgMV0=", "WzFd"]:
+            _, _, error = self.get_page("/api/servers", {"cursor": cursor})
+            if not error or not error.startswith("HTTP 400"):
+                return self.log_test("Server Pagination", False, f"Cursor {cursor} should return 400, got {error}")
+
+        return self.log_test("Server Pagination", True, f"{len(ids)} servers in {pages} pages")
+
     def test_server_metrics(self):
         """测试服务器指标"""
         # 先获取服务器列表
@@ -96,7 +172,7 @@ class APITester:
             return self.log_test("Server Metrics", False, "No servers available")
 
         # 测试第一个服务器的指标
-        server_id = servers[0]["id"]
+        server_id = servers[0]["serverId"]
         data, error = self.make_request("GET", f"/api/servers/{server_id}/metrics")
         if error:
             return self.log_test("Server Metrics", False, error)
@@ -108,6 +184,46 @@ class APITester:
 
         return self.log_test("Server Metrics", True, f"Metrics for {server_id}")
 
+    def test_server_metrics_history(self):
+        """测试服务器指标历史：按窗口返回列式数据和汇总，未知服务器返回404"""
+        servers, error = self.make_request("GET", "/api/servers")
+        if error or not servers:
+            return self.log_test("Server Metrics History", False, "No servers available")
+        server_id = servers[0]["serverId"]
+
+        data, error = self.make_request("GET", f"/api/servers/{server_id}/metrics/history", {"window": "30s"})
+        if error:
+            return self.log_test("Server Metrics History", False, error)
+        timestamps = data["t"]
+        if not timestamps:
+            return self.log_test("Server Metrics History", False, "Empty history")
+        if timestamps != sorted(timestamps) or timestamps[-1] - timestamps[0] > 30 * 1000:
+            return self.log_test("Server Metrics History", False, "Timestamps not ordered or outside the window")
+        bad_columns = [field for field, values in data["columns"].items() if len(values) != len(timestamps)]
+        if bad_columns:
+            return self.log_test("Server Metrics History", False, f"Column length mismatch: {bad_columns}")
+        for field, values in data["columns"].items():
+            if not data["min"][field] <= data["avg"][field] <= data["max"][field]:
+                return self.log_test("Server Metrics History", False, f"Bad summary for {field}")
+            if data["min"][field] != min(values) or data["max"][field] != max(values):
+                return self.log_test("Server Metrics History", False, f"Summary does not match column {field}")
+
+        # 更长的窗口包含更短窗口的数据
+        longer, error = self.make_request("GET", f"/api/servers/{server_id}/metrics/history", {"window": "1h"})
+        if error:
+            return self.log_test("Server Metrics History", False, error)
+        if len(longer["t"]) < len(timestamps):
+            return self.log_test("Server Metrics History", False, "1h window has fewer points than 30s window")
+
+        _, error = self.make_request("GET", "/api/servers/no-such-server/metrics/history")
+        if not error or not error.startswith("HTTP 404"):
+            return self.log_test("Server Metrics History", False, f"Unknown server should return 404, got {error}")
+        _, error = self.make_request("GET", f"/api/servers/{server_id}/metrics/history", {"window": "abc"})
+        if not error or not error.startswith("HTTP 400"):
+            return self.log_test("Server Metrics History", False, f"Invalid window should return 400, got {error}")
+
+        return self.log_test("Server Metrics History", True, f"{len(timestamps)} frames in 30s for {server_id}")
+
     def test_tasks_list(self):
         """测试任务列表"""
         data, error = self.make_request("GET", "/api/tasks")
@@ -130,6 +246,115 @@ class APITester:
 
         return self.log_test("Alerts List", True, f"Found {len(data)} alerts")
 
+    def test_alert_pagination(self):
+        """测试告警游标分页：从新到旧翻到最后一页，不重复"""
+        items, pages, error = self.walk_pages("/api/alerts", {"limit": 3})
+        if error:
+            return self.log_test("Alert Pagination", False, error)
+
+        ids = [alert["alarmId"] for alert in items]
+        if len(ids) != len(set(ids)):
+            return self.log_test("Alert Pagination", False, "Duplicate alerts across pages")
+        timestamps = [alert["timestamp"] for alert in items]
+        if timestamps != sorted(timestamps, reverse=True):
+            return self.log_test("Alert Pagination", False, "Alerts are not ordered from newest to oldest")
+
+        _, _, error = self.get_page("/api/alerts", {"cursor": "not-a-cursor"})
+        if not error or not error.startswith("HTTP 400"):
+            return self.log_test("Alert Pagination", False, f"Invalid cursor should return 400, got {error}")
+
+        return self.log_test("Alert Pagination", True, f"{len(ids)} alerts in {pages} pages")
+
+    def test_alert_rules(self):
+        """测试告警规则的增删改查"""
+        rules, error = self.make_request("GET", "/api/alert-rules")
+        if error:
+            return self.log_test("Alert Rules", False, error)
+        if not rules or any("firing" not in rule for rule in rules):
+            return self.log_test("Alert Rules", False, "Expected rules with firing counts")
+
+        rule_id = f"test-rule-{int(time.time() * 1000)}"
+        rule = {"rule_id": rule_id, "metric": "memory_usage", "op": ">", "threshold": 99.5,
+                "for_samples": 2, "severity": "low", "message": "test rule"}
+        created, error = self.make_request("POST", "/api/alert-rules", json_data=rule)
+        if error or created["rule_id"] != rule_id:
+            return self.log_test("Alert Rules", False, f"Create failed: {error}")
+        _, error = self.make_request("POST", "/api/alert-rules", json_data=rule)
+        if not error or not error.startswith("HTTP 409"):
+            return self.log_test("Alert Rules", False, f"Duplicate rule_id should return 409, got {error}")
+        _, error = self.make_request("POST", "/api/alert-rules",
+                                     json_data=dict(rule, rule_id=f"{rule_id}-bad", metric="no_such_metric"))
+        if not error or not error.startswith("HTTP 400"):
+            return self.log_test("Alert Rules", False, f"Unknown metric should return 400, got {error}")
+
+        updated, error = self.make_request("PUT", f"/api/alert-rules/{rule_id}", json_data=dict(rule, threshold=99.9))
+        if error or updated["threshold"] != 99.9:
+            return self.log_test("Alert Rules", False, f"Update failed: {error}")
+        rules, error = self.make_request("GET", "/api/alert-rules")
+        if error or [item["threshold"] for item in rules if item["rule_id"] == rule_id] != [99.9]:
+            return self.log_test("Alert Rules", False, "Updated rule not listed")
+
+        _, error = self.make_request("DELETE", f"/api/alert-rules/{rule_id}")
+        if error:
+            return self.log_test("Alert Rules", False, f"Delete failed: {error}")
+        rules, error = self.make_request("GET", "/api/alert-rules")
+        if error or any(item["rule_id"] == rule_id for item in rules):
+            return self.log_test("Alert Rules", False, "Deleted rule still listed")
+        for method in ["PUT", "DELETE"]:
+            _, error = self.make_request(method, f"/api/alert-rules/{rule_id}", json_data=rule)
+            if not error or not error.startswith("HTTP 404"):
+                return self.log_test("Alert Rules", False, f"{method} of unknown rule should return 404, got {error}")
+
+        return self.log_test("Alert Rules", True, f"{len(rules)} rules, create/update/delete OK")
+
+    def test_alert_rule_breach(self):
+        """测试超过阈值的规则生成告警，删除规则后告警标记为已解决"""
+        servers, error = self.make_request("GET", "/api/servers")
+        if error or not servers:
+            return self.log_test("Alert Rule Breach", False, "No servers available")
+        server_id = servers[0]["serverId"]
+
+        # 阈值为 0，指定服务器每次更新都满足条件
+        rule_id = f"test-breach-{int(time.time() * 1000)}"
+        rule = {"rule_id": rule_id, "metric": "cpu_usage", "op": ">=", "threshold": 0, "for_samples": 1,
+                "severity": "low", "message": "test breach", "selector": {"server_id": server_id}}
+        _, error = self.make_request("POST", "/api/alert-rules", json_data=rule)
+        if error:
+            return self.log_test("Alert Rule Breach", False, f"Create failed: {error}")
+
+        try:
+            alert = None
+            deadline = time.time() + 10
+            while alert is None and time.time() < deadline:
+                time.sleep(1)
+                alerts, error = self.make_request("GET", "/api/alerts", {"server_id": server_id, "limit": 100})
+                if error:
+                    return self.log_test("Alert Rule Breach", False, error)
+                alert = next((item for item in alerts if item.get("ruleId") == rule_id), None)
+            if alert is None:
+                return self.log_test("Alert Rule Breach", False, "No alert generated within 10s")
+            if alert["resolved"] or alert["severity"] != "low" or alert["value"] < 0:
+                return self.log_test("Alert Rule Breach", False, f"Unexpected alert: {alert}")
+
+            rules, error = self.make_request("GET", "/api/alert-rules")
+            if error or [item["firing"] for item in rules if item["rule_id"] == rule_id] != [1]:
+                return self.log_test("Alert Rule Breach", False, "Rule should be firing on exactly one server")
+        finally:
+            self.make_request("DELETE", f"/api/alert-rules/{rule_id}")
+
+        # 删除规则后，下一次更新时该规则未恢复的告警标记为已解决
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            time.sleep(1)
+            alerts, error = self.make_request("GET", "/api/alerts", {"server_id": server_id, "limit": 100})
+            if error:
+                return self.log_test("Alert Rule Breach", False, error)
+            current = next((item for item in alerts if item["alarmId"] == alert["alarmId"]), None)
+            if current is None or current["resolved"]:
+                return self.log_test("Alert Rule Breach", True, f"Alert {alert['alarmId']} fired and resolved")
+
+        return self.log_test("Alert Rule Breach", False, "Alert not resolved after deleting the rule")
+
     def test_system_health(self):
         """测试系统健康状态"""
         data, error = self.make_request("GET", "/api/system-health")
@@ -192,6 +417,488 @@ class APITester:
 
         return self.log_test("Statistics", True, f"Total servers: {data['total_servers']}")
 
+    def test_time_series_stats(self):
+        """测试时间序列滑动窗口统计：各窗口的点数递增，未知序列返回空列表，无效窗口被拒绝"""
+        servers, error = self.make_request("GET", "/api/servers")
+        if error or not servers:
+            return self.log_test("Time Series Stats", False, "No servers available")
+        server_id = servers[0]["serverId"]
+
+        counts = []
+        for window in ["1m", "5m", "15m"]:
+            data, error = self.make_request("GET", "/api/timeseries/stats",
+                                            {"window": window, "metric_type": "cpu_usage", "server_id": server_id})
+            if error:
+                return self.log_test("Time Series Stats", False, error)
+            if len(data) != 1 or data[0]["server_id"] != server_id or data[0]["metric_type"] != "cpu_usage":
+                return self.log_test("Time Series Stats", False, f"Expected one cpu_usage series for {server_id}")
+            row = data[0]
+            if row["count"] <= 0 or row["std"] < 0:
+                return self.log_test("Time Series Stats", False, f"Bad stats in {window}: {row}")
+            counts.append(row["count"])
+        if counts != sorted(counts):
+            return self.log_test("Time Series Stats", False, f"Point counts should grow with the window: {counts}")
+
+        data, error = self.make_request("GET", "/api/timeseries/stats", {"metric_type": "cpu_usage"})
+        if error:
+            return self.log_test("Time Series Stats", False, error)
+        if len(data) != len(servers) or any(row["metric_type"] != "cpu_usage" for row in data):
+            return self.log_test("Time Series Stats", False, "metric_type filter should return one series per server")
+
+        for params in [{"server_id": "no-such-server"}, {"metric_type": "no_such_metric"}]:
+            data, error = self.make_request("GET", "/api/timeseries/stats", params)
+            if error or data != []:
+                return self.log_test("Time Series Stats", False, f"Unknown series {params} should return []")
+        _, error = self.make_request("GET", "/api/timeseries/stats", {"window": "2h"})
+        if not error or not error.startswith("HTTP 422"):
+            return self.log_test("Time Series Stats", False, f"Invalid window should be rejected, got {error}")
+
+        return self.log_test("Time Series Stats", True, f"Point counts for 1m/5m/15m: {counts}")
+
+    def test_dashboard_websocket(self):
+        """测试 WebSocket 推送：连接后先收到当前数据，之后每次更新推送新数据"""
+        url = self.base_url.replace("http", "ws", 1) + "/ws/dashboard"
+        try:
+            with websocket_connect(url, open_timeout=10) as websocket:
+                first = json.loads(websocket.recv(timeout=10))
+                second = json.loads(websocket.recv(timeout=10))
+        except Exception as e:
+            return self.log_test("Dashboard WebSocket", False, f"WebSocket failed: {str(e)}")
+
+        for message in (first, second):
+            if message.get("type") != "dynamic" or "system_health" not in message.get("data", {}):
+                return self.log_test("Dashboard WebSocket", False, f"Unexpected message: {str(message)[:200]}")
+        if first["data"]["system_health"] == second["data"]["system_health"]:
+            return self.log_test("Dashboard WebSocket", False, "Second message has the same data")
+
+        return self.log_test("Dashboard WebSocket", True, "Received initial and pushed updates")
+
+    def test_timeseries_stream(self):
+        """测试时间序列 SSE 推送：按指标类型订阅，收到的数据点都属于该指标"""
+        url = f"{self.base_url}/api/timeseries/stream"
+        try:
+            # 每个采样间隔才有新的数据点，最多等待 30 秒
+            with requests.get(url, params={"metric_type": "cpu_usage"}, stream=True, timeout=30) as response:
+                if response.status_code != 200:
+                    return self.log_test("Time Series Stream", False, f"HTTP {response.status_code}")
+                if not response.headers.get("content-type", "").startswith("text/event-stream"):
+                    return self.log_test("Time Series Stream", False,
+                                         f"Unexpected content type: {response.headers.get('content-type')}")
+                event, points = None, None
+                for line in response.iter_lines(decode_unicode=True):
+                    if line.startswith("event: "):
+                        event = line[len("event: "):]
+                    elif line.startswith("data: ") and event == "timeseries":
+                        points = json.loads(line[len("data: "):])
+                        break
+        except requests.exceptions.RequestException as e:
+            return self.log_test("Time Series Stream", False, f"Request failed: {str(e)}")
+
+        if not points:
+            return self.log_test("Time Series Stream", False, "Empty timeseries event")
+        other = [point["metric_type"] for point in points if point["metric_type"] != "cpu_usage"]
+        if other:
+            return self.log_test("Time Series Stream", False, f"Unexpected metric types: {set(other)}")
+
+        return self.log_test("Time Series Stream", True, f"Received {len(points)} points")
+
+    def test_prometheus_metrics(self):
+        """测试 Prometheus 格式的后端监控指标"""
+        try:
+            response = requests.get(f"{self.base_url}/metrics", timeout=10)
+        except requests.exceptions.RequestException as e:
+            return self.log_test("Prometheus Metrics", False, f"Request failed: {str(e)}")
+        if response.status_code != 200:
+            return self.log_test("Prometheus Metrics", False, f"HTTP {response.status_code}")
+        if not response.headers.get("content-type", "").startswith("text/plain"):
+            return self.log_test("Prometheus Metrics", False,
+                                 f"Unexpected content type: {response.headers.get('content-type')}")
+
+        required = [
+            "# TYPE monitor_http_request_duration_seconds histogram",
+            "# TYPE monitor_updater_tick_duration_seconds histogram",
+            "monitor_updater_tick_duration_seconds_count",
+            "# TYPE monitor_websocket_clients gauge",
+        ]
+        missing = [line for line in required if line not in response.text]
+        if missing:
+            return self.log_test("Prometheus Metrics", False, f"Missing metrics: {missing}")
+
+        return self.log_test("Prometheus Metrics", True, f"{len(response.text.splitlines())} lines")
+
+    def test_snapshot_etag(self):
+        """测试快照响应的 ETag：携带 If-None-Match 时返回 304，gzip 和未压缩的表示使用不同的 ETag"""
+        url = f"{self.base_url}/api/dashboard/static"
+        # 服务器状态变化时静态数据的版本也会变化，两次请求之间版本变化时重试
+        for _ in range(5):
+            try:
+                identity = requests.get(url, headers={"Accept-Encoding": "identity"}, timeout=10)
+                gzipped = requests.get(url, headers={"Accept-Encoding": "gzip"}, timeout=10)
+                if identity.status_code != 200 or gzipped.status_code != 200:
+                    return self.log_test("Snapshot ETag", False,
+                                         f"HTTP {identity.status_code} / {gzipped.status_code}")
+                identity_etag, gzip_etag = identity.headers.get("ETag"), gzipped.headers.get("ETag")
+                if not identity_etag or not gzip_etag:
+                    return self.log_test("Snapshot ETag", False, "Missing ETag header")
+                if identity_etag == gzip_etag:
+                    return self.log_test("Snapshot ETag", False, f"gzip and identity share ETag {gzip_etag}")
+
+                revalidated = [
+                    (etag, requests.get(url, headers={"Accept-Encoding": encoding, "If-None-Match": etag}, timeout=10))
+                    for encoding, etag in (("identity", identity_etag), ("gzip", gzip_etag))
+                ]
+                # 另一种编码的 ETag 不能命中
+                crossed = requests.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag},
+                                       timeout=10)
+            except requests.exceptions.RequestException as e:
+                return self.log_test("Snapshot ETag", False, f"Request failed: {str(e)}")
+
+            if any(response.status_code == 200 and response.headers.get("ETag") != etag
+                   for etag, response in revalidated):
+                time.sleep(0.5)
+                continue
+            for etag, response in revalidated:
+                if response.status_code != 304 or response.content or response.headers.get("ETag") != etag:
+                    return self.log_test("Snapshot ETag", False,
+                                         f"Expected empty 304 for {etag}, got HTTP {response.status_code}")
+            if crossed.status_code != 200 or crossed.headers.get("ETag") == gzip_etag:
+                return self.log_test("Snapshot ETag", False,
+                                     f"gzip ETag matched an identity request: HTTP {crossed.status_code}")
+            return self.log_test("Snapshot ETag", True, f"304 for {identity_etag} and {gzip_etag}")
+
+        return self.log_test("Snapshot ETag", False, "Static data version kept changing")
+
+    @staticmethod
+    def decode_binary_series(body):
+        """按 wire_format.columns_to_binary 的布局解码二进制时间序列，返回列式结构"""
+        header_length = struct.unpack_from("<I", body)[0]
+        header = json.loads(body[4:4 + header_length])
+        total = sum(series["count"] for series in header["series"])
+        offset = 4 + header_length
+        timestamps = struct.unpack_from(f"<{total}d", body, offset)
+        values = struct.unpack_from(f"<{total}d", body, offset + 8 * total)
+        columns, start = [], 0
+        for series in header["series"]:
+            count = series.pop("count")
+            columns.append(dict(series, t=list(timestamps[start:start + count]), v=list(values[start:start + count])))
+            start += count
+        return columns
+
+    @staticmethod
+    def series_points(records=None, columns=None):
+        """把逐点或列式的时间序列统一为 (指标, 服务器, 区域, 服务类型, 毫秒时间戳, 数值) 的有序列表"""
+        points = []
+        for record in records or []:
+            timestamp = round(datetime.fromisoformat(record["timestamp"]).timestamp() * 1000)
+            points.append((record["metric_type"], record["server_id"], record["region"], record["service_type"],
+                           timestamp, record["value"]))
+        for series in columns or []:
+            labels = (series["metric_type"], series["server_id"], series["region"], series["service_type"])
+            points.extend(labels + (round(t), v) for t, v in zip(series["t"], series["v"]))
+        return sorted(points)
+
+    def test_time_series_formats(self):
+        """测试时间序列的列式和二进制格式：解码后与 JSON 格式的数据点一致"""
+        # 固定起始时间，请求之间新到的点按各响应共同的最新时间截断
+        params = {"metric_type": "cpu_usage", "after": (datetime.now() - timedelta(minutes=5)).isoformat()}
+        try:
+            responses = {fmt: requests.get(f"{self.base_url}/api/timeseries", params=dict(params, format=fmt), timeout=10)
+                         for fmt in ("json", "columnar", "binary")}
+        except requests.exceptions.RequestException as e:
+            return self.log_test("Time Series Formats", False, f"Request failed: {str(e)}")
+        for fmt, response in responses.items():
+            if response.status_code != 200:
+                return self.log_test("Time Series Formats", False, f"{fmt}: HTTP {response.status_code}")
+        if responses["binary"].headers.get("content-type") != "application/octet-stream":
+            return self.log_test("Time Series Formats", False,
+                                 f"Unexpected binary content type: {responses['binary'].headers.get('content-type')}")
+
+        try:
+            decoded = {
+                "json": self.series_points(records=responses["json"].json()),
+                "columnar": self.series_points(columns=responses["columnar"].json()),
+                "binary": self.series_points(columns=self.decode_binary_series(responses["binary"].content)),
+            }
+        except (ValueError, KeyError, struct.error) as e:
+            return self.log_test("Time Series Formats", False, f"Decode failed: {str(e)}")
+        if not decoded["json"]:
+            return self.log_test("Time Series Formats", False, "No data points")
+
+        cutoff = min(max(point[4] for point in points) for points in decoded.values() if points)
+        expected = [point for point in decoded["json"] if point[4] <= cutoff]
+        for fmt in ("columnar", "binary"):
+            if [point for point in decoded[fmt] if point[4] <= cutoff] != expected:
+                return self.log_test("Time Series Formats", False, f"{fmt} points differ from json")
+
+        return self.log_test("Time Series Formats", True, f"{len(expected)} points match in all formats")
+
+    def test_dynamic_columnar(self):
+        """测试动态数据的列式格式：时间序列部分解码后与 JSON 格式一致，其余部分相同"""
+        url = f"{self.base_url}/api/dashboard/dynamic"
+        # 两次 JSON 请求之间数据有更新时重试
+        for _ in range(5):
+            try:
+                before = requests.get(url, timeout=10)
+                columnar = requests.get(url, params={"format": "columnar"}, timeout=10)
+                after = requests.get(url, timeout=10)
+            except requests.exceptions.RequestException as e:
+                return self.log_test("Dynamic Columnar", False, f"Request failed: {str(e)}")
+            for response in (before, columnar, after):
+                if response.status_code != 200:
+                    return self.log_test("Dynamic Columnar", False, f"HTTP {response.status_code}")
+            if before.headers.get("ETag") != after.headers.get("ETag"):
+                time.sleep(0.5)
+                continue
+
+            data, columnar_data = before.json(), columnar.json()
+            if self.series_points(records=data["time_series"]) != self.series_points(columns=columnar_data["time_series"]):
+                return self.log_test("Dynamic Columnar", False, "time_series differs from json")
+            # system_health 的 timestamp 是各格式各自构建的时间
+            for section in (data, columnar_data):
+                section.get("system_health", {}).pop("timestamp", None)
+            other = [name for name in data if name != "time_series" and data[name] != columnar_data.get(name)]
+            if other:
+                return self.log_test("Dynamic Columnar", False, f"Sections differ: {other}")
+            return self.log_test("Dynamic Columnar", True, f"{len(data['time_series'])} time series points match")
+
+        return self.log_test("Dynamic Columnar", False, "Dynamic data kept changing")
+
+    def get_raw(self, endpoint, accept_encoding):
+        """按指定的 Accept-Encoding 请求，返回 (响应, 未解压的响应体)"""
+        with requests.get(f"{self.base_url}{endpoint}", headers={"Accept-Encoding": accept_encoding},
+                          stream=True, timeout=10) as response:
+            return response, response.raw.read(decode_content=False)
+
+    def test_response_compression(self):
+        """测试响应压缩：快照接口和经过压缩中间件的接口按 Accept-Encoding 返回 gzip / br，解压后与未压缩的 JSON 一致"""
+        checked, skipped = [], []
+        for endpoint in ("/api/dashboard/static", "/api/servers"):
+            for encoding in ("gzip", "br"):
+                # 两次请求之间服务器状态可能变化，内容不一致时重试
+                for _ in range(5):
+                    try:
+                        identity, plain = self.get_raw(endpoint, "identity")
+                        compressed, raw = self.get_raw(endpoint, encoding)
+                    except requests.exceptions.RequestException as e:
+                        return self.log_test("Response Compression", False, f"Request failed: {str(e)}")
+                    if identity.status_code != 200 or compressed.status_code != 200:
+                        return self.log_test("Response Compression", False,
+                                             f"{endpoint}: HTTP {identity.status_code} / {compressed.status_code}")
+                    if identity.headers.get("Content-Encoding"):
+                        return self.log_test("Response Compression", False, f"{endpoint}: identity response is encoded")
+
+                    content_encoding = compressed.headers.get("Content-Encoding")
+                    if encoding == "br" and content_encoding is None:
+                        skipped.append(f"{endpoint} br (brotli not installed on server)")
+                        break
+                    if content_encoding != encoding:
+                        return self.log_test("Response Compression", False,
+                                             f"{endpoint}: expected Content-Encoding {encoding}, got {content_encoding}")
+                    if encoding == "br" and brotli is None:
+                        skipped.append(f"{endpoint} br (brotli not installed locally)")
+                        break
+
+                    try:
+                        body = gzip.decompress(raw) if encoding == "gzip" else brotli.decompress(raw)
+                    except Exception as e:
+                        return self.log_test("Response Compression", False, f"{endpoint}: {encoding} decode failed: {e}")
+                    if json.loads(body) == json.loads(plain):
+                        checked.append(f"{endpoint} {encoding}")
+                        break
+                    time.sleep(0.5)
+                else:
+                    return self.log_test("Response Compression", False,
+                                         f"{endpoint}: {encoding} body differs from identity response")
+
+        message = f"Checked: {', '.join(checked)}"
+        if skipped:
+            message += f"; skipped: {', '.join(skipped)}"
+        return self.log_test("Response Compression", True, message)
+
+    def test_dynamic_selection(self):
+        """测试动态数据按 sections / fields 裁剪，以及参数不正确时返回 400"""
+        endpoint = "/api/dashboard/dynamic"
+        data, error = self.make_request("GET", endpoint, {"sections": "alerts, system_health"})
+        if error:
+            return self.log_test("Dynamic Selection", False, error)
+        if list(data) != ["alerts", "system_health"]:
+            return self.log_test("Dynamic Selection", False, f"Unexpected sections: {list(data)}")
+
+        data, error = self.make_request("GET", endpoint, {"sections": "metrics",
+                                                          "fields": "metrics.server_id,metrics.cpu_usage"})
+        if error:
+            return self.log_test("Dynamic Selection", False, error)
+        if list(data) != ["metrics"] or not data["metrics"]:
+            return self.log_test("Dynamic Selection", False, f"Unexpected data: {str(data)[:200]}")
+        extra = [item for item in data["metrics"] if set(item) != {"server_id", "cpu_usage"}]
+        if extra:
+            return self.log_test("Dynamic Selection", False, f"Unexpected fields: {sorted(extra[0])}")
+
+        # 只裁剪指定了字段的部分，其余部分完整返回
+        data, error = self.make_request("GET", endpoint, {"sections": "metrics,system_health",
+                                                          "fields": "metrics.server_id"})
+        if error:
+            return self.log_test("Dynamic Selection", False, error)
+        if "overall_status" not in data.get("system_health", {}):
+            return self.log_test("Dynamic Selection", False, "system_health was trimmed")
+
+        for params in ({"sections": ","}, {"sections": ""}, {"sections": "unknown"},
+                       {"fields": "metrics"}, {"fields": "unknown.server_id"}):
+            _, error = self.make_request("GET", endpoint, params)
+            if not error or not error.startswith("HTTP 400"):
+                return self.log_test("Dynamic Selection", False, f"Expected HTTP 400 for {params}, got {error}")
+
+        return self.log_test("Dynamic Selection", True, "Sections and fields trimmed, invalid selections rejected")
+
+    def test_time_series_downsampling(self):
+        """测试时间序列降采样：每条序列的点数不超过 max_points"""
+        max_points = 10
+        params = {"metric_type": "cpu_usage", "minutes": 30}
+        data, error = self.make_request("GET", "/api/timeseries", params)
+        if error:
+            return self.log_test("Time Series Downsampling", False, error)
+        full = {}
+        for point in data:
+            full[point["server_id"]] = full.get(point["server_id"], 0) + 1
+        if not full or max(full.values()) <= max_points:
+            return self.log_test("Time Series Downsampling", False,
+                                 f"Not enough points to downsample: {max(full.values(), default=0)}")
+
+        counts = {}
+        for method in ("lttb", "minmax", "avg"):
+            data, error = self.make_request("GET", "/api/timeseries",
+                                            dict(params, max_points=max_points, method=method))
+            if error:
+                return self.log_test("Time Series Downsampling", False, f"{method}: {error}")
+            per_series = {}
+            for point in data:
+                per_series[point["server_id"]] = per_series.get(point["server_id"], 0) + 1
+            if set(per_series) != set(full):
+                return self.log_test("Time Series Downsampling", False, f"{method}: series missing after downsampling")
+            if max(per_series.values()) > max_points:
+                return self.log_test("Time Series Downsampling", False,
+                                     f"{method}: {max(per_series.values())} points > max_points {max_points}")
+            counts[method] = max(per_series.values())
+
+        _, error = self.make_request("GET", "/api/timeseries", dict(params, max_points=10, method="median"))
+        if not error or not error.startswith("HTTP 422"):
+            return self.log_test("Time Series Downsampling", False, f"Expected HTTP 422 for unknown method, got {error}")
+
+        return self.log_test("Time Series Downsampling", True,
+                             f"{max(full.values())} points per series -> {counts}")
+
+    def _check_server_counters(self, static):
+        """按服务器列表重新统计状态、区域、集群计数，与静态数据中的分组计数比较，返回不一致的项"""
+        statuses = ["healthy", "warning", "danger", "offline"]
+        servers = static["servers"]
+        grouped = static["grouped_data"]
+        mismatches = []
+        for status in statuses:
+            expected = sum(1 for server in servers if server["status"] == status)
+            if grouped["overall"][status] != expected:
+                mismatches.append(f"overall.{status}")
+        for group_key, field in (("by_region", "region"), ("by_cluster", "clusterId")):
+            for value, summary in grouped[group_key].items():
+                members = [server for server in servers if server[field] == value]
+                if summary["total"] != len(members):
+                    mismatches.append(f"{group_key}.{value}.total")
+                for status in statuses:
+                    if summary[status] != sum(1 for server in members if server["status"] == status):
+                        mismatches.append(f"{group_key}.{value}.{status}")
+        return mismatches
+
+    def test_group_percentiles(self):
+        """测试分组分位数：每个分组 p50 <= p95 <= p99，分组与服务器字段一致，未知分组维度被拒绝"""
+        servers, error = self.make_request("GET", "/api/servers")
+        if error or not servers:
+            return self.log_test("Group Percentiles", False, "No servers available")
+        expected_groups = {
+            "region": {server["region"] for server in servers},
+            "cluster": {server["clusterId"] for server in servers},
+            "service_type": {server["serviceType"] for server in servers},
+            None: {"all"},
+        }
+
+        checked = 0
+        for group_by, expected in expected_groups.items():
+            params = {"window": "5m"}
+            if group_by:
+                params["group_by"] = group_by
+            data, error = self.make_request("GET", "/api/stats/percentiles", params)
+            if error:
+                return self.log_test("Group Percentiles", False, error)
+            groups = {group["group"]: group for group in data["groups"]}
+            # 服务器分组可能随状态变化重建，只要求当前服务器的分组都存在
+            missing = expected - set(groups)
+            if missing:
+                return self.log_test("Group Percentiles", False, f"Missing {group_by} groups: {sorted(missing)}")
+            for name, group in groups.items():
+                if group["count"] == 0:
+                    continue
+                for metric in ["cpu_usage", "memory_usage", "network_in_mbps", "network_out_mbps"]:
+                    values = group[metric]
+                    if not values["p50"] <= values["p95"] <= values["p99"]:
+                        return self.log_test("Group Percentiles", False,
+                                             f"{group_by}={name} {metric} not ordered: {values}")
+                    checked += 1
+
+        _, error = self.make_request("GET", "/api/stats/percentiles", {"group_by": "no_such_group"})
+        if not error or not error.startswith("HTTP 422"):
+            return self.log_test("Group Percentiles", False, f"Unknown group_by should be rejected, got {error}")
+        _, error = self.make_request("GET", "/api/stats/percentiles", {"window": "abc"})
+        if not error or not error.startswith("HTTP 400"):
+            return self.log_test("Group Percentiles", False, f"Invalid window should return 400, got {error}")
+
+        # 超出草图保留时长的窗口返回 400，不能按实际未覆盖的窗口回显
+        data, error = self.make_request("GET", "/api/stats/percentiles")
+        if error:
+            return self.log_test("Group Percentiles", False, error)
+        retention = data["retention_seconds"]
+        data, error = self.make_request("GET", "/api/stats/percentiles", {"window": f"{retention}s"})
+        if error or data["window_seconds"] != retention:
+            return self.log_test("Group Percentiles", False, f"Window of the full retention failed: {error}")
+        for window in (f"{retention + data['bucket_seconds']}s", "99999999999h"):
+            _, error = self.make_request("GET", "/api/stats/percentiles", {"window": window})
+            if not error or not error.startswith("HTTP 400"):
+                return self.log_test("Group Percentiles", False, f"Window {window} should return 400, got {error}")
+
+        return self.log_test("Group Percentiles", True, f"{checked} group/metric percentiles ordered")
+
+    def test_server_status_updates(self):
+        """测试服务器状态变化后状态、区域、集群计数与服务器列表一致"""
+        initial, error = self.make_request("GET", "/api/dashboard/static")
+        if error:
+            return self.log_test("Server Status Updates", False, error)
+        before = {server["serverId"]: server["status"] for server in initial["servers"]}
+
+        # 每次更新有一定概率改变一台服务器的状态（MONITOR_SERVER_STATUS_RATE），最多等待60秒
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            time.sleep(2)
+            static, error = self.make_request("GET", "/api/dashboard/static")
+            if error:
+                return self.log_test("Server Status Updates", False, error)
+            changed = [server["serverId"] for server in static["servers"]
+                       if before.get(server["serverId"]) != server["status"]]
+            if not changed:
+                continue
+
+            mismatches = self._check_server_counters(static)
+            if mismatches:
+                return self.log_test("Server Status Updates", False, f"Counter mismatch: {mismatches[:5]}")
+            # 按状态筛选的列表也要反映新的状态
+            server = next(server for server in static["servers"] if server["serverId"] == changed[0])
+            filtered, error = self.make_request("GET", "/api/servers", {"status": server["status"]})
+            if error:
+                return self.log_test("Server Status Updates", False, error)
+            if server["serverId"] not in {item["serverId"] for item in filtered}:
+                return self.log_test("Server Status Updates", False,
+                                     f"{server['serverId']} missing from status={server['status']} list")
+            return self.log_test("Server Status Updates", True,
+                                 f"{len(changed)} servers changed status, counters consistent")
+
+        return self.log_test("Server Status Updates", False, "No server status change within 60s")
+
     def test_data_updates(self):
         """测试数据更新"""
         # 获取初始数据
@@ -228,14 +935,31 @@ class APITester:
             self.test_dashboard_data,
             self.test_servers_list,
             self.test_server_filters,
+            self.test_server_pagination,
             self.test_server_metrics,
+            self.test_server_metrics_history,
             self.test_tasks_list,
             self.test_alerts_list,
+            self.test_alert_pagination,
+            self.test_alert_rules,
+            self.test_alert_rule_breach,
             self.test_system_health,
             self.test_load_balance,
             self.test_time_series,
+            self.test_time_series_downsampling,
+            self.test_time_series_formats,
+            self.test_dynamic_columnar,
+            self.test_dynamic_selection,
+            self.test_dashboard_websocket,
+            self.test_timeseries_stream,
+            self.test_prometheus_metrics,
+            self.test_snapshot_etag,
+            self.test_response_compression,
+            self.test_time_series_stats,
             self.test_search,
             self.test_statistics,
+            self.test_group_percentiles,
+            self.test_server_status_updates,
             self.test_data_updates
         ]
 
@@ -0,0 +1,514 @@
+import itertools
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from downsampling import downsample
+from history_store import HistoryStore
+from models import TimeSeriesData
+
+# 每条序列默认容量：10 秒一个采样点，保留 6 小时
+DEFAULT_SERIES_CAPACITY = 6 * 360
+
+SeriesKey = Tuple[Optional[str], str]
+
+# 建立倒排索引的标签
+INDEXED_LABELS = ("metric_type", "region", "server_id", "service_type")
+
+# 环形缓冲区在逻辑容量之外多分配的槽位。写入线程只会覆盖当前可见区间之外的槽位，
+# 读取方在写入线程再追加 WRITE_SLACK 个点之前完成拷贝即可读到一致的数据，否则重试
+WRITE_SLACK = 64
+# 批量写入时每次递增计数前最多写入的点数
+WRITE_BATCH = WRITE_SLACK // 2
+
+
+class SeriesBatch(NamedTuple):
+    """一批新写入的采样点（按列存放）：第 i 个点属于标签为 labels[i] 的序列
+
+    标签字典与存储中登记的是同一个对象，不为每个点单独创建；消费方（滑动统计、SSE 推送）直接读取各列。
+    """
+    labels: Tuple[Dict[str, Optional[str]], ...]
+    timestamps: np.ndarray  # 毫秒时间戳
+    values: np.ndarray
+
+
+EMPTY_BATCH = SeriesBatch((), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64))
+
+
+def to_epoch_ms(value: datetime) -> int:
+    """datetime 转换为毫秒时间戳（naive 时间按本地时间处理）"""
+    return int(value.timestamp() * 1000)
+
+
+def from_epoch_ms(value: int) -> datetime:
+    """毫秒时间戳转换为本地 naive datetime"""
+    return datetime.fromtimestamp(value / 1000)
+
+
+class SeriesRingBuffer:
+    """单条时间序列的定长环形缓冲区（int64 毫秒时间戳 + float64 数值）
+
+    单写多读：写入位置和可见长度都由一个 int64 累计写入数推出，先写数据再递增计数。
+    读取方按读到的计数拷贝数据，拷贝完成后确认期间写入的点数没有超过 WRITE_SLACK
+    （即可见区间未被覆盖），否则重试；写入方无需加锁，读取方也不会看到写了一半的状态。
+
+    数组和计数可以由外部传入（如 mmap 共享内存），此时其他进程可以直接读取同一份数据。
+    """
+
+    __slots__ = ("capacity", "timestamps", "values", "_written")
+
+    def __init__(self, capacity: int = DEFAULT_SERIES_CAPACITY, timestamps: Optional[np.ndarray] = None,
+                 values: Optional[np.ndarray] = None, written: Optional[np.ndarray] = None):
+        self.capacity = capacity
+        slots = capacity + WRITE_SLACK
+        self.timestamps = np.zeros(slots, dtype=np.int64) if timestamps is None else timestamps
+        self.values = np.zeros(slots, dtype=np.float64) if values is None else values
+        # 长度为 1 的 int64 数组：累计写入数
+        self._written = np.zeros(1, dtype=np.int64) if written is None else written
+
+    def _cursor(self) -> Tuple[int, int, int]:
+        """(下一个写入位置, 可见的采样点数, 累计写入数)"""
+        written = int(self._written[0])
+        return written % len(self.timestamps), min(written, self.capacity), written
+
+    def __len__(self) -> int:
+        return min(int(self._written[0]), self.capacity)
+
+    @property
+    def first_timestamp(self) -> Optional[int]:
+        head, size, _ = self._cursor()
+        if not size:
+            return None
+        return int(self.timestamps[head - size])
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        head, size, _ = self._cursor()
+        if not size:
+            return None
+        return int(self.timestamps[head - 1])
+
+    def newest(self) -> int:
+        """最后一个点的时间戳，没有数据时为 -1；只读一次计数，供跨序列扫描时快速比较"""
+        written = int(self._written[0])
+        return int(self.timestamps[(written - 1) % len(self.timestamps)]) if written else -1
+
+    def append(self, timestamp: int, value: float) -> bool:
+        """追加一个采样点，时间戳必须严格递增；重复或乱序的点直接丢弃，重复写入是幂等的"""
+        head, size, written = self._cursor()
+        if size and timestamp <= self.timestamps[head - 1]:
+            return False
+        self.timestamps[head] = timestamp
+        self.values[head] = value
+        self._written[0] = written + 1
+        return True
+
+    def extend(self, timestamps: np.ndarray, values: np.ndarray) -> int:
+        """批量追加按时间递增的采样点，早于最后一个点的部分丢弃，返回写入的点数"""
+        head, size, written = self._cursor()
+        if size:
+            skip = int(timestamps.searchsorted(self.timestamps[head - 1], side="right"))
+            timestamps, values = timestamps[skip:], values[skip:]
+        # 超出容量的部分写入后也会被覆盖，只写最新的 capacity 个点
+        timestamps, values = timestamps[-self.capacity:], values[-self.capacity:]
+
+        slots = len(self.timestamps)
+        # 未写满容量时从未环绕，写入位置之后的槽位不属于任何读取方的可见区间，可以一次写完；
+        # 写满后每批最多 WRITE_BATCH 个点，与 _overwritten_since 预留的正在写入的点数一致
+        chunk = slots - size if size < self.capacity else WRITE_BATCH
+        offset = 0
+        while offset < len(timestamps):
+            batch = slice(offset, offset + chunk)
+            count = len(timestamps[batch])
+            position = written % slots
+            if position + count <= slots:
+                self.timestamps[position:position + count] = timestamps[batch]
+                self.values[position:position + count] = values[batch]
+            else:
+                idx = (written + np.arange(count)) % slots
+                self.timestamps[idx] = timestamps[batch]
+                self.values[idx] = values[batch]
+            written += count
+            offset += count
+            self._written[0] = written
+            chunk = WRITE_BATCH
+        return len(timestamps)
+
+    def _overwritten_since(self, cursor: Tuple[int, int, int]) -> bool:
+        """读取 cursor 之后写入方是否可能已覆盖其可见区间（正在写入的一批也计算在内）"""
+        return int(self._written[0]) - cursor[2] >= WRITE_SLACK - WRITE_BATCH
+
+    def _segments(self, cursor: Tuple[int, int, int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """按时间顺序返回底层数组的视图（环绕时为两段）"""
+        head, size, _ = cursor
+        start = head - size
+        if start >= 0:
+            return [(self.timestamps[start:head], self.values[start:head])]
+        return [
+            (self.timestamps[start:], self.values[start:]),
+            (self.timestamps[:head], self.values[:head]),
+        ]
+
+    def window(self, start: Optional[int] = None, end: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """二分查找返回 [start, end] 区间内的数据副本"""
+        while True:
+            cursor = self._cursor()
+            ts_parts, value_parts = [], []
+            for ts, values in self._segments(cursor):
+                lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+                hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="right"))
+                if lo < hi:
+                    ts_parts.append(ts[lo:hi])
+                    value_parts.append(values[lo:hi])
+
+            if not ts_parts:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+            result = np.concatenate(ts_parts), np.concatenate(value_parts)
+            if not self._overwritten_since(cursor):
+                return result
+
+    def tail(self, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """返回最新的 count 个采样点"""
+        while True:
+            cursor = self._cursor()
+            head, size, _ = cursor
+            count = min(count, size)
+            if count <= 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+            idx = (np.arange(head - count, head)) % len(self.timestamps)
+            result = self.timestamps[idx], self.values[idx]
+            if not self._overwritten_since(cursor):
+                return result
+
+
+class TimeSeriesStore:
+    """按 (server_id, metric_type) 分序列存储的时间序列库
+
+    内存中每条序列保留最近 capacity 个点；配置 history 时新写入的点同时落盘，
+    查询窗口早于内存中最旧的点时，较早的部分从磁盘段读取。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_SERIES_CAPACITY, history: Optional[HistoryStore] = None):
+        self.capacity = capacity
+        self.history = history
+        self._series: Dict[SeriesKey, SeriesRingBuffer] = {}
+        self._labels: Dict[SeriesKey, Dict[str, Optional[str]]] = {}
+        # 倒排索引：标签名 -> 标签值 -> 序列集合
+        self._index: Dict[str, Dict[str, Set[SeriesKey]]] = {label: {} for label in INDEXED_LABELS}
+
+    def __len__(self) -> int:
+        # 写入线程可能同时新增序列，遍历前先对字典做一次快照（list() 在 GIL 下一次完成）
+        return sum(len(buffer) for buffer in list(self._series.values()))
+
+    @property
+    def series_count(self) -> int:
+        return len(self._series)
+
+    def last_timestamps(self) -> Dict[SeriesKey, int]:
+        """每条序列最新采样点的毫秒时间戳"""
+        result = {}
+        for key, buffer in list(self._series.items()):
+            last = buffer.last_timestamp
+            if last is not None:
+                result[key] = last
+        return result
+
+    def tails(self, count: int) -> List[Tuple[Dict[str, Optional[str]], np.ndarray]]:
+        """每条序列最新 count 个点的 (标签, 数值)"""
+        return [(self._labels[key], buffer.tail(count)[1]) for key, buffer in list(self._series.items())]
+
+    def series_keys(self, **filters: Optional[str]) -> List[SeriesKey]:
+        """按标签筛选序列（倒排索引求交集）"""
+        return self._match(**filters)
+
+    def _get_series(self, server_id: Optional[str], metric_type: str,
+                    region: Optional[str], service_type: Optional[str]) -> SeriesRingBuffer:
+        buffer = self._series.get((server_id, metric_type))
+        if buffer is None:
+            buffer = self.add_series(SeriesRingBuffer(self.capacity), metric_type, server_id, region, service_type)
+        return buffer
+
+    def add_series(self, buffer: SeriesRingBuffer, metric_type: str, server_id: Optional[str] = None,
+                   region: Optional[str] = None, service_type: Optional[str] = None) -> SeriesRingBuffer:
+        """注册一条序列（可传入基于共享内存的缓冲区）"""
+        key = (server_id, metric_type)
+        labels = {
+            "metric_type": metric_type,
+            "server_id": server_id,
+            "region": region,
+            "service_type": service_type,
+        }
+        # 按 标签 -> 序列 -> 倒排索引 的顺序发布，读取方查到的序列总是完整的
+        self._labels[key] = labels
+        self._series[key] = buffer
+        for label in INDEXED_LABELS:
+            if labels[label] is not None:
+                self._index[label].setdefault(labels[label], set()).add(key)
+        return buffer
+
+    def relabel(self, labels: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+        """修改已登记序列的 region / service_type 标签（服务器更换区域、服务类型），返回新的标签字典
+
+        标签字典替换为新字典，倒排索引中只复制取值变化的序列集合；
+        按 标签 -> 新取值的集合 -> 旧取值的集合 的顺序发布，读取方不会漏掉该序列。
+        """
+        key = (labels["server_id"], labels["metric_type"])
+        previous = self._labels[key]
+        updated = dict(previous, region=labels["region"], service_type=labels["service_type"])
+        self._labels[key] = updated
+        for label in INDEXED_LABELS:
+            old, new = previous[label], updated[label]
+            if old == new:
+                continue
+            index = self._index[label]
+            if new is not None:
+                index[new] = index.get(new, set()) | {key}
+            if old is not None and old in index:
+                remaining = index[old] - {key}
+                if remaining:
+                    index[old] = remaining
+                else:
+                    del index[old]
+        return updated
+
+    def register(self, series: Iterable[Dict[str, Optional[str]]]):
+        """预先登记一批序列：写入磁盘历史前登记全部序列，新建的段目录一次包含所有序列，
+        不会因为后续批次出现新序列而为同一时间段再建 part"""
+        for labels in series:
+            self._get_series(labels["server_id"], labels["metric_type"], labels["region"], labels["service_type"])
+
+    def append(self, metric_type: str, server_id: Optional[str], timestamp: int, value: float,
+               region: Optional[str] = None, service_type: Optional[str] = None) -> bool:
+        """写入单个采样点（毫秒时间戳）"""
+        buffer = self._get_series(server_id, metric_type, region, service_type)
+        if not buffer.append(timestamp, value):
+            return False
+        if self.history is not None:
+            self.history.write([(server_id, metric_type)], np.array([timestamp], dtype=np.int64),
+                               np.array([value], dtype=np.float64), self._labels)
+        return True
+
+    def extend(self, points: Iterable[TimeSeriesData]) -> List[TimeSeriesData]:
+        """批量写入 TimeSeriesData，返回实际写入的数据点（已存在的时间戳会被去重）"""
+        written = []
+        keys, timestamps, values = [], [], []
+        for point in points:
+            timestamp = to_epoch_ms(point.timestamp)
+            buffer = self._get_series(point.server_id, point.metric_type, point.region, point.service_type)
+            if buffer.append(timestamp, point.value):
+                written.append(point)
+                keys.append((point.server_id, point.metric_type))
+                timestamps.append(timestamp)
+                values.append(point.value)
+
+        # 磁盘历史按批写入
+        if self.history is not None and keys:
+            self.history.write(keys, np.array(timestamps, dtype=np.int64),
+                               np.array(values, dtype=np.float64), self._labels)
+        return written
+
+    def extend_aligned(self, series: Sequence[Dict[str, Optional[str]]], timestamps: np.ndarray,
+                       values: np.ndarray) -> SeriesBatch:
+        """多条序列按同一组递增的毫秒时间戳批量写入：values 为 [序列数, 时间戳数]，
+        每条序列只写入晚于其最后一个点的部分，返回实际写入的点（按序列、时间排列）"""
+        if not len(series) or not len(timestamps):
+            return EMPTY_BATCH
+        buffers = []
+        for labels in series:
+            buffer = self._series.get((labels["server_id"], labels["metric_type"]))
+            if buffer is None:
+                buffer = self._get_series(labels["server_id"], labels["metric_type"],
+                                          labels["region"], labels["service_type"])
+            buffers.append(buffer)
+
+        written = np.zeros(values.shape, dtype=bool)
+        if len(timestamps) == 1:
+            # 每次更新每条序列通常只有一个新点，逐点追加（重复的时间戳由 append 丢弃）
+            timestamp = int(timestamps[0])
+            written[:, 0] = [buffer.append(timestamp, value)
+                             for buffer, value in zip(buffers, values[:, 0].tolist())]
+        else:
+            # 早于最后一个点的部分由 extend 丢弃，写入的是末尾的 count 个点
+            for row, buffer in enumerate(buffers):
+                count = buffer.extend(timestamps, values[row])
+                if count:
+                    written[row, len(timestamps) - count:] = True
+
+        rows, columns = np.nonzero(written)
+        if not len(rows):
+            return EMPTY_BATCH
+        # 标签和 key 按序列重复，不逐点查找
+        counts = np.count_nonzero(written, axis=1).tolist()
+        keys = [(labels["server_id"], labels["metric_type"]) for labels in series]
+        batch = SeriesBatch(
+            tuple(itertools.chain.from_iterable(
+                itertools.repeat(self._labels[key], count) for key, count in zip(keys, counts))),
+            timestamps[columns], values[rows, columns])
+        if self.history is not None:
+            self.history.write(
+                list(itertools.chain.from_iterable(itertools.repeat(key, count) for key, count in zip(keys, counts))),
+                batch.timestamps, batch.values, self._labels)
+        return batch
+
+    def restore_from_history(self, now_ms: int, interval_ms: int) -> int:
+        """启动时从磁盘历史恢复最近 capacity 个采样间隔内的数据到内存，返回恢复的点数"""
+        if self.history is None:
+            return 0
+        since = now_ms - self.capacity * interval_ms
+        restored = 0
+        for key, labels in self.history.series(since).items():
+            ts, values = self.history.read(key, since)
+            if len(ts):
+                buffer = self._get_series(labels["server_id"], labels["metric_type"],
+                                          labels["region"], labels["service_type"])
+                restored += buffer.extend(ts, values)
+        return restored
+
+    def _window(self, key: SeriesKey, start: Optional[int], end: Optional[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """读取单条序列的时间窗口：内存中没有的较早部分从磁盘历史补齐"""
+        buffer = self._series[key]
+        first = buffer.first_timestamp
+        ts, values = buffer.window(start, end)
+        if self.history is None or (first is not None and start is not None and start >= first):
+            return ts, values
+
+        # 内存窗口之前的部分（读取期间最旧的点可能已被淘汰，以实际读到的第一个点为界）
+        boundary = int(ts[0]) if len(ts) else first
+        history_end = end if boundary is None else (boundary - 1 if end is None else min(end, boundary - 1))
+        old_ts, old_values = self.history.read(key, start, history_end)
+        if not len(old_ts):
+            return ts, values
+        return np.concatenate((old_ts, ts)), np.concatenate((old_values, values))
+
+    def _match(self, **filters: Optional[str]) -> List[SeriesKey]:
+        """通过倒排索引求交集筛选序列，代价只与命中的序列数有关"""
+        postings = []
+        for label, value in filters.items():
+            if not value:
+                continue
+            keys = self._index[label].get(value)
+            if not keys:
+                return []
+            postings.append(keys)
+
+        if not postings:
+            return list(self._series)
+        postings.sort(key=len)
+        return list(postings[0].intersection(*postings[1:]))
+
+    @staticmethod
+    def _merge(ts_parts: List[np.ndarray], value_parts: List[np.ndarray],
+               limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """合并多条序列并按时间排序，返回 (时间戳, 数值, 所属序列下标)"""
+        timestamps = np.concatenate(ts_parts)
+        values = np.concatenate(value_parts)
+        owners = np.repeat(np.arange(len(ts_parts)), [len(ts) for ts in ts_parts])
+
+        order = np.argsort(timestamps, kind="stable")
+        if limit is not None:
+            order = order[-limit:] if limit > 0 else order[:0]
+        return timestamps[order], values[order], owners[order]
+
+    def _to_records(self, keys: List[SeriesKey], ts_parts: List[np.ndarray],
+                    value_parts: List[np.ndarray], limit: Optional[int] = None) -> List[Dict]:
+        """按时间排序输出与 TimeSeriesData.dict() 相同结构的字典"""
+        if not ts_parts:
+            return []
+        timestamps, values, owners = self._merge(ts_parts, value_parts, limit)
+
+        records = []
+        for ts, value, owner in zip(timestamps.tolist(), values.tolist(), owners.tolist()):
+            records.append({
+                "timestamp": from_epoch_ms(ts),
+                "value": value,
+                **self._labels[keys[owner]],
+            })
+        return records
+
+    def _to_columns(self, keys: List[SeriesKey], ts_parts: List[np.ndarray],
+                    value_parts: List[np.ndarray]) -> List[Dict]:
+        """按序列输出列式结构：标签只出现一次，t 为毫秒时间戳数组，v 为数值数组"""
+        return [
+            {**self._labels[key], "t": ts, "v": values}
+            for key, ts, values in zip(keys, ts_parts, value_parts)
+        ]
+
+    def query(self, metric_type: Optional[str] = None, region: Optional[str] = None,
+              server_id: Optional[str] = None, service_type: Optional[str] = None,
+              start: Optional[int] = None, end: Optional[int] = None,
+              max_points: Optional[int] = None, method: str = "lttb",
+              columnar: bool = False) -> List[Dict]:
+        """按标签和时间窗口（毫秒时间戳，闭区间）查询，可选按序列降采样到 max_points 个点"""
+        keys, ts_parts, value_parts = [], [], []
+        matched = self._match(metric_type=metric_type, region=region,
+                              server_id=server_id, service_type=service_type)
+        for key in matched:
+            ts, values = self._window(key, start, end)
+            if max_points:
+                ts, values = downsample(ts, values, max_points, method)
+            if len(ts):
+                keys.append(key)
+                ts_parts.append(ts)
+                value_parts.append(values)
+
+        if columnar:
+            return self._to_columns(keys, ts_parts, value_parts)
+        return self._to_records(keys, ts_parts, value_parts)
+
+    def latest(self, limit: int, columnar: bool = False) -> List[Dict]:
+        """返回全库最新的 limit 个采样点
+
+        按各序列最新一个点的时间从新到旧读取序列，只保留当前最新的 limit 个点；
+        某条序列最新的点不晚于已保留的第 limit 新的点时，之后的序列都不会进入结果，不再读取。
+        """
+        if limit <= 0:
+            return []
+        series = list(self._series.items())
+        lasts = np.fromiter((buffer.newest() for _, buffer in series), dtype=np.int64, count=len(series))
+
+        keys = []
+        top_ts = np.empty(0, dtype=np.int64)
+        top_values = np.empty(0, dtype=np.float64)
+        top_owners = np.empty(0, dtype=np.int64)
+        cutoff = -1
+        for i in np.argsort(-lasts, kind="stable").tolist():
+            if lasts[i] <= cutoff:
+                break
+            key, buffer = series[i]
+            ts, values = buffer.tail(limit)
+            newer = ts > cutoff
+            if not newer.all():
+                ts, values = ts[newer], values[newer]
+            if not len(ts):
+                continue
+            top_ts = np.concatenate((top_ts, ts))
+            top_values = np.concatenate((top_values, values))
+            top_owners = np.concatenate((top_owners, np.full(len(ts), len(keys), dtype=np.int64)))
+            keys.append(key)
+            if len(top_ts) >= limit:
+                # 只保留最新的 limit 个点，第 limit 新的点的时间作为之后序列的下限
+                if len(top_ts) > limit:
+                    kept = np.argpartition(top_ts, len(top_ts) - limit)[len(top_ts) - limit:]
+                    top_ts, top_values, top_owners = top_ts[kept], top_values[kept], top_owners[kept]
+                cutoff = int(top_ts.min())
+
+        if not len(top_ts):
+            return []
+        order = np.lexsort((top_owners, top_ts))
+        timestamps, values, owners = top_ts[order], top_values[order], top_owners[order]
+        if not columnar:
+            return [
+                {"timestamp": from_epoch_ms(ts), "value": value, **self._labels[keys[owner]]}
+                for ts, value, owner in zip(timestamps.tolist(), values.tolist(), owners.tolist())
+            ]
+
+        # 按序列重新分组
+        order = np.argsort(owners, kind="stable")
+        owners = owners[order]
+        splits = np.flatnonzero(np.diff(owners)) + 1
+        return self._to_columns(
+            [keys[owner] for owner in owners[np.concatenate(([0], splits))].tolist()],
+            np.split(timestamps[order], splits),
+            np.split(values[order], splits)
+        )
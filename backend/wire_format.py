@@ -0,0 +1,53 @@
+import json
+import struct
+from typing import Dict, List
+
+import numpy as np
+
+# 二进制格式的 Content-Type
+BINARY_MEDIA_TYPE = "application/octet-stream"
+
+SERIES_LABELS = ("metric_type", "server_id", "region", "service_type")
+
+
+def columns_to_json(columns: List[Dict]) -> List[Dict]:
+    """列式结构转换为可 JSON 序列化的形式"""
+    return [
+        {**{label: series[label] for label in SERIES_LABELS},
+         "t": series["t"].tolist(), "v": series["v"].tolist()}
+        for series in columns
+    ]
+
+
+def columns_to_binary(columns: List[Dict]) -> bytes:
+    """列式结构编码为紧凑的二进制格式
+
+    布局（小端序）：
+    - uint32：JSON 头长度 N
+    - N 字节 UTF-8 JSON 头：{"series": [{标签..., "count": 点数}, ...]}，用空格补齐到 8 字节对齐
+    - float64 数组：所有序列的时间戳（毫秒）依次拼接
+    - float64 数组：所有序列的数值依次拼接
+
+    时间戳以 float64 存储（毫秒精度下可精确表示），浏览器端可直接用 Float64Array 读取。
+    """
+    header = {
+        "series": [
+            {**{label: series[label] for label in SERIES_LABELS}, "count": len(series["t"])}
+            for series in columns
+        ]
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(4 + len(header_bytes)) % 8)
+
+    if columns:
+        timestamps = np.concatenate([series["t"] for series in columns]).astype("<f8")
+        values = np.concatenate([series["v"] for series in columns]).astype("<f8")
+    else:
+        timestamps = values = np.empty(0, dtype="<f8")
+
+    return b"".join([
+        struct.pack("<I", len(header_bytes)),
+        header_bytes,
+        timestamps.tobytes(),
+        values.tobytes(),
+    ])
@@ -1,6 +1,15 @@
 import { useState, useEffect, useCallback, useRef } from 'react';
 import api from '../services/api';
 
+// 列式时间序列展开为逐点记录（与 /api/timeseries 的 JSON 格式一致）
+const columnsToRecords = (columns) => columns
+  .flatMap(({ t, v, ...labels }) => Array.from(t, (ts, i) => ({
+    ...labels,
+    timestamp: new Date(ts).toISOString(),
+    value: v[i]
+  })))
+  .sort((a, b) => new Date(a.timestamp) - new Date(b.timestamp));
+
 export const useApiData = () => {
   const [isStreaming, setIsStreaming] = useState(true);
 
@@ -8,6 +17,9 @@ export const useApiData = () => {
   const lastTimestampRef = useRef(null);
   const [searchTerm, setSearchTerm] = useState('');
   const [isSearchActive, setIsSearchActive] = useState(false);
+  const isSearchActiveRef = useRef(false);
+  // WebSocket 推送是否已连接，连接时停止轮询
+  const [isPushConnected, setIsPushConnected] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
 
@@ -163,29 +175,6 @@ export const useApiData = () => {
     return false;
   }, []);
 
-  // 获取增量时间序列数据
-  const fetchIncrementalTimeSeries = useCallback(async () => {
-    if (!lastTimestampRef.current) return null;
-
-    try {
-      const incrementalData = await api.getTimeSeriesData({
-        after: lastTimestampRef.current.toISOString(),
-        minutes: 5 // 获取最近5分钟的数据
-      });
-
-      if (incrementalData && incrementalData.length > 0) {
-        // 更新最新时间戳
-        const latestTimestamp = new Date(Math.max(...incrementalData.map(item => new Date(item.timestamp))));
-        lastTimestampRef.current = latestTimestamp;
-
-        return incrementalData;
-      }
-    } catch (err) {
-      console.error('Error fetching incremental time series data:', err);
-    }
-    return null;
-  }, []);
-
   // 获取数据
   const fetchData = useCallback(async () => {
     if (!isStreaming) return;
@@ -200,7 +189,8 @@ export const useApiData = () => {
         const [staticData, dynamicData, timeSeriesData] = await Promise.all([
           api.getStaticData(),
           api.getDynamicData(),
-          api.getTimeSeriesData({ minutes: 30 }) // 获取30分钟的时间序列数据
+          // 获取30分钟的时间序列数据，服务端按图表宽度降采样，使用二进制列式格式传输
+          api.getTimeSeriesBinary({ minutes: 30, max_points: 120 }).then(columnsToRecords)
         ]);
 
         // 合并并转换数据
@@ -239,7 +229,7 @@ export const useApiData = () => {
         const [dynamicData, timeSeriesData] = await Promise.all([
           api.getDynamicData(),
           // 每次更新都获取时间序列数据，确保图表实时更新
-          api.getTimeSeriesData({ minutes: 30 })
+          api.getTimeSeriesBinary({ minutes: 30, max_points: 120 }).then(columnsToRecords)
         ]);
 
         // 合并数据
@@ -277,6 +267,39 @@ export const useApiData = () => {
     }
   }, [isStreaming, isSearchActive, transformData]);
 
+  // 合并增量时间序列点，去重并保留最近30分钟
+  const mergeChartData = useCallback((newPoints) => {
+    setChartData(prevChartData => {
+      const keyOf = item => `${item.serverId}|${item.metric_type}|${item.timestamp}`;
+      const existing = new Set(prevChartData.map(keyOf));
+      const cutoff = Date.now() - 30 * 60 * 1000;
+      return [
+        ...prevChartData,
+        ...newPoints.filter(item => !existing.has(keyOf(item)))
+      ].filter(item => new Date(item.timestamp).getTime() >= cutoff);
+    });
+  }, []);
+
+  // 应用 WebSocket 推送的动态数据（时间序列由 SSE 单独推送）
+  const applyDynamicData = useCallback((dynamicData) => {
+    const transformed = transformData(dynamicData);
+
+    // 当搜索激活时，不更新任务列表，保持搜索结果
+    if (!isSearchActiveRef.current) {
+      setTasks(transformed.tasks);
+    }
+
+    setAlerts(transformed.alerts);
+    setMetrics(transformed.metrics);
+    setLoadBalance(transformed.loadBalance);
+    setSystemHealth(transformed.systemHealth);
+
+    prevDataRef.current = {
+      ...prevDataRef.current,
+      ...transformed
+    };
+  }, [transformData]);
+
   // 搜索功能
   const handleSearch = useCallback(async (term) => {
     setSearchTerm(term);
@@ -332,16 +355,65 @@ export const useApiData = () => {
     fetchData();
   }, [fetchData]);
 
-  // 定时更新数据 - 降低频率到3秒
+  useEffect(() => {
+    isSearchActiveRef.current = isSearchActive;
+  }, [isSearchActive]);
+
+  // 订阅 WebSocket 推送，断开后5秒重连
   useEffect(() => {
     if (!isStreaming) return;
 
+    let socket = null;
+    let reconnectTimer = null;
+    let closed = false;
+
+    const connect = () => {
+      socket = api.connectDashboardSocket({
+        onOpen: () => setIsPushConnected(true),
+        onMessage: (message) => {
+          if (message.type === 'dynamic') {
+            applyDynamicData(message.data);
+          }
+        },
+        onClose: () => {
+          setIsPushConnected(false);
+          if (!closed) {
+            reconnectTimer = setTimeout(connect, 5000);
+          }
+        }
+      });
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
+      socket?.close();
+    };
+  }, [isStreaming, applyDynamicData]);
+
+  // 订阅时间序列 SSE，只接收每次更新新产生的数据点
+  useEffect(() => {
+    if (!isStreaming) return;
+
+    const source = api.subscribeTimeSeries({}, (points) => {
+      mergeChartData(transformData({ time_series: points }).chartData);
+    });
+
+    return () => source.close();
+  }, [isStreaming, mergeChartData, transformData]);
+
+  // 定时更新数据 - 降低频率到3秒，WebSocket 连接时不轮询
+  useEffect(() => {
+    if (!isStreaming || isPushConnected) return;
+
     const interval = setInterval(() => {
       fetchData();
     }, 3000); // 设置为3秒以平衡性能和实时性
 
     return () => clearInterval(interval);
-  }, [isStreaming, isSearchActive, fetchData]);
+  }, [isStreaming, isPushConnected, isSearchActive, fetchData]);
 
   return {
     isStreaming,
@@ -39,8 +39,56 @@ class ApiService {
   }
 
   // 获取动态数据（指标、告警、系统健康等）
-  async getDynamicData() {
-    return this.request('/dashboard/dynamic');
+  // sections / fields 为数组，只请求面板需要的部分和字段，如 getDynamicData({ sections: ['tasks'] })
+  async getDynamicData({ sections, fields } = {}) {
+    const params = new URLSearchParams();
+    if (sections?.length) params.append('sections', sections.join(','));
+    if (fields?.length) params.append('fields', fields.join(','));
+
+    const endpoint = params.toString() ? `/dashboard/dynamic?${params.toString()}` : '/dashboard/dynamic';
+    return this.request(endpoint);
+  }
+
+  // 订阅动态数据推送（WebSocket），返回 WebSocket 实例
+  connectDashboardSocket({ onMessage, onOpen, onClose } = {}) {
+    const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+    const socket = new WebSocket(`${protocol}//${window.location.host}/ws/dashboard`);
+
+    socket.onopen = () => onOpen?.();
+    socket.onmessage = (event) => {
+      try {
+        onMessage?.(JSON.parse(event.data));
+      } catch (error) {
+        console.error('WebSocket message parse failed:', error);
+      }
+    };
+    socket.onclose = () => onClose?.();
+    socket.onerror = (error) => console.error('WebSocket error:', error);
+
+    return socket;
+  }
+
+  // 订阅时间序列增量推送（SSE），返回 EventSource 实例
+  subscribeTimeSeries(filters = {}, onPoints) {
+    const params = new URLSearchParams();
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value !== null && value !== undefined && value !== '') {
+        params.append(key, value);
+      }
+    });
+
+    const query = params.toString();
+    const source = new EventSource(`${this.baseURL}/timeseries/stream${query ? `?${query}` : ''}`);
+    source.addEventListener('timeseries', (event) => {
+      try {
+        onPoints?.(JSON.parse(event.data));
+      } catch (error) {
+        console.error('SSE message parse failed:', error);
+      }
+    });
+    source.onerror = (error) => console.error('SSE error:', error);
+
+    return source;
   }
 
   // 获取服务器列表
@@ -120,6 +168,40 @@ class ApiService {
     return this.request(endpoint);
   }
 
+  // 获取二进制列式时间序列数据，返回 [{ metric_type, server_id, region, service_type, t, v }]
+  // t、v 为 Float64Array，格式说明见后端 wire_format.py
+  async getTimeSeriesBinary(filters = {}) {
+    const params = new URLSearchParams({ format: 'binary' });
+    Object.entries(filters).forEach(([key, value]) => {
+      if (value !== null && value !== undefined) {
+        params.append(key, value);
+      }
+    });
+
+    const response = await fetch(`${this.baseURL}/timeseries?${params.toString()}`);
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const buffer = await response.arrayBuffer();
+    const headerLength = new DataView(buffer).getUint32(0, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 4, headerLength)));
+    const total = header.series.reduce((sum, series) => sum + series.count, 0);
+    const timestamps = new Float64Array(buffer, 4 + headerLength, total);
+    const values = new Float64Array(buffer, 4 + headerLength + total * 8, total);
+
+    let offset = 0;
+    return header.series.map(({ count, ...labels }) => {
+      const series = {
+        ...labels,
+        t: timestamps.subarray(offset, offset + count),
+        v: values.subarray(offset, offset + count)
+      };
+      offset += count;
+      return series;
+    });
+  }
+
   // 获取统计信息
   async getStatistics() {
     return this.request('/stats');